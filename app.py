@@ -1,16 +1,35 @@
-from flask import Flask, request, jsonify
-from db_deployments import postgres,mongodb,mysql,redis,elasticsearch,kafka
+from flask import Flask, Response, g, request, jsonify, stream_with_context
+from db_deployments.bulk import bulk_create, bulk_delete, parse_items
+import hashlib
 import logging
+import math
+import os
+import time
+from functools import partial
 from dotenv import load_dotenv
-from kubernetes import client, config
 from kubernetes.client.rest import ApiException
-from db_deployments.elasticsearch import create_elasticsearch_deployment
-from db_deployments.kafka import create_kafka_deployment, delete_kafka_deployment
-from db_deployments.mongodb import create_mongodb_deployment
-from db_deployments.mysql import create_mysql_deployment
-from db_deployments.postgres import delete_deployment, create_postgres_deployment
-from db_deployments.redis import create_redis_deployment
-from utils.database import collection
+from pymongo.errors import PyMongoError
+from db_deployments.engines import ENGINES, LEGACY_CREATE_ROUTES, LEGACY_DELETE_ROUTES
+from db_deployments.images import start_prepuller, stop_prepuller
+from db_deployments.provisioner import delete_instance, parse_options, resolve_retain_data
+from db_deployments.quotas import admit, forget
+from db_deployments.reconciler import plan as reconcile_plan, start_reconciler, stop_reconciler
+from db_deployments.replication import start_lag_monitor, stop_lag_monitor
+from db_deployments.warm_pool import create_instance, pool_status, start_replenisher, stop_replenisher
+from utils.database import (
+    decode_cursor, encode_cursor, ensure_indexes, find_active_deployments, ping, resource_name
+)
+from utils.informer import live_status, start_informers, stop_informers
+from utils.jobs import (
+    drain, fail_interrupted_jobs, find_job_id, get_job, is_draining, register_handler, start_workers, stop_claiming,
+    submit_job, wait_for_job
+)
+from utils.kube import get_api_client
+from utils.leader import on_leading, start_election, stop_election
+from utils.metrics import count_api_error, observe_request, render as render_metrics
+from utils.pod_logs import LogStream, fetch_logs, format_ndjson, format_sse, list_pod_names
+from utils.rate_limit import acquire
+from utils.readiness import MAX_WAIT_SECONDS, settle_pending, start_readiness_watch, wait_until_settled
 # Load environment variables
 load_dotenv()
 
@@ -21,93 +40,115 @@ logger = logging.getLogger(__name__)
 # Initialize Flask app
 app = Flask(__name__)
 
-@app.route('/create_database', methods=['POST'])
-def create_database():
-    data = request.json
-    db_name = data.get('database_name')
-    username = data.get('username', 'postgres')
-    email = data.get('email')
-
-    if not db_name or not email:
-        return jsonify({"error": "Database name and email are required"}), 400
-
-    success, db_name, username, password = create_postgres_deployment(db_name, username, email)
-    if success:
-        return jsonify({"message": "Database created", "db_name": db_name, "username": username, "password": password})
-    else:
-        return jsonify({"error": "Failed to create database"}), 500
-
-@app.route('/create_redis', methods=['POST'])
-def create_redis():
-    data = request.json
-    db_name = data.get('database_name')
-    email = data.get('email')
-
-    if not db_name or not email:
-        return jsonify({"error": "Database name and email are required"}), 400
-
-    if create_redis_deployment(db_name, email):
-        return jsonify({"message": "Redis creation initiated", "db_name": db_name})
-    else:
-        return jsonify({"error": "Failed to create Redis instance"}), 500
-
-@app.route('/create_mongodb', methods=['POST'])
-def create_mongodb():
-    data = request.json
-    db_name = data.get('database_name')
-    username = data.get('username', 'mongo')  # Default username if not provided
-    email = data.get('email')
-
-    if not db_name or not email:
-        return jsonify({"error": "Database name and email are required"}), 400
-
-    success, db_name, username, password = create_mongodb_deployment(db_name, username, email)
-    if success:
-        return jsonify({
-            "message": "MongoDB database creation initiated",
-            "db_name": db_name,
-            "username": username,
-            "password": password
-        })
-    else:
-        return jsonify({"error": "Failed to create MongoDB database"}), 500
-
-@app.route('/create_mysql', methods=['POST'])
-def create_mysql():
-    data = request.json
-    db_name = data.get('database_name')
-    email = data.get('email')
-
-    if not db_name or not email:
-        return jsonify({"error": "Database name and email are required"}), 400
-
-    success, db_name, password = create_mysql_deployment(db_name, email)
-    if success:
-        return jsonify({
-            "message": "MySQL deployment initiated",
-            "db_name": db_name,
-            "password": password  # Returning the password; ensure this is done securely
-        })
-    else:
-        return jsonify({"error": "Failed to deploy MySQL"}), 500
-
-@app.route('/create_kafka', methods=['POST'])
-def create_kafka():
-    data = request.json
-    db_name = data.get('database_name')
-    email = data.get('email')
-
-    if not db_name or not email:
-        return jsonify({"error": "Database name and email are required"}), 400
-
-    success, db_name = create_kafka_deployment(db_name, email)
-    if success:
-        return jsonify({"message": "Kafka deployment initiated", "db_name": db_name})
-    else:
-        return jsonify({"error": "Failed to deploy Kafka"}), 500
-
-@app.route('/create_elasticsearch', methods=['POST'])
-def create_elasticsearch():
+# How long a stopping worker waits for in-flight provisioning jobs.
+SHUTDOWN_TIMEOUT = int(os.getenv('SHUTDOWN_TIMEOUT', '90'))
+
+@app.before_request
+def _start_timer():
+    g.started = time.perf_counter()
+
+@app.after_request
+def _record_request(response):
+    # Label by route template, not path, to keep label cardinality bounded.
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    observe_request(request.method, route, response.status_code, time.perf_counter() - g.get('started', time.perf_counter()))
+    return response
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    # Liveness: the process is serving requests.
+    return jsonify({"status": "ok"})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    # Readiness: Mongo answers and this worker is not shutting down.
+    if is_draining():
+        return jsonify({"status": "draining"}), 503
+    try:
+        ping()
+    except PyMongoError as e:
+        return jsonify({"status": "unavailable", "error": f"Mongo: {e}"}), 503
+    return jsonify({"status": "ready"})
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
+for engine_name in ENGINES:
+    register_handler(f'create_{engine_name}', partial(create_instance, engine_name))
+# Singleton background loops run only in the elected leader.
+on_leading(settle_pending)
+on_leading(start_replenisher, stop_replenisher)
+on_leading(start_reconciler, stop_reconciler)
+on_leading(start_prepuller, stop_prepuller)
+on_leading(start_lag_monitor, stop_lag_monitor)
+
+def _wait_requested():
+    data = request.get_json(silent=True) or {}
+    return str(request.args.get('wait', data.get('wait', 'false'))).lower() == 'true'
+
+def _wait_timeout():
+    # Seconds, capped at READINESS_MAX_WAIT; raises ValueError when invalid.
+    data = request.get_json(silent=True) or {}
+    value = request.args.get('timeout', data.get('timeout', MAX_WAIT_SECONDS))
+    try:
+        timeout = float(value)
+    except (TypeError, ValueError):
+        timeout = math.nan
+    if not math.isfinite(timeout) or timeout <= 0:
+        raise ValueError("timeout must be a positive number of seconds")
+    return min(timeout, MAX_WAIT_SECONDS)
+
+def _idempotency_key(engine, email):
+    # Hashed with the engine and owner so one client's key never replays
+    # another's job, and so it fits in a Kubernetes label value.
+    data = request.get_json(silent=True) or {}
+    key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+    if not key:
+        return None
+    return hashlib.sha256(f"{engine}:{email}:{key}".encode()).hexdigest()[:32]
+
+def _check_limits(engine, email, options):
+    # Rate limit and quota, checked before anything is queued.
+    retry_after = acquire(email)
+    if retry_after:
+        return (jsonify({"error": "Too many create requests, retry later"}), 429,
+                {"Retry-After": str(math.ceil(retry_after))})
+    error = admit(email, engine, options["sizing"], options.get("topology"), options.get("pooler"))
+    if error:
+        return jsonify({"error": error}), 403
+    return None
+
+def _queue_job(engine, params, wait_timeout=None):
+    job_id = submit_job(f'create_{engine}', params, params.get("idempotency_key"))
+    if job_id is None:
+        forget(params["email"])
+        return jsonify({"error": "Provisioning queue is full, retry later"}), 503
+    if wait_timeout is not None:
+        return _wait_for_instance(job_id, engine, params["db_name"], wait_timeout)
+    message = f"{ENGINES[engine]['display_name']} creation queued"
+    response = jsonify({"message": message, "db_name": params["db_name"], "job_id": job_id})
+    return response, 202, {"Location": f"/jobs/{job_id}"}
+
+def _wait_for_instance(job_id, db_type, db_name, timeout):
+    deadline = time.monotonic() + timeout
+    job = wait_for_job(job_id, max(deadline - time.monotonic(), 0))
+    if job["status"] == "failed":
+        return jsonify({"error": "Provisioning failed", "job": job}), 500
+    if job["status"] != "succeeded":
+        return jsonify({"message": "Provisioning still queued", "db_name": db_name, "job_id": job_id}), 202
+
+    record = wait_until_settled(db_name, db_type, max(deadline - time.monotonic(), 0))
+    body = dict(job["result"], job_id=job_id, instance=record)
+    status = (record or {}).get("status")
+    if status == "failed":
+        return jsonify(dict(body, error="Instance failed to become ready")), 500
+    if status == "pending":
+        return jsonify(dict(body, message="Instance is not ready yet")), 202
+    return jsonify(dict(body, message="Instance is ready"))
+
+def _create(engine):
     data = request.json
     db_name = data.get('database_name')
     email = data.get('email')
@@ -115,50 +156,113 @@ def create_elasticsearch():
     if not db_name or not email:
         return jsonify({"error": "Database name and email are required"}), 400
 
-    success, db_name = create_elasticsearch_deployment(db_name, email)
-    if success:
-        return jsonify({"message": "Elasticsearch deployment initiated", "db_name": db_name})
-    else:
-        return jsonify({"error": "Failed to deploy Elasticsearch"}), 500
-
-@app.route('/delete_database', methods=['POST'])
-def delete_database():
-    data = request.json
-    db_name = data.get('database_name')
-
-    if not db_name:
-        return jsonify({"error": "Database name is required"}), 400
-
-    if delete_deployment(db_name):
-        return jsonify({"message": "Database deletion initiated", "db_name": db_name})
-    else:
-        return jsonify({"error": "Failed to delete database"}), 500
-
-
-@app.route('/delete_redis', methods=['POST'])
-def delete_redis():
-    data = request.json
-    db_name = data.get('database_name')
-
-    if not db_name:
-        return jsonify({"error": "Database name is required"}), 400
-
-    if delete_deployment(db_name):
-        return jsonify({"message": "Redis deletion initiated", "db_name": db_name})
-    else:
-        return jsonify({"error": "Failed to delete Redis instance"}), 500
-@app.route('/delete_kafka', methods=['POST'])
-def delete_kafka():
+    try:
+        options = parse_options(engine, data)
+        # Checked before queueing, so a bad timeout never leaves a job behind.
+        wait_timeout = _wait_timeout() if _wait_requested() else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    params = dict(options, db_name=db_name, email=email)
+    idempotency_key = _idempotency_key(engine, email)
+    if idempotency_key:
+        params["idempotency_key"] = idempotency_key
+    default_username = ENGINES[engine].get('default_username')
+    if default_username:
+        params["username"] = data.get('username', default_username)
+    # A replay of an already submitted create is answered without counting again.
+    if not find_job_id(idempotency_key):
+        limited = _check_limits(engine, email, options)
+        if limited:
+            return limited
+    return _queue_job(engine, params, wait_timeout)
+
+def _delete(engine):
     data = request.json
     db_name = data.get('database_name')
 
     if not db_name:
         return jsonify({"error": "Database name is required"}), 400
+    try:
+        retain_data = resolve_retain_data(data.get('retain_data', request.args.get('retain_data')))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    if delete_kafka_deployment(db_name):
-        return jsonify({"message": "Kafka deletion initiated", "db_name": db_name})
+    if delete_instance(engine, db_name, retain_data):
+        return jsonify({"message": f"{ENGINES[engine]['display_name']} deletion initiated", "db_name": db_name})
     else:
-        return jsonify({"error": "Failed to delete Kafka instance"}), 500
+        return jsonify({"error": f"Failed to delete {ENGINES[engine]['display_name']}"}), 500
+
+@app.route('/create/<engine>', methods=['POST'])
+def create_engine_instance(engine):
+    if engine not in ENGINES:
+        return jsonify({"error": f"Unknown engine '{engine}'"}), 404
+    return _create(engine)
+
+@app.route('/delete/<engine>', methods=['POST'])
+def delete_engine_instance(engine):
+    if engine not in ENGINES:
+        return jsonify({"error": f"Unknown engine '{engine}'"}), 404
+    return _delete(engine)
+
+for route, engine_name in LEGACY_CREATE_ROUTES.items():
+    app.add_url_rule(f'/{route}', route, partial(_create, engine_name), methods=['POST'])
+for route, engine_name in LEGACY_DELETE_ROUTES.items():
+    app.add_url_rule(f'/{route}', route, partial(_delete, engine_name), methods=['POST'])
+
+@app.route('/instances/<db_name>/wait', methods=['GET'])
+def wait_for_instance(db_name):
+    # Long-poll until the instance settles as ready/failed or the timeout expires.
+    try:
+        timeout = _wait_timeout()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    record = wait_until_settled(db_name, request.args.get('type'), timeout)
+    if record is None:
+        return jsonify({"error": "Instance not found"}), 404
+    return jsonify(record), 202 if record.get("status") == "pending" else 200
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+@app.route('/warm_pool', methods=['GET'])
+def get_warm_pool():
+    return jsonify(pool_status())
+
+@app.route('/reconcile/report', methods=['GET'])
+def get_reconcile_report():
+    # Dry run: what the reconciler would delete or mark, without acting.
+    try:
+        return jsonify(reconcile_plan())
+    except ApiException as e:
+        count_api_error("reconcile_list", e)
+        return jsonify({"error": f"Failed to list cluster objects: {e.reason}"}), 500
+
+@app.route('/bulk/create', methods=['POST'])
+def bulk_create_databases():
+    data = request.json or {}
+    items, error = parse_items(data.get('items'), for_create=True)
+    if error:
+        return jsonify({"error": error}), 400
+
+    results = bulk_create(items)
+    status = 200 if all(r["success"] for r in results) else 207
+    return jsonify({"results": results}), status
+
+@app.route('/bulk/delete', methods=['POST'])
+def bulk_delete_databases():
+    data = request.json or {}
+    items, error = parse_items(data.get('items'), for_create=False)
+    if error:
+        return jsonify({"error": error}), 400
+
+    results = bulk_delete(items)
+    status = 200 if all(r["success"] for r in results) else 207
+    return jsonify({"results": results}), status
 
 @app.route('/get_deployment_logs', methods=['GET'])
 def get_deployment_logs():
@@ -168,44 +272,120 @@ def get_deployment_logs():
     if not deployment_name:
         return jsonify({"error": "Deployment name is required"}), 400
 
+    options = {
+        "tail_lines": request.args.get('tail_lines', type=int),
+        "since_seconds": request.args.get('since_seconds', type=int),
+        "limit_bytes": request.args.get('limit_bytes', type=int),
+    }
+    follow = request.args.get('follow', 'false').lower() == 'true'
+    stream = request.args.get('stream') or ('ndjson' if follow else None)
+    if stream not in (None, 'ndjson', 'sse'):
+        return jsonify({"error": "stream must be 'ndjson' or 'sse'"}), 400
+
+    # Instances claimed from the warm pool run under their pool names.
+    deployment_name = resource_name(deployment_name)
+    options["container"] = request.args.get('container', deployment_name)
     try:
-        core_v1_api = client.CoreV1Api()
-        pods = core_v1_api.list_namespaced_pod(namespace, label_selector=f"app={deployment_name}")
-
-        logs = {}
-        for pod in pods.items:
-            pod_name = pod.metadata.name
-            pod_logs = core_v1_api.read_namespaced_pod_log(name=pod_name, namespace=namespace)
-            logs[pod_name] = pod_logs
-
-        return jsonify({"logs": logs})
+        pod_names = list_pod_names(namespace, deployment_name)
+        if not stream:
+            return jsonify({"logs": fetch_logs(namespace, pod_names, options)})
     except ApiException as e:
-        print(f"Exception when fetching deployment logs: {e}")
+        count_api_error("read_pod_log", e)
+        logger.error(f"Failed to fetch logs of '{deployment_name}': {e}")
         return jsonify({"error": "Failed to fetch deployment logs"}), 500
 
+    events = LogStream(namespace, pod_names, options, follow).events()
+    if stream == 'sse':
+        return Response(format_sse(events), mimetype='text/event-stream',
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    return Response(format_ndjson(events), mimetype='application/x-ndjson',
+                    headers={"X-Accel-Buffering": "no"})
 
-@app.route('/list_databases', methods=['GET'])
-def list_databases():
+
+MAX_LIST_LIMIT = int(os.getenv('LIST_MAX_LIMIT', '1000'))
+
+def _stream_json_array(docs):
+    yield "["
+    for index, doc in enumerate(docs):
+        doc.pop("_id", None)
+        # Live replica/readiness info comes from the informer cache, not the API.
+        live = live_status(doc.pop("resource_name", doc["db_name"]))
+        if live is not None:
+            doc["live"] = live
+        yield ("," if index else "") + app.json.dumps(doc)
+    yield "]"
+
+def _list_deployments(db_type=None):
     user_email = request.args.get('email')
     if not user_email:
         return jsonify({"error": "Email is required"}), 400
 
-    query = {"email": user_email, "deleted": False}
-    active_databases = collection.find(query, {"_id": 0, "db_name": 1, "timestamp": 1})
+    limit = request.args.get('limit', type=int) or 0
+    if limit < 0 or limit > MAX_LIST_LIMIT:
+        return jsonify({"error": f"limit must be between 1 and {MAX_LIST_LIMIT}"}), 400
+
+    after = None
+    if request.args.get('after'):
+        after = decode_cursor(request.args['after'])
+        if after is None:
+            return jsonify({"error": "Invalid pagination cursor"}), 400
+
+    cursor = find_active_deployments(user_email, db_type or request.args.get('type'), after, limit)
+    headers = {}
+    if limit:
+        # A page is bounded by limit, so it is safe to read it ahead and
+        # work out the next cursor before streaming the body.
+        docs = list(cursor)
+        if len(docs) == limit:
+            headers["X-Next-Cursor"] = encode_cursor(docs[-1])
+    else:
+        docs = cursor
+
+    return Response(stream_with_context(_stream_json_array(docs)), mimetype='application/json', headers=headers)
 
-    return jsonify(list(active_databases))
+@app.route('/list_databases', methods=['GET'])
+def list_databases():
+    return _list_deployments()
 
 @app.route('/list_kafka', methods=['GET'])
 def list_kafka():
-    user_email = request.args.get('email')
-    if not user_email:
-        return jsonify({"error": "Email is required"}), 400
+    return _list_deployments('kafka')
 
-    query = {"email": user_email, "deleted": False, "type": "kafka"}
-    kafka_instances = collection.find(query, {"_id": 0, "db_name": 1, "timestamp": 1})
 
-    return jsonify(list(kafka_instances))
+def prepare():
+    # Once per deployment of the service, before any worker runs jobs; under
+    # gunicorn this runs in the master before forking.
+    get_api_client()
+    ensure_indexes()
+    fail_interrupted_jobs()
+
+def start_background():
+    # Per worker process: threads do not survive a fork.
+    start_workers()
+    start_informers()
+    start_readiness_watch()
+    start_election()
+
+def begin_shutdown():
+    # As soon as the process is asked to stop: jobs claimed from here on
+    # would be killed mid-provision once the graceful timeout runs out.
+    stop_claiming()
+
+def shutdown(timeout=SHUTDOWN_TIMEOUT):
+    stop_election()
+    drain(timeout)
+    stop_informers()
+
+def startup():
+    prepare()
+    start_background()
 
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    # Development server only; production runs gunicorn -c gunicorn.conf.py.
+    startup()
+    try:
+        app.run(host=os.getenv('HOST', '127.0.0.1'), port=int(os.getenv('PORT', '5000')),
+                debug=os.getenv('FLASK_DEBUG', 'false').lower() == 'true')
+    finally:
+        shutdown()
@@ -0,0 +1,141 @@
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# A stand-in for the slice of the Kubernetes API the provisioner uses. It is
+# served over HTTP in-process so benchmarks exercise the real client:
+# serialization, connection pooling and error handling.
+
+_PATH = re.compile(
+    r"^/(?:api/v1|apis/apps/v1)/namespaces/(?P<namespace>[^/]+)/(?P<kind>[a-z]+)"
+    r"(?:/(?P<name>[^/]+))?(?:/(?P<sub>log|status))?$"
+)
+
+
+def _status(code, reason, message):
+    return {"kind": "Status", "apiVersion": "v1", "status": "Failure",
+            "reason": reason, "message": message, "code": code}
+
+
+class FakeKube:
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, log_lines=200):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.log_lines = log_lines
+        self.objects = {}
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.server = None
+
+    def _delay(self):
+        if self.latency_ms or self.jitter_ms:
+            time.sleep(max(random.gauss(self.latency_ms, self.jitter_ms), 0) / 1000)
+
+    def handle(self, method, path, query, body):
+        # Returns (status, payload); payload is a dict or, for logs, text.
+        with self.lock:
+            self.requests += 1
+        self._delay()
+        if self.error_rate and random.random() < self.error_rate:
+            return 500, _status(500, "InternalError", "injected failure")
+
+        match = _PATH.match(path)
+        if not match:
+            return 404, _status(404, "NotFound", path)
+        namespace, kind, name, sub = match.group("namespace", "kind", "name", "sub")
+        key = (namespace, kind, name)
+
+        if kind == "pods" and sub == "log":
+            lines = int(query.get("tailLines", [self.log_lines])[0])
+            return 200, "".join(f"{name} line {index}\n" for index in range(lines))
+        if kind == "pods" and name is None:
+            return 200, self._pods(namespace, query)
+        if method == "GET" and name is None:
+            return 200, self._list(namespace, kind, query)
+        if kind == "persistentvolumeclaims" and method == "DELETE":
+            return 200, {"kind": "PersistentVolumeClaimList", "apiVersion": "v1", "items": []}
+
+        with self.lock:
+            if method == "POST":
+                obj = dict(body, metadata=dict(body.get("metadata", {}), namespace=namespace,
+                                               resourceVersion="1", generation=1,
+                                               creationTimestamp=time.strftime("%Y-%m-%dT%H:%M:%SZ")))
+                stored_key = (namespace, kind, obj["metadata"]["name"])
+                if stored_key in self.objects:
+                    return 409, _status(409, "AlreadyExists", f"{kind} {stored_key[2]} already exists")
+                self.objects[stored_key] = obj
+                return 201, obj
+            if key not in self.objects:
+                return 404, _status(404, "NotFound", f"{kind} {name} not found")
+            if method == "DELETE":
+                self.objects.pop(key)
+                return 200, {"kind": "Status", "apiVersion": "v1", "status": "Success"}
+            if method == "PATCH":
+                labels = (body.get("metadata") or {}).get("labels") or {}
+                self.objects[key]["metadata"].setdefault("labels", {}).update(labels)
+            obj = self.objects[key]
+        if kind == "statefulsets":
+            replicas = obj["spec"].get("replicas", 1)
+            obj = dict(obj, status={"replicas": replicas, "readyReplicas": replicas,
+                                    "availableReplicas": replicas, "observedGeneration": 1})
+        return 200, obj
+
+    def _list(self, namespace, kind, query):
+        # Supports the "key" and "key=value" terms of a label selector.
+        terms = [term.partition("=") for term in query.get("labelSelector", [""])[0].split(",") if term]
+        with self.lock:
+            items = [obj for (ns, stored_kind, _), obj in self.objects.items()
+                     if ns == namespace and stored_kind == kind
+                     and all(key in (obj["metadata"].get("labels") or {})
+                             and (not sep or obj["metadata"]["labels"][key] == value)
+                             for key, sep, value in terms)]
+        return {"kind": "List", "apiVersion": "v1", "metadata": {"resourceVersion": "1"}, "items": items}
+
+    def _pods(self, namespace, query):
+        selector = query.get("labelSelector", [""])[0]
+        app = selector.partition("app=")[2]
+        with self.lock:
+            exists = (namespace, "statefulsets", app) in self.objects
+        items = [{"metadata": {"name": f"{app}-0", "namespace": namespace, "labels": {"app": app}}}] if exists else []
+        return {"kind": "PodList", "apiVersion": "v1", "metadata": {}, "items": items}
+
+    def start(self, host="127.0.0.1", port=0):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _serve(self):
+                url = urlparse(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+                status, payload = fake.handle(self.command, url.path, parse_qs(url.query), body)
+                if isinstance(payload, str):
+                    data, content_type = payload.encode(), "text/plain"
+                else:
+                    data, content_type = json.dumps(payload).encode(), "application/json"
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_DELETE = do_PATCH = do_PUT = _serve
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="fake-kube", daemon=True).start()
+        return f"http://{host}:{self.server.server_address[1]}"
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
@@ -0,0 +1,234 @@
+"""Benchmarks the Flask routes against an in-process fake Kubernetes API.
+
+    python -m benchmarks.run --instances 200 --concurrency 16 --kube-latency-ms 20 \
+        --output bench.json --baseline previous.json
+
+Mongo is mongomock unless --mongo=local, which uses the mongod on
+localhost:27017 that utils.database connects to.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from benchmarks.fake_kube import FakeKube
+
+ENDPOINTS = ("create", "list", "logs", "delete")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--engine", default="postgres")
+    parser.add_argument("--instances", type=int, default=100, help="instances created and deleted")
+    parser.add_argument("--requests", type=int, default=200, help="list and log requests each")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--kube-latency-ms", type=float, default=5.0)
+    parser.add_argument("--kube-jitter-ms", type=float, default=1.0)
+    parser.add_argument("--kube-error-rate", type=float, default=0.0)
+    parser.add_argument("--log-lines", type=int, default=200)
+    parser.add_argument("--no-wait", action="store_true", help="time job submission only, not provisioning")
+    parser.add_argument("--mongo", choices=("mongomock", "local"), default="mongomock")
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--baseline", help="earlier results to compare p95 latency against")
+    parser.add_argument("--max-regression", type=float, default=0.25,
+                        help="fail when an endpoint's p95 grows by more than this fraction")
+    return parser.parse_args(argv)
+
+
+def _write_kubeconfig(server):
+    kubeconfig = {
+        "apiVersion": "v1",
+        "kind": "Config",
+        "clusters": [{"name": "fake", "cluster": {"server": server}}],
+        "users": [{"name": "fake", "user": {"token": "benchmark"}}],
+        "contexts": [{"name": "fake", "context": {"cluster": "fake", "user": "fake", "namespace": "default"}}],
+        "current-context": "fake",
+    }
+    handle, path = tempfile.mkstemp(prefix="fake-kubeconfig-", suffix=".json")
+    with os.fdopen(handle, "w") as f:
+        json.dump(kubeconfig, f)
+    return path
+
+
+def _configure(args, server):
+    # Must run before the app is imported: these are read at import time.
+    kubeconfig = _write_kubeconfig(server)
+    os.environ.update({
+        "K8S_CONFIG_MODE": "kubeconfig",
+        "KUBECONFIG": kubeconfig,
+        "K8S_NAMESPACE": "default",
+        "K8S_POOL_MAXSIZE": str(max(args.concurrency * 2, 32)),
+        "INFORMER_ENABLED": "false",
+        "LEADER_ELECTION": "false",
+        "WARM_POOL_SIZES": "",
+        # One owner creates every instance: keep the quota check on the
+        # path, but out of the way.
+        "RATE_LIMIT_PER_MINUTE": "0",
+        "QUOTA_MAX_INSTANCES": str(args.instances + 1),
+        "QUOTA_MAX_CPU": "",
+        "QUOTA_MAX_MEMORY": "",
+    })
+    if args.mongo == "mongomock":
+        import mongomock
+        import pymongo
+        pymongo.MongoClient = mongomock.MongoClient
+
+        # mongomock edits the projection dict it is given while copying
+        # results, which races when routes share a module-level projection.
+        copy_only_fields = mongomock.collection.Collection._copy_only_fields
+
+        def _copy_only_fields(self, doc, fields, container):
+            return copy_only_fields(self, doc, dict(fields) if isinstance(fields, dict) else fields, container)
+
+        mongomock.collection.Collection._copy_only_fields = _copy_only_fields
+    return kubeconfig
+
+
+def _serve_app():
+    from werkzeug.serving import make_server
+
+    import app as application
+    application.startup()
+    server = make_server("127.0.0.1", 0, application.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="benchmark-app", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def _call(method, url, body=None):
+    data = json.dumps(body).encode() if body is not None else None
+    request = Request(url, data=data, method=method, headers={"Content-Type": "application/json"})
+    started = time.perf_counter()
+    try:
+        with urlopen(request, timeout=300) as response:
+            response.read()
+            status = response.status
+    except HTTPError as e:
+        e.read()
+        status = e.code
+    return time.perf_counter() - started, status
+
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    index = min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def _run_phase(name, calls, concurrency):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(lambda call: _call(*call), calls))
+    elapsed = time.perf_counter() - started
+
+    latencies = [seconds * 1000 for seconds, _ in outcomes]
+    errors = sum(1 for _, status in outcomes if status >= 400)
+    summary = {
+        "requests": len(outcomes),
+        "errors": errors,
+        "requests_per_second": round(len(outcomes) / elapsed, 2) if elapsed else None,
+    }
+    if latencies:
+        summary.update({
+            "p50_ms": round(_percentile(latencies, 0.50), 2),
+            "p95_ms": round(_percentile(latencies, 0.95), 2),
+            "p99_ms": round(_percentile(latencies, 0.99), 2),
+            "mean_ms": round(statistics.fmean(latencies), 2),
+            "max_ms": round(max(latencies), 2),
+        })
+    print(f"{name:>7}: {summary['requests']} requests, {errors} errors, "
+          f"{summary['requests_per_second']} req/s, p50 {summary.get('p50_ms')} ms, "
+          f"p95 {summary.get('p95_ms')} ms, p99 {summary.get('p99_ms')} ms")
+    return summary
+
+
+def run(args):
+    fake = FakeKube(args.kube_latency_ms, args.kube_jitter_ms, args.kube_error_rate, args.log_lines)
+    kubeconfig = _configure(args, fake.start())
+    server, base = _serve_app()
+    from utils.database import jobs_collection
+    from utils.jobs import wait_for_job
+
+    email = f"bench-{uuid.uuid4().hex[:8]}@example.com"
+    names = [f"bench-{index}-{uuid.uuid4().hex[:6]}" for index in range(args.instances)]
+    wait = "false" if args.no_wait else "true"
+    phases = {
+        "create": [("POST", f"{base}/create/{args.engine}?wait={wait}", {"database_name": name, "email": email})
+                   for name in names],
+        "list": [("GET", f"{base}/list_databases?email={email}&limit=50", None)] * args.requests,
+        "logs": [("GET", f"{base}/get_deployment_logs?deployment_name={names[index % len(names)]}"
+                         f"&tail_lines={args.log_lines}", None)
+                 for index in range(args.requests if names else 0)],
+        "delete": [("POST", f"{base}/delete/{args.engine}", {"database_name": name}) for name in names],
+    }
+    results = {}
+    for name in ENDPOINTS:
+        results[name] = _run_phase(name, phases[name], args.concurrency)
+        if name == "create" and args.no_wait:
+            # Let queued jobs finish so the later phases see every instance.
+            for job in jobs_collection.find({"params.email": email}, {"job_id": 1}):
+                wait_for_job(job["job_id"], 300)
+
+    server.shutdown()
+    fake.stop()
+    os.unlink(kubeconfig)
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "revision": _revision(),
+        "python": platform.python_version(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "kube_api_requests": fake.requests,
+        "endpoints": results,
+    }
+
+
+def _revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, max_regression):
+    # Returns the endpoints whose p95 regressed beyond max_regression.
+    regressions = []
+    for name, current in results["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(name)
+        if not previous or not previous.get("p95_ms") or "p95_ms" not in current:
+            continue
+        change = current["p95_ms"] / previous["p95_ms"] - 1
+        print(f"{name:>7}: p95 {previous['p95_ms']} -> {current['p95_ms']} ms ({change:+.1%})")
+        if change > max_regression:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run(args)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        if regressions:
+            print(f"p95 regressed by more than {args.max_regression:.0%}: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
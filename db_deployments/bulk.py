@@ -0,0 +1,164 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import logging
+import os
+
+from kubernetes.client import ApiException
+from pymongo import ReplaceOne, UpdateMany
+from pymongo.errors import BulkWriteError
+
+from db_deployments.engines import ENGINES
+from db_deployments.provisioner import RETAIN_DATA_DEFAULT, deploy, parse_options, remove, resolve_retain_data
+from db_deployments.quotas import admit
+from utils.database import collection, deployment_key
+from utils.rate_limit import acquire
+
+logger = logging.getLogger(__name__)
+
+MAX_ITEMS = int(os.getenv('BULK_MAX_ITEMS', '100'))
+
+# Kubernetes calls for a batch fan out over this pool; the Mongo metadata for
+# the whole batch is then written with a single bulk_write.
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv('BULK_CONCURRENCY', '16')),
+                               thread_name_prefix='bulk')
+
+
+def parse_items(items, for_create):
+    if not isinstance(items, list) or not items:
+        return None, "A non-empty list of items is required"
+    if len(items) > MAX_ITEMS:
+        return None, f"At most {MAX_ITEMS} items are allowed per request"
+
+    parsed = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            return None, f"Item {index} must be an object"
+        db_type = item.get("type")
+        db_name = item.get("database_name")
+        email = item.get("email")
+        if db_type not in ENGINES:
+            return None, f"Item {index} has unsupported type '{db_type}'"
+        if not db_name or (for_create and not email):
+            return None, f"Item {index} requires database_name{' and email' if for_create else ''}"
+        try:
+            options = parse_options(db_type, item) if for_create else None
+            retain_data = None if for_create else resolve_retain_data(item.get("retain_data"))
+        except ValueError as e:
+            return None, f"Item {index}: {e}"
+        parsed.append({
+            "type": db_type,
+            "db_name": db_name,
+            "email": email,
+            "username": item.get("username"),
+            "options": options,
+            "retain_data": retain_data,
+        })
+    return parsed, None
+
+
+def _admit(item, limited):
+    # Each item counts against its owner's quota; the rate limit is charged
+    # once per owner for the whole request, not per item.
+    if item["email"] in limited:
+        return "Too many create requests, retry later"
+    options = item["options"]
+    return admit(item["email"], item["type"], options["sizing"], options.get("topology"), options.get("pooler"))
+
+
+def _run_create(item):
+    try:
+        record, secrets = deploy(item["type"], item["db_name"], item["email"], item["username"], **item["options"])
+        return record, secrets, None
+    except ApiException as e:
+        logger.error(f"Bulk create of {item['type']} '{item['db_name']}' failed: {e}")
+        return None, None, e.reason or str(e)
+    except Exception as e:
+        # Anything escaping the pool would fail the whole batch and lose the
+        # records and credentials of the items already deployed.
+        logger.exception(f"Bulk create of {item['type']} '{item['db_name']}' failed")
+        return None, None, str(e) or type(e).__name__
+
+
+def _run_remove(item):
+    try:
+        remove(item["type"], item["db_name"], item["retain_data"], item.get("resource_name"), item.get("topology"))
+        return None
+    except ApiException as e:
+        logger.error(f"Bulk delete of {item['type']} '{item['db_name']}' failed: {e}")
+        return e.reason or str(e)
+    except Exception as e:
+        logger.exception(f"Bulk delete of {item['type']} '{item['db_name']}' failed")
+        return str(e) or type(e).__name__
+
+
+def _apply_writes(operations, results, positions):
+    if not operations:
+        return
+    try:
+        collection.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        for error in e.details.get("writeErrors", []):
+            result = results[positions[error["index"]]]
+            result["success"] = False
+            result["error"] = f"Failed to record metadata: {error.get('errmsg')}"
+
+
+def bulk_create(items):
+    limited = {email for email in dict.fromkeys(item["email"] for item in items) if acquire(email)}
+    rejections = [_admit(item, limited) for item in items]
+    created = _executor.map(_run_create, [item for item, error in zip(items, rejections) if error is None])
+    outcomes = [next(created) if error is None else (None, None, error) for error in rejections]
+
+    results, operations, positions = [], [], []
+    for item, (record, secrets, error) in zip(items, outcomes):
+        result = {"type": item["type"], "db_name": item["db_name"], "success": error is None}
+        if error is None:
+            result.update(secrets)
+            operations.append(ReplaceOne(deployment_key(record), record, upsert=True))
+            positions.append(len(results))
+        else:
+            result["error"] = error
+        results.append(result)
+
+    _apply_writes(operations, results, positions)
+    logger.info(f"Bulk created {sum(r['success'] for r in results)}/{len(results)} instances")
+    return results
+
+
+def _attach_records(items):
+    # One lookup for the whole batch instead of one per item.
+    records = collection.find(
+        {"db_name": {"$in": [item["db_name"] for item in items]}, "deleted": False},
+        {"db_name": 1, "type": 1, "resource_name": 1, "topology": 1}
+    )
+    found = {(doc["db_name"], doc.get("type")): doc for doc in records}
+    for item in items:
+        record = found.get((item["db_name"], item["type"]), {})
+        item["resource_name"] = record.get("resource_name")
+        item["topology"] = record.get("topology")
+
+
+def bulk_delete(items):
+    _attach_records(items)
+    errors = list(_executor.map(_run_remove, items))
+
+    results, operations, positions = [], [], []
+    deleted_at = datetime.now()
+    for item, error in zip(items, errors):
+        result = {"type": item["type"], "db_name": item["db_name"], "success": error is None}
+        if error is None:
+            # Older records were written without a type, so match those too.
+            operations.append(UpdateMany(
+                {"db_name": item["db_name"], "type": {"$in": [item["type"], None]}},
+                {"$set": {"status": "deleted", "deleted_at": deleted_at, "deleted": True,
+                          "data_retained": RETAIN_DATA_DEFAULT if item["retain_data"] is None else item["retain_data"]}}
+            ))
+            positions.append(len(results))
+        else:
+            result["error"] = error
+        results.append(result)
+
+    _apply_writes(operations, results, positions)
+    logger.info(f"Bulk deleted {sum(r['success'] for r in results)}/{len(results)} instances")
+    return results
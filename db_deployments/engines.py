@@ -0,0 +1,614 @@
+import json
+import math
+
+# Declarative engine registry. Each engine is one or more components created
+# in order; the component without a suffix is the primary that clients
+# connect to and that the instance record is named after. Manifests are
+# rendered from these entries by db_deployments.provisioner, so adding an
+# engine is a data change. String values may use ${db_name}, ${name},
+# ${username} and ${password}.
+
+# Sizing tiers map to container requests == limits (Guaranteed QoS) on the
+# primary component and to its default volume size; "tuning" derives engine
+# settings from the same budget. Every component persists "data_path" on a
+# PersistentVolumeClaim; companions get a fixed "storage_size".
+
+# An optional "pooler" runs as a sidecar of the primary component when an
+# instance is created with one; the Service port is then routed to it.
+# Pooler strings may also use ${pool_mode}, ${pool_size} and
+# ${max_client_connections} plus the chosen mode's entry in "modes".
+# "files" are rendered into a Secret mounted next to the pooler, with values
+# escaped for a double-quoted string. "server_args" are appended to the
+# primary's arguments.
+
+# "topology_options" are the cluster options an engine accepts on create,
+# each with a "default" and either "choices" or, for integers, a "max" (and
+# "min", default 1) and optionally a "memory_fraction" bounding a size in MiB
+# by the instance's memory; a bool default makes the option a flag. The engine's
+# "topology" function validates them and returns how to lay out the primary
+# component: "replicas", "headless" (the Service gets per-pod DNS), "env",
+# "command", extra "args", a "readiness_probe" and a "post_start" command
+# for its container, "skip" to leave out companion components by suffix,
+# "companions" with the same keys per companion suffix (plus "sized" to give
+# one the primary's sizing and volume size), extra "service_ports" for its
+# Service and "record" fields to store with the instance. Its strings may
+# also use ${namespace} and ${cluster_id}, an id shared by the instance's
+# pods; "$$" is a literal "$".
+
+# Components may also set the container "command" and "init_containers",
+# which run the component's own image.
+
+# Images are pinned to release tags, never latest; db_deployments.images
+# narrows each tag to a digest when one is known.
+POOL_DEFAULTS = {"pool_size": 20, "max_client_connections": 1000}
+MAX_POOL_SIZE = 500
+MAX_CLIENT_CONNECTIONS = 10000
+TIERS = {
+    "small": {"cpu": "500m", "memory": "1Gi", "storage": "10Gi"},
+    "medium": {"cpu": "1", "memory": "4Gi", "storage": "50Gi"},
+    "large": {"cpu": "4", "memory": "16Gi", "storage": "200Gi"},
+}
+
+
+def _postgres_tuning(memory_mib, cpu):
+    return {"args": [
+        "-c", f"shared_buffers={memory_mib // 4}MB",
+        "-c", f"effective_cache_size={memory_mib * 3 // 4}MB",
+        "-c", f"max_connections={min(max(memory_mib // 16, 50), 500)}",
+        "-c", f"max_worker_processes={max(int(cpu), 2)}",
+    ]}
+
+
+def _mysql_tuning(memory_mib, cpu):
+    return {"args": [
+        f"--innodb-buffer-pool-size={memory_mib * 3 // 5}M",
+        f"--max-connections={min(max(memory_mib // 16, 100), 1000)}",
+    ]}
+
+
+def _mongodb_tuning(memory_mib, cpu):
+    # Mongo's own default is 50% of (RAM - 1GB), floored at 256MB.
+    cache_gb = max((memory_mib - 1024) / 2048, 0.25)
+    return {"args": ["--wiredTigerCacheSizeGB", f"{cache_gb:.2f}"]}
+
+
+def _redis_tuning(memory_mib, cpu):
+    # Leave headroom for fragmentation and replication buffers.
+    return {"args": ["--maxmemory", f"{memory_mib * 3 // 4}mb", "--maxmemory-policy", "allkeys-lru"]}
+
+
+REDIS_AUTH = ('--requirepass "$$REDIS_PASSWORD" --masterauth "$$REDIS_PASSWORD" '
+              '--replica-announce-ip "$$HOSTNAME.${db_name}"')
+REDIS_CLI = 'redis-cli -a "$$REDIS_PASSWORD" --no-auth-warning'
+
+
+def _redis_topology(options):
+    replicas, shards = options["replicas"], options["shards"]
+    if shards and not options["cluster"]:
+        raise ValueError("shards requires cluster mode")
+    if options["profile"] == "cache":
+        # No RDB snapshots or AOF, so no fork latency; evict instead of failing writes.
+        args = ["--save", "", "--appendonly", "no"]
+    else:
+        args = ["--appendonly", "yes", "--appendfsync", "everysec", "--save", "",
+                "--maxmemory-policy", "noeviction"]
+
+    if options["cluster"]:
+        shards = shards or 3
+        pods = shards * (replicas + 1)
+        nodes = " ".join(f"${{db_name}}-{index}.${{db_name}}" for index in range(pods))
+        # The first pod joins every node into a cluster once all of them
+        # answer, unless it already belongs to one.
+        script = (
+            'if [ "$${HOSTNAME##*-}" = 0 ]; then ('
+            f'for node in {nodes}; do until {REDIS_CLI} -h $$node ping >/dev/null 2>&1; do sleep 2; done; done; '
+            f'{REDIS_CLI} cluster info | grep -q cluster_known_nodes:1 && '
+            f'{REDIS_CLI} --cluster create $$(for node in {nodes}; do '
+            'echo "$$(getent hosts $$node | cut -d " " -f 1):6379"; done) '
+            f'--cluster-replicas {replicas} --cluster-yes) & fi; '
+            f'exec redis-server {REDIS_AUTH} --cluster-enabled yes --cluster-config-file /data/nodes.conf '
+            '--cluster-announce-hostname "$$HOSTNAME.${db_name}" --cluster-preferred-endpoint-type hostname "$$@"'
+        )
+        return {
+            "replicas": pods,
+            "headless": True,
+            "command": ["sh", "-c", script, "--"],
+            "args": args,
+            "readiness_probe": {"exec": {"command": [
+                "sh", "-c", f"{REDIS_CLI} cluster info | grep -q cluster_state:ok"]}},
+            "skip": ["-sentinel"],
+        }
+
+    # Pod 0 starts as the primary and the rest replicate it; after a
+    # failover, restarted pods follow whichever primary Sentinel reports.
+    script = (
+        'self="$$HOSTNAME.${db_name}"; primary=""; '
+        + ('primary=$$(redis-cli -h ${db_name}-sentinel -p 26379 --raw '
+           'SENTINEL get-master-addr-by-name primary 2>/dev/null | head -n 1); ' if replicas else '')
+        + '[ -z "$$primary" ] && [ "$${HOSTNAME##*-}" != 0 ] && primary="${db_name}-0.${db_name}"; '
+        'if [ -n "$$primary" ] && [ "$$primary" != "$$self" ]; then set -- "$$@" --replicaof "$$primary" 6379; fi; '
+        f'exec redis-server {REDIS_AUTH} "$$@"'
+    )
+    settings = {
+        "replicas": replicas + 1,
+        "headless": bool(replicas),
+        "command": ["sh", "-c", script, "--"],
+        "args": args,
+        "skip": [] if replicas else ["-sentinel"],
+    }
+    if replicas:
+        settings["record"] = {"sentinel": "${db_name}-sentinel.${namespace}.svc:26379", "sentinel_primary": "primary"}
+        settings["companions"] = {"-sentinel": {
+            "replicas": 3,
+            "headless": True,
+            # Sentinel rewrites its own config as it learns the topology.
+            "command": ["sh", "-c",
+                        'test -f /data/sentinel.conf || printf "%s\\n" "port 26379" '
+                        '"sentinel resolve-hostnames yes" "sentinel announce-hostnames yes" '
+                        '"sentinel announce-ip $$HOSTNAME.${name}" '
+                        '"sentinel monitor primary ${db_name}-0.${db_name} 6379 2" '
+                        '"sentinel down-after-milliseconds primary 5000" '
+                        '"sentinel failover-timeout primary 60000" > /data/sentinel.conf; '
+                        # Arguments are quoted for the config parser, the file is not.
+                        'exec redis-sentinel /data/sentinel.conf --sentinel auth-pass primary "$$REDIS_PASSWORD"'],
+        }}
+    return settings
+
+
+def _jvm_heap_mib(memory_mib):
+    # Half the container for heap, capped below the compressed-oops limit.
+    return min(memory_mib // 2, 31 * 1024)
+
+
+def _elasticsearch_tuning(memory_mib, cpu):
+    heap = _jvm_heap_mib(memory_mib)
+    return {"env": {"ES_JAVA_OPTS": f"-Xms{heap}m -Xmx{heap}m"}}
+
+
+def _elasticsearch_topology(options):
+    nodes, masters = options["nodes"], options["masters"]
+    if masters % 2 == 0 and masters:
+        raise ValueError("masters must be 0 or an odd number, so a majority can be elected")
+    replicas = options["replicas"] if options["replicas"] is not None else min(nodes - 1, 1)
+    if replicas > nodes - 1:
+        raise ValueError(f"replicas must be below the {nodes} data nodes, or shards stay unassigned")
+
+    if nodes == 1 and not masters:
+        discovery = {"discovery.type": "single-node"}
+    else:
+        eligible = "${db_name}-master" if masters else "${db_name}"
+        discovery = {"discovery.seed_hosts": eligible, "cluster.initial_master_nodes": ",".join(
+            f"{eligible}-{index}" for index in range(masters or nodes))}
+    discovery["cluster.name"] = "${db_name}"
+    roles = ["data"] + ([] if masters else ["master"]) + (["ingest"] if options["ingest"] else [])
+    env = {name: value for name, value in discovery.items()
+           if not (masters and name == "cluster.initial_master_nodes")}
+    env["node.roles"] = ",".join(roles)
+    if options["heap_mb"]:
+        env["ES_JAVA_OPTS"] = f"-Xms{options['heap_mb']}m -Xmx{options['heap_mb']}m"
+
+    # Index defaults cannot be node settings, so every data node installs
+    # them as a low-order template once the cluster answers.
+    index = {"index.number_of_replicas": replicas}
+    if options["shards"]:
+        index["index.number_of_shards"] = options["shards"]
+    refresh = options["refresh_interval_seconds"] or (30 if options["profile"] == "bulk" else None)
+    if refresh:
+        index["index.refresh_interval"] = f"{refresh}s"
+    if options["profile"] == "bulk":
+        # Fewer, larger segments and flushes while ingesting.
+        env["indices.memory.index_buffer_size"] = "30%"
+        index["index.translog.flush_threshold_size"] = "1gb"
+    env["INDEX_TEMPLATE"] = json.dumps({"index_patterns": ["*"], "order": -1, "settings": index})
+    return {
+        "replicas": nodes,
+        "headless": nodes > 1,
+        "env": env,
+        "post_start": ["sh", "-c", "for attempt in $$(seq 60); do "
+                       "curl -sf -o /dev/null -X PUT localhost:9200/_template/clickclouddb-defaults "
+                       "-H 'Content-Type: application/json' -d \"$$INDEX_TEMPLATE\" && exit 0; sleep 5; done"],
+        "skip": [] if masters else ["-master"],
+        "companions": {"-master": {
+            "replicas": masters,
+            "headless": True,
+            "env": dict(discovery, **{"node.roles": "master"}),
+        }},
+    }
+
+
+def _kafka_tuning(memory_mib, cpu):
+    heap = _jvm_heap_mib(memory_mib)
+    cores = max(math.ceil(cpu), 1)
+    return {"env": {
+        "KAFKA_HEAP_OPTS": f"-Xms{heap}m -Xmx{heap}m",
+        "KAFKA_CFG_NUM_NETWORK_THREADS": str(max(cores, 3)),
+        "KAFKA_CFG_NUM_IO_THREADS": str(max(cores * 2, 8)),
+    }}
+
+
+def _kafka_topology(options):
+    brokers = options["brokers"]
+    replication = options["replication_factor"] or min(brokers, 3)
+    if replication > brokers:
+        raise ValueError(f"replication_factor cannot exceed the {brokers} brokers")
+    min_in_sync = max(replication - 1, 1)
+    env = {
+        "KAFKA_CFG_NUM_PARTITIONS": options["partitions"] or brokers * 3,
+        "KAFKA_CFG_DEFAULT_REPLICATION_FACTOR": replication,
+        "KAFKA_CFG_MIN_INSYNC_REPLICAS": min_in_sync,
+        "KAFKA_CFG_OFFSETS_TOPIC_REPLICATION_FACTOR": replication,
+        "KAFKA_CFG_TRANSACTION_STATE_LOG_REPLICATION_FACTOR": replication,
+        "KAFKA_CFG_TRANSACTION_STATE_LOG_MIN_ISR": min_in_sync,
+    }
+    for option, name in (("retention_hours", "KAFKA_CFG_LOG_RETENTION_HOURS"),
+                         ("network_threads", "KAFKA_CFG_NUM_NETWORK_THREADS"),
+                         ("io_threads", "KAFKA_CFG_NUM_IO_THREADS")):
+        if options[option]:
+            env[name] = options[option]
+    if options["segment_mb"]:
+        env["KAFKA_CFG_LOG_SEGMENT_BYTES"] = options["segment_mb"] * 1024 * 1024
+
+    if options["kraft"]:
+        # Every broker is also a controller voter; no Zookeeper.
+        id_setting = "KAFKA_CFG_NODE_ID"
+        env.update({
+            "KAFKA_CFG_PROCESS_ROLES": "broker,controller",
+            "KAFKA_CFG_LISTENERS": "PLAINTEXT://:9092,CONTROLLER://:9093",
+            "KAFKA_CFG_LISTENER_SECURITY_PROTOCOL_MAP": "PLAINTEXT:PLAINTEXT,CONTROLLER:PLAINTEXT",
+            "KAFKA_CFG_CONTROLLER_LISTENER_NAMES": "CONTROLLER",
+            "KAFKA_CFG_CONTROLLER_QUORUM_VOTERS": ",".join(
+                f"{index}@${{name}}-{index}.${{name}}:9093" for index in range(brokers)),
+            "KAFKA_KRAFT_CLUSTER_ID": "${cluster_id}",
+        })
+    else:
+        id_setting = "KAFKA_CFG_BROKER_ID"
+        env["KAFKA_CFG_ZOOKEEPER_CONNECT"] = "${db_name}-zookeeper:2181"
+    return {
+        "replicas": brokers,
+        "headless": True,
+        "env": env,
+        # Brokers take their id from the pod ordinal and advertise their own
+        # address, so clients can reach the leader of each partition.
+        "command": ["/bin/bash", "-c",
+                    f"export {id_setting}=$${{HOSTNAME##*-}} "
+                    "KAFKA_CFG_ADVERTISED_LISTENERS=PLAINTEXT://$${HOSTNAME}.${name}.${namespace}.svc:9092; "
+                    "exec /opt/bitnami/scripts/kafka/entrypoint.sh /opt/bitnami/scripts/kafka/run.sh"],
+        "skip": ["-zookeeper"] if options["kraft"] else [],
+    }
+
+
+# "claim" builds the command run in a warm pool instance's primary container
+# when it is handed to a new owner: it must switch to ${password} and, where
+# the engine names a database after the instance, rename it to db_name.
+def _postgres_claim(context):
+    password = context["password"].replace("'", "''")
+    old_name = context["name"].replace('"', '""')
+    db_name = context["db_name"].replace('"', '""')
+    return ["psql", "-v", "ON_ERROR_STOP=1", "-U", context["username"], "-d", "postgres",
+            "-c", f"ALTER USER CURRENT_USER PASSWORD '{password}'",
+            "-c", f'ALTER DATABASE "{old_name}" RENAME TO "{db_name}"']
+
+
+def _mysql_claim(context):
+    password = context["password"].replace("\\", "\\\\").replace("'", "\\'")
+    return ["mysql", "-uroot", f"-p{context['old_password']}", "-e",
+            f"ALTER USER 'root'@'%' IDENTIFIED BY '{password}'; "
+            f"ALTER USER 'root'@'localhost' IDENTIFIED BY '{password}'"]
+
+
+# Read replicas run as a "-replica" companion sized like the primary; its
+# Service is the read-only endpoint. They replicate from the primary's
+# "replication" Service port, which bypasses any pooler.
+# "replica_lag" prints a replica's lag in seconds when run in its container.
+def _replica_record(port):
+    return {"writer": f"${{db_name}}.${{namespace}}.svc:{port}",
+            "reader": f"${{db_name}}-replica.${{namespace}}.svc:{port}"}
+
+
+def _postgres_topology(options):
+    if not options["replicas"]:
+        return {"skip": ["-replica"]}
+    hba = "/var/lib/postgresql/data/hba.conf"
+    cloned = "/var/lib/postgresql/data/cloned"
+    return {
+        # The image's own rules plus streaming replication.
+        "command": ["sh", "-c", 'printf "%s\\n" "local all all trust" "host all all all scram-sha-256" '
+                    f'"host replication all all scram-sha-256" > {hba}; exec docker-entrypoint.sh "$$@"', "--"],
+        "args": ["-c", f"hba_file={hba}", "-c", "wal_keep_size=1024MB"],
+        "service_ports": [{"name": "replication", "port": 5433, "targetPort": 5432}],
+        "companions": {"-replica": {
+            "replicas": options["replicas"],
+            "sized": True,
+            # Clone the primary once; -R makes the copy a standby of it.
+            "command": ["sh", "-c",
+                        f'if [ ! -f {cloned} ]; then rm -rf "$$PGDATA"; '
+                        'until PGPASSWORD="$$POSTGRES_PASSWORD" pg_basebackup -h ${db_name} -p 5433 '
+                        '-U "$$POSTGRES_USER" -D "$$PGDATA" -R -X stream -c fast; '
+                        f'do rm -rf "$$PGDATA"; sleep 5; done; touch {cloned}; fi; '
+                        'exec docker-entrypoint.sh "$$@"', "--"],
+        }},
+        "record": _replica_record(5432),
+    }
+
+
+def _mysql_topology(options):
+    if not options["replicas"]:
+        return {"skip": ["-replica"]}
+    gtid = ["--gtid-mode=ON", "--enforce-gtid-consistency=ON", "--log-bin=binlog"]
+    mysql = 'mysql -h 127.0.0.1 -uroot -p"$$MYSQL_ROOT_PASSWORD"'
+    # Once the server takes TCP connections (so not the one the entrypoint
+    # initialises with), point it at the primary unless it already is, then
+    # make it read-only. The password is escaped for a SQL string.
+    configure = (
+        f'until {mysql} -e "SELECT 1" >/dev/null 2>&1; do sleep 2; done; '
+        'password=$$(printf "%s" "$$MYSQL_ROOT_PASSWORD" | sed "s/[\\\\\']/\\\\\\\\&/g"); '
+        f'{mysql} -e "SHOW REPLICA STATUS\\G" 2>/dev/null | grep -q Source_Host || '
+        f'{mysql} -e "CHANGE REPLICATION SOURCE TO SOURCE_HOST=\'${{db_name}}\', SOURCE_PORT=3307, '
+        "SOURCE_USER='root', SOURCE_PASSWORD='$$password', SOURCE_AUTO_POSITION=1, "
+        'GET_SOURCE_PUBLIC_KEY=1; START REPLICA"; '
+        f'{mysql} -e "SET GLOBAL super_read_only = ON"'
+    )
+    return {
+        "args": ["--server-id=1"] + gtid,
+        "service_ports": [{"name": "replication", "port": 3307, "targetPort": 3306}],
+        "companions": {"-replica": {
+            "replicas": options["replicas"],
+            "sized": True,
+            "command": ["sh", "-c", f'({configure}) & '
+                        'exec docker-entrypoint.sh "$$@" --server-id=$$((100 + $${HOSTNAME##*-}))', "--"],
+            "args": gtid,
+        }},
+        "record": _replica_record(3306),
+    }
+
+
+def _mongodb_claim(context):
+    return ["mongosh", "admin", "--quiet", "-u", context["username"], "-p", context["old_password"],
+            "--eval", f"db.changeUserPassword({json.dumps(context['username'])}, {json.dumps(context['password'])})"]
+
+
+POSTGRES_SERVER = {
+    "image": "postgres:16.4",
+    "port": 5432,
+    "data_path": "/var/lib/postgresql/data",
+    "fs_group": 26,
+    "env": {
+        # initdb must own PGDATA, so keep it below the mount point.
+        "PGDATA": "/var/lib/postgresql/data/pgdata",
+        "POSTGRES_DB": "${db_name}",
+        "POSTGRES_USER": "${username}",
+        "POSTGRES_PASSWORD": "${password}",
+    },
+    "security_context": {"runAsUser": 26},
+    "readiness_probe": {"exec": {"command": ["pg_isready", "-U", "${username}", "-d", "${db_name}"]}},
+}
+
+MYSQL_SERVER = {
+    "image": "mysql:8.0.39",
+    "port": 3306,
+    "data_path": "/var/lib/mysql",
+    "env": {
+        "MYSQL_ROOT_PASSWORD": "${password}",
+    },
+    "readiness_probe": {"exec": {"command": ["mysqladmin", "ping", "-h", "127.0.0.1"]}},
+}
+
+# Shared by Elasticsearch data and master nodes. The node needs a higher
+# vm.max_map_count, set on the host by a privileged init container, and
+# locks its heap in memory: the entrypoint raises the memlock limit as root
+# and then drops to the elasticsearch user, which inherits it.
+ELASTICSEARCH_NODE = {
+    "image": "docker.elastic.co/elasticsearch/elasticsearch:7.10.0",
+    "port": 9200,
+    "data_path": "/usr/share/elasticsearch/data",
+    "fs_group": 1000,
+    "env": {
+        "bootstrap.memory_lock": "true",
+    },
+    "command": ["sh", "-c", "ulimit -l unlimited && exec /usr/local/bin/docker-entrypoint.sh eswrapper"],
+    "security_context": {"runAsUser": 0, "capabilities": {"add": ["IPC_LOCK", "SYS_RESOURCE"]}},
+    "init_containers": [{
+        "name": "sysctl",
+        "command": ["sysctl", "-w", "vm.max_map_count=262144"],
+        "securityContext": {"privileged": True, "runAsUser": 0},
+    }],
+}
+
+
+ENGINES = {
+    "postgres": {
+        "display_name": "Postgres database",
+        "tuning": _postgres_tuning,
+        "claim": _postgres_claim,
+        "topology": _postgres_topology,
+        "topology_options": {"replicas": {"default": 0, "min": 0, "max": 5}},
+        "replica_lag": ["sh", "-c", 'psql -U "$POSTGRES_USER" -d postgres -tAc "SELECT CASE WHEN '
+                        'pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+                        'ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"'],
+        "default_username": "postgres",
+        "components": [POSTGRES_SERVER, dict(POSTGRES_SERVER, suffix="-replica")],
+        "pooler": {
+            "name": "pgbouncer",
+            "image": "bitnami/pgbouncer:1.23.1",
+            "port": 6432,
+            "default_mode": "transaction",
+            "modes": {"session": {}, "transaction": {}, "statement": {}},
+            "env": {
+                "POSTGRESQL_HOST": "127.0.0.1",
+                "POSTGRESQL_USERNAME": "${username}",
+                "POSTGRESQL_PASSWORD": "${password}",
+                "POSTGRESQL_DATABASE": "${db_name}",
+                "PGBOUNCER_DATABASE": "${db_name}",
+                "PGBOUNCER_AUTH_TYPE": "scram-sha-256",
+                "PGBOUNCER_POOL_MODE": "${pool_mode}",
+                "PGBOUNCER_DEFAULT_POOL_SIZE": "${pool_size}",
+                "PGBOUNCER_MAX_CLIENT_CONN": "${max_client_connections}",
+            },
+            "resources": {"cpu": "100m", "memory": "64Mi"},
+        },
+    },
+    "mysql": {
+        "display_name": "MySQL instance",
+        "tuning": _mysql_tuning,
+        "claim": _mysql_claim,
+        "topology": _mysql_topology,
+        "topology_options": {"replicas": {"default": 0, "min": 0, "max": 5}},
+        "replica_lag": ["sh", "-c", 'mysql -uroot -p"$MYSQL_ROOT_PASSWORD" -e "SHOW REPLICA STATUS\\G" 2>/dev/null '
+                        '| sed -n "s/^ *Seconds_Behind_Source: //p"'],
+        "store_password": True,
+        "components": [MYSQL_SERVER, dict(MYSQL_SERVER, suffix="-replica")],
+        "pooler": {
+            "name": "proxysql",
+            "image": "proxysql/proxysql:2.5.5",
+            "port": 6033,
+            # ProxySQL multiplexes backend connections between transactions;
+            # session mode pins each client to its backend connection.
+            "default_mode": "transaction",
+            "modes": {"session": {"multiplexing": "false"}, "transaction": {"multiplexing": "true"}},
+            # The admin interface only listens on the pod's loopback.
+            "files": {
+                "/etc/proxysql.cnf": """datadir="/var/lib/proxysql"
+admin_variables={ admin_credentials="admin:admin" mysql_ifaces="127.0.0.1:6032" }
+mysql_variables={
+    interfaces="0.0.0.0:6033"
+    max_connections=${max_client_connections}
+    multiplexing=${multiplexing}
+    monitor_enabled=false
+    server_version="8.0.0"
+}
+mysql_servers=({ address="127.0.0.1" port=3306 hostgroup=0 max_connections=${pool_size} })
+mysql_users=({ username="root" password="${password}" default_hostgroup=0 })
+""",
+            },
+            # ProxySQL 2.5 authenticates to backends with native passwords only.
+            "server_args": ["--default-authentication-plugin=mysql_native_password"],
+            "resources": {"cpu": "100m", "memory": "128Mi"},
+        },
+    },
+    "mongodb": {
+        "display_name": "MongoDB instance",
+        "tuning": _mongodb_tuning,
+        "claim": _mongodb_claim,
+        "default_username": "mongo",
+        "components": [{
+            "image": "mongo:7.0.14",
+            "port": 27017,
+            "data_path": "/data/db",
+            "env": {
+                "MONGO_INITDB_ROOT_USERNAME": "${username}",
+                "MONGO_INITDB_ROOT_PASSWORD": "${password}",
+            },
+        }],
+    },
+    "redis": {
+        "display_name": "Redis instance",
+        "tuning": _redis_tuning,
+        "topology": _redis_topology,
+        "topology_options": {
+            "profile": {"default": "cache", "choices": ["cache", "durable"]},
+            # Replicas of the primary, failed over by Sentinel; in cluster
+            # mode, replicas of every shard.
+            "replicas": {"default": 0, "min": 0, "max": 5},
+            "cluster": {"default": False},
+            "shards": {"default": None, "min": 3, "max": 16},
+        },
+        "components": [
+            {
+                "image": "redis:7.4.0",
+                "port": 6379,
+                "data_path": "/data",
+                "env": {"REDIS_PASSWORD": "${password}"},
+            },
+            {
+                "suffix": "-sentinel",
+                "image": "redis:7.4.0",
+                "port": 26379,
+                "data_path": "/data",
+                "storage_size": "1Gi",
+                "env": {"REDIS_PASSWORD": "${password}"},
+                "resources": {"cpu": "100m", "memory": "64Mi"},
+            },
+        ],
+    },
+    "kafka": {
+        "display_name": "Kafka instance",
+        "tuning": _kafka_tuning,
+        "topology": _kafka_topology,
+        "topology_options": {
+            "brokers": {"default": 1, "max": 9},
+            "kraft": {"default": False},
+            "partitions": {"default": None, "max": 10000},
+            "replication_factor": {"default": None, "max": 9},
+            "retention_hours": {"default": None, "max": 87600},
+            "segment_mb": {"default": None, "max": 2047},
+            "network_threads": {"default": None, "max": 64},
+            "io_threads": {"default": None, "max": 256},
+        },
+        "password": False,
+        "components": [
+            {
+                "suffix": "-zookeeper",
+                "image": "bitnami/zookeeper:3.9.2",
+                "port": 2181,
+                "data_path": "/bitnami/zookeeper",
+                "fs_group": 1001,
+                "storage_size": "1Gi",
+                "env": {
+                    "ALLOW_ANONYMOUS_LOGIN": "yes",
+                    "ZOO_HEAP_SIZE": "256",
+                },
+                "resources": {"cpu": "250m", "memory": "512Mi"},
+            },
+            {
+                "image": "bitnami/kafka:3.7.1",
+                "port": 9092,
+                "data_path": "/bitnami/kafka",
+                "fs_group": 1001,
+                "env": {
+                    "ALLOW_PLAINTEXT_LISTENER": "yes",
+                },
+            },
+        ],
+    },
+    "elasticsearch": {
+        "display_name": "Elasticsearch instance",
+        "tuning": _elasticsearch_tuning,
+        "topology": _elasticsearch_topology,
+        "topology_options": {
+            # Data nodes; without dedicated masters they are master-eligible.
+            "nodes": {"default": 1, "max": 20},
+            "masters": {"default": 0, "min": 0, "max": 5},
+            "ingest": {"default": True},
+            # More than half the container leaves too little for Lucene.
+            "heap_mb": {"default": None, "max": 31 * 1024, "memory_fraction": 0.5},
+            "shards": {"default": None, "max": 64},
+            "replicas": {"default": None, "min": 0, "max": 19},
+            "refresh_interval_seconds": {"default": None, "max": 3600},
+            "profile": {"default": "default", "choices": ["default", "bulk"]},
+        },
+        "password": False,
+        "components": [
+            dict(ELASTICSEARCH_NODE, readiness_probe={
+                "httpGet": {"path": "/_cluster/health?local=true", "port": 9200}}),
+            dict(ELASTICSEARCH_NODE, suffix="-master", storage_size="1Gi",
+                 env=dict(ELASTICSEARCH_NODE["env"], ES_JAVA_OPTS="-Xms512m -Xmx512m"),
+                 resources={"cpu": "500m", "memory": "1Gi"}),
+        ],
+    },
+}
+
+# Route names that predate the generic /create/<engine> endpoints.
+LEGACY_CREATE_ROUTES = {
+    "create_database": "postgres",
+    "create_mysql": "mysql",
+    "create_mongodb": "mongodb",
+    "create_redis": "redis",
+    "create_kafka": "kafka",
+    "create_elasticsearch": "elasticsearch",
+}
+
+LEGACY_DELETE_ROUTES = {
+    "delete_database": "postgres",
+    "delete_redis": "redis",
+    "delete_kafka": "kafka",
+}
@@ -0,0 +1,197 @@
+from datetime import datetime, timedelta
+
+import hashlib
+import logging
+import os
+import threading
+import time
+
+from kubernetes.client import ApiException
+from pymongo import ReturnDocument
+
+from db_deployments.engines import ENGINES
+from utils.database import image_digests_collection
+from utils.kube import call_with_retries, get_apps_v1_api, get_core_v1_api
+
+logger = logging.getLogger(__name__)
+
+# Every image an instance can run is pinned to a digest when one is known,
+# so all nodes run the same bits and a moved tag never changes a running
+# engine. Digests come from IMAGE_DIGESTS ("postgres:16.4=sha256:...,...")
+# or are learnt from what the pre-puller pulled. Pods use IfNotPresent
+# either way. A learnt digest is used for IMAGE_DIGEST_MAX_AGE; the tag is
+# then pulled afresh and learnt again, so a re-pushed tag is picked up.
+PULL_POLICY = "IfNotPresent"
+DIGEST_CACHE_SECONDS = 60
+DIGEST_MAX_AGE_SECONDS = int(os.getenv('IMAGE_DIGEST_MAX_AGE', str(24 * 3600)))
+
+# Optional DaemonSet, kept in sync by the leader, that pulls every catalog
+# image onto every node ahead of the first instance that needs it.
+PREPULL_ENABLED = os.getenv('PREPULL_ENABLED', 'false').lower() == 'true'
+PREPULL_INTERVAL_SECONDS = int(os.getenv('PREPULL_INTERVAL', '300'))
+PREPULLER_NAME = "clickclouddb-prepuller"
+PAUSE_IMAGE = os.getenv('PREPULL_PAUSE_IMAGE', 'registry.k8s.io/pause:3.9')
+CATALOG_ANNOTATION = "clickclouddb/catalog"
+
+
+def _parse_digests(value):
+    digests = {}
+    for entry in value.split(','):
+        ref, _, digest = entry.strip().rpartition('=')
+        if ref and digest.startswith('sha256:'):
+            digests[ref] = digest
+        elif entry.strip():
+            logger.warning(f"Ignoring invalid IMAGE_DIGESTS entry '{entry.strip()}'")
+    return digests
+
+
+PINNED_DIGESTS = _parse_digests(os.getenv('IMAGE_DIGESTS', ''))
+
+_lock = threading.Lock()
+_learnt = {}
+_learnt_at = 0.0
+
+
+def catalog():
+    # Every image tag the registry can deploy, in a stable order.
+    refs = set()
+    for spec in ENGINES.values():
+        refs.update(component["image"] for component in spec["components"])
+        if spec.get("pooler"):
+            refs.add(spec["pooler"]["image"])
+    return sorted(refs)
+
+
+def _learnt_digests():
+    global _learnt, _learnt_at
+    with _lock:
+        if time.monotonic() - _learnt_at > DIGEST_CACHE_SECONDS:
+            try:
+                cutoff = datetime.now() - timedelta(seconds=DIGEST_MAX_AGE_SECONDS)
+                _learnt = {doc["ref"]: doc["digest"]
+                           for doc in image_digests_collection.find({"learnt_at": {"$gt": cutoff}}, {"_id": 0})}
+            except Exception as e:
+                logger.error(f"Failed to load learnt image digests: {e}")
+            _learnt_at = time.monotonic()
+        return _learnt
+
+
+def resolve(ref):
+    # "repo:tag" -> "repo:tag@sha256:..." when the digest is known.
+    if '@' in ref:
+        return ref
+    digest = PINNED_DIGESTS.get(ref) or _learnt_digests().get(ref)
+    return f"{ref}@{digest}" if digest else ref
+
+
+def pin(pod_spec):
+    for container in pod_spec.get("initContainers", []) + pod_spec["containers"]:
+        container["image"] = resolve(container["image"])
+        container["imagePullPolicy"] = PULL_POLICY
+
+
+def _prepuller(refs):
+    resources = {"requests": {"cpu": "10m", "memory": "16Mi"}, "limits": {"cpu": "50m", "memory": "32Mi"}}
+    labels = {"app": PREPULLER_NAME}
+    return {
+        "apiVersion": "apps/v1",
+        "kind": "DaemonSet",
+        "metadata": {
+            "name": PREPULLER_NAME,
+            "labels": labels,
+            "annotations": {CATALOG_ANNOTATION: hashlib.sha256(" ".join(refs).encode()).hexdigest()[:16]},
+        },
+        "spec": {
+            "selector": {"matchLabels": labels},
+            "template": {
+                "metadata": {"labels": labels},
+                "spec": {
+                    # Each init container only has to start for its image to
+                    # be pulled; the pause container then keeps the pod around.
+                    # Tags not pinned yet are always pulled, so a node never
+                    # reports the digest of a stale cached copy.
+                    "initContainers": [
+                        {"name": f"pull-{index}", "image": ref,
+                         "imagePullPolicy": PULL_POLICY if '@' in ref else "Always",
+                         "command": ["sh", "-c", "true"], "resources": resources}
+                        for index, ref in enumerate(refs)
+                    ],
+                    "containers": [{"name": "pause", "image": PAUSE_IMAGE, "resources": resources}],
+                },
+            },
+        },
+    }
+
+
+def _learn(namespace):
+    # Pins each tag to the digest the nodes resolved it to, once every
+    # pre-puller pod that has pulled it agrees. Statuses are matched to
+    # images by container name, as their order is not guaranteed.
+    pods = call_with_retries(get_core_v1_api().list_namespaced_pod, namespace,
+                             label_selector=f"app={PREPULLER_NAME}").items
+    seen = {}
+    for pod in pods:
+        images = {container.name: container.image for container in pod.spec.init_containers or []}
+        for status in pod.status.init_container_statuses or []:
+            ref = images.get(status.name)
+            if ref and status.image_id and '@sha256:' in status.image_id:
+                seen.setdefault(ref, set()).add(status.image_id.rpartition('@')[2])
+    for ref, digests in seen.items():
+        if '@' in ref or ref in PINNED_DIGESTS:
+            continue
+        if len(digests) > 1:
+            logger.warning(f"Nodes pulled different digests for '{ref}': {', '.join(sorted(digests))}")
+            continue
+        digest = digests.pop()
+        previous = image_digests_collection.find_one_and_update(
+            {"ref": ref}, {"$set": {"digest": digest, "learnt_at": datetime.now()}}, upsert=True,
+            return_document=ReturnDocument.BEFORE)
+        if previous is None or previous["digest"] != digest:
+            logger.info(f"Pinned '{ref}' to {digest}")
+
+
+def sync_prepuller(namespace=None):
+    namespace = namespace or os.getenv('K8S_NAMESPACE', 'default')
+    refs = [resolve(ref) for ref in catalog()]
+    body = _prepuller(refs)
+    apps_v1_api = get_apps_v1_api()
+    try:
+        current = call_with_retries(apps_v1_api.read_namespaced_daemon_set, PREPULLER_NAME, namespace)
+    except ApiException as e:
+        if e.status != 404:
+            raise
+        call_with_retries(apps_v1_api.create_namespaced_daemon_set, namespace, body)
+        logger.info(f"Created image pre-puller for {len(refs)} images")
+        return
+    if (current.metadata.annotations or {}).get(CATALOG_ANNOTATION) != body["metadata"]["annotations"][CATALOG_ANNOTATION]:
+        body["metadata"]["resourceVersion"] = current.metadata.resource_version
+        call_with_retries(apps_v1_api.replace_namespaced_daemon_set, PREPULLER_NAME, namespace, body)
+        logger.info(f"Updated image pre-puller to {len(refs)} images")
+        return
+    _learn(namespace)
+
+
+_stopped = threading.Event()
+_thread = None
+
+
+def _run():
+    while not _stopped.is_set():
+        try:
+            sync_prepuller()
+        except Exception:
+            logger.exception("Image pre-puller sync failed")
+        _stopped.wait(PREPULL_INTERVAL_SECONDS)
+
+
+def start_prepuller():
+    global _thread
+    _stopped.clear()
+    if not PREPULL_ENABLED or (_thread is not None and _thread.is_alive()):
+        return
+    _thread = threading.Thread(target=_run, name="image-prepuller", daemon=True)
+    _thread.start()
+
+
+def stop_prepuller():
+    _stopped.set()
@@ -0,0 +1,700 @@
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from functools import lru_cache, partial
+from string import Template
+
+import base64
+import json
+import logging
+import os
+import time
+import uuid
+
+from kubernetes.client import ApiException
+from kubernetes.utils import parse_quantity
+
+from db_deployments import images
+from db_deployments.engines import ENGINES, MAX_CLIENT_CONNECTIONS, MAX_POOL_SIZE, POOL_DEFAULTS, TIERS
+from utils.database import collection, deployment_key
+from utils.helpers import generate_password
+from utils.kube import call_with_retries, get_apps_v1_api, get_core_v1_api
+from utils.metrics import stage
+from utils.readiness import initial_status
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIER = os.getenv('DEFAULT_SIZING_TIER', 'small')
+DEFAULT_STORAGE_CLASS = os.getenv('DEFAULT_STORAGE_CLASS') or None
+RETAIN_DATA_DEFAULT = os.getenv('RETAIN_DATA_ON_DELETE', 'false').lower() == 'true'
+
+# Independent Kubernetes calls within one create or delete go out together.
+# Kept apart from the job and bulk pools, whose threads wait on this one.
+_kube_executor = ThreadPoolExecutor(max_workers=int(os.getenv('K8S_CALL_CONCURRENCY', '16')),
+                                    thread_name_prefix='kube')
+DATA_VOLUME = "data"
+POOLER_VOLUME = "pooler-config"
+POOLER_SUFFIX = "-pooler"
+# Every object a create applies carries the request's idempotency key and the
+# run that applied it, so a replayed create can tell its own objects apart.
+# Volume claims get the key as a label, so a rollback only deletes claims it
+# made and never volumes retained from an earlier instance of the same name.
+IDEMPOTENCY_ANNOTATION = IDEMPOTENCY_LABEL = "clickclouddb/idempotency-key"
+RUN_ANNOTATION = "clickclouddb/run"
+REPLACE_TIMEOUT = 60
+
+
+def _statefulset_template(engine, component):
+    labels = {"app": "${name}", "engine": engine}
+    container = {
+        "name": "${name}",
+        "image": component["image"],
+        "ports": [{"containerPort": component["port"]}],
+        "env": [{"name": name, "value": value} for name, value in component.get("env", {}).items()],
+        "readinessProbe": dict(
+            component.get("readiness_probe") or {"tcpSocket": {"port": component["port"]}},
+            periodSeconds=5
+        ),
+        # subPath keeps the volume root (and its lost+found) out of the data
+        # directory, which initdb and mysqld refuse to initialise into.
+        "volumeMounts": [{"name": DATA_VOLUME, "mountPath": component["data_path"], "subPath": "data"}],
+    }
+    if component.get("command"):
+        container["command"] = component["command"]
+    if component.get("security_context"):
+        container["securityContext"] = component["security_context"]
+    if component.get("resources"):
+        container["resources"] = _resources(**component["resources"])
+
+    pod_spec = {"containers": [container]}
+    if component.get("init_containers"):
+        pod_spec["initContainers"] = [dict(init, image=component["image"]) for init in component["init_containers"]]
+    if component.get("fs_group"):
+        pod_spec["securityContext"] = {"fsGroup": component["fs_group"]}
+
+    return {
+        "apiVersion": "apps/v1",
+        "kind": "StatefulSet",
+        "metadata": {"name": "${name}", "labels": labels},
+        "spec": {
+            "replicas": 1,
+            "serviceName": "${name}",
+            "selector": {"matchLabels": {"app": "${name}"}},
+            "template": {
+                "metadata": {"labels": labels},
+                "spec": pod_spec,
+            },
+            "volumeClaimTemplates": [{
+                "metadata": {"name": DATA_VOLUME, "labels": labels},
+                "spec": {
+                    "accessModes": ["ReadWriteOnce"],
+                    "resources": {"requests": {"storage": component.get("storage_size", "1Gi")}},
+                },
+            }],
+        },
+    }
+
+
+def _service_template(engine, component):
+    return {
+        "apiVersion": "v1",
+        "kind": "Service",
+        "metadata": {"name": "${name}", "labels": {"app": "${name}", "engine": engine}},
+        "spec": {
+            "selector": {"app": "${name}"},
+            "ports": [{"port": component["port"], "targetPort": component["port"]}],
+        },
+    }
+
+
+def _pooler_templates(engine, pooler):
+    container = {
+        "name": pooler["name"],
+        "image": pooler["image"],
+        "ports": [{"containerPort": pooler["port"]}],
+        "env": [{"name": name, "value": value} for name, value in pooler.get("env", {}).items()],
+        "readinessProbe": {"tcpSocket": {"port": pooler["port"]}, "periodSeconds": 5},
+        "resources": _resources(**pooler["resources"]),
+    }
+    if not pooler.get("files"):
+        return container, None
+
+    container["volumeMounts"] = [
+        {"name": POOLER_VOLUME, "mountPath": path, "subPath": os.path.basename(path), "readOnly": True}
+        for path in pooler["files"]
+    ]
+    secret = {
+        "apiVersion": "v1",
+        "kind": "Secret",
+        "metadata": {"name": "${name}" + POOLER_SUFFIX, "labels": {"app": "${name}", "engine": engine}},
+        "stringData": {os.path.basename(path): content for path, content in pooler["files"].items()},
+    }
+    return container, secret
+
+
+@lru_cache(maxsize=None)
+def pooler_templates(engine):
+    pooler = ENGINES[engine].get("pooler")
+    return _pooler_templates(engine, pooler) if pooler else None
+
+
+@lru_cache(maxsize=None)
+def manifest_templates(engine):
+    # Rendered once per engine; requests only substitute placeholders.
+    return tuple(
+        (component.get("suffix", ""), _statefulset_template(engine, component), _service_template(engine, component))
+        for component in ENGINES[engine]["components"]
+    )
+
+
+def _render(value, context):
+    if isinstance(value, dict):
+        return {key: _render(item, context) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_render(item, context) for item in value]
+    if isinstance(value, str) and "$" in value:
+        return Template(value).safe_substitute(context)
+    return value
+
+
+def _check_quantity(name, value):
+    try:
+        if parse_quantity(value) <= 0:
+            raise ValueError
+    except (ValueError, TypeError):
+        raise ValueError(f"Invalid {name} quantity '{value}'")
+
+
+def resolve_sizing(tier=None, cpu=None, memory=None):
+    # Returns {"tier", "cpu", "memory"}; explicit cpu/memory override the tier.
+    tier = tier or (None if cpu and memory else DEFAULT_TIER)
+    if tier is not None and tier not in TIERS:
+        raise ValueError(f"Unknown sizing tier '{tier}', expected one of {', '.join(TIERS)}")
+    sizing = {key: value for key, value in TIERS.get(tier, {}).items() if key in ("cpu", "memory")}
+    sizing["tier"] = tier or "custom"
+    if cpu:
+        sizing["cpu"] = str(cpu)
+    if memory:
+        sizing["memory"] = str(memory)
+    for key in ("cpu", "memory"):
+        _check_quantity(key, sizing[key])
+    return sizing
+
+
+def resolve_storage(tier=None, storage_class=None, storage_size=None):
+    size = str(storage_size or TIERS.get(tier, TIERS[DEFAULT_TIER])["storage"])
+    _check_quantity("storage", size)
+    return {"class": storage_class or DEFAULT_STORAGE_CLASS, "size": size}
+
+
+def resolve_pooler(engine, value=None):
+    # Accepts true, a pool mode name or {"mode", "pool_size", "max_client_connections"}.
+    if not value:
+        return None
+    spec = ENGINES[engine].get("pooler")
+    if spec is None:
+        raise ValueError(f"{ENGINES[engine]['display_name']} does not support a connection pooler")
+    if value is True:
+        value = {}
+    elif isinstance(value, str):
+        value = {"mode": value}
+    elif not isinstance(value, dict):
+        raise ValueError("pooler must be true, a pool mode or an object")
+
+    mode = value.get("mode") or spec["default_mode"]
+    if mode not in spec["modes"]:
+        raise ValueError(f"Unknown pool mode '{mode}', expected one of {', '.join(spec['modes'])}")
+    pooler = {"type": spec["name"], "mode": mode}
+    for key, limit in (("pool_size", MAX_POOL_SIZE), ("max_client_connections", MAX_CLIENT_CONNECTIONS)):
+        amount = value.get(key, POOL_DEFAULTS[key])
+        if not isinstance(amount, int) or isinstance(amount, bool) or not 0 < amount <= limit:
+            raise ValueError(f"{key} must be an integer between 1 and {limit}")
+        pooler[key] = amount
+    return pooler
+
+
+def resolve_retain_data(value=None):
+    # A JSON boolean or, from a query string, "true"/"false"; None keeps
+    # RETAIN_DATA_ON_DELETE.
+    if value is None or isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.lower() in ("true", "false"):
+        return value.lower() == "true"
+    raise ValueError("retain_data must be true or false")
+
+
+def default_topology(engine):
+    options = ENGINES[engine].get("topology_options")
+    return {key: option["default"] for key, option in options.items()} if options else None
+
+
+def resolve_topology(engine, data, sizing=None):
+    # Engine cluster options such as Kafka's brokers, validated by the
+    # engine's topology function; None when the request sets none of them.
+    options = ENGINES[engine].get("topology_options", {})
+    if not any(data.get(key) is not None for key in options):
+        return None
+    topology = default_topology(engine)
+    for key, option in options.items():
+        value = data.get(key)
+        if value is None:
+            continue
+        if isinstance(option["default"], bool):
+            if not isinstance(value, bool):
+                raise ValueError(f"{key} must be true or false")
+        elif "choices" in option:
+            if value not in option["choices"]:
+                raise ValueError(f"Unknown {key} '{value}', expected one of {', '.join(option['choices'])}")
+        elif (not isinstance(value, int) or isinstance(value, bool)
+              or not option.get("min", 1) <= value <= option["max"]):
+            raise ValueError(f"{key} must be an integer between {option.get('min', 1)} and {option['max']}")
+        elif option.get("memory_fraction") and sizing:
+            limit = int(int(parse_quantity(sizing["memory"]) // (1024 * 1024)) * option["memory_fraction"])
+            if value > limit:
+                raise ValueError(f"{key} must be at most {limit} with {sizing['memory']} of memory")
+        topology[key] = value
+    ENGINES[engine]["topology"](topology)
+    return topology
+
+
+def topology_settings(engine, topology=None):
+    if "topology" not in ENGINES[engine]:
+        return {}
+    return ENGINES[engine]["topology"](topology or default_topology(engine))
+
+
+def parse_options(engine, data):
+    # Per-request provisioning options shared by the create routes and bulk
+    # items; raises ValueError with a client-facing message.
+    sizing = resolve_sizing(data.get('tier'), data.get('cpu'), data.get('memory'))
+    options = {
+        "sizing": sizing,
+        "storage": resolve_storage(sizing["tier"], data.get('storage_class'), data.get('storage_size')),
+    }
+    pooler = resolve_pooler(engine, data.get('pooler'))
+    if pooler:
+        options["pooler"] = pooler
+    topology = resolve_topology(engine, data, sizing)
+    if topology:
+        options["topology"] = topology
+    ttl_seconds = data.get('ttl_seconds')
+    if ttl_seconds is not None:
+        if not isinstance(ttl_seconds, int) or isinstance(ttl_seconds, bool) or ttl_seconds <= 0:
+            raise ValueError("ttl_seconds must be a positive integer")
+        # Ephemeral instances are deleted by the reconciler once expired.
+        options["ttl_seconds"] = ttl_seconds
+    return options
+
+
+def _resources(cpu, memory):
+    amounts = {"cpu": cpu, "memory": memory}
+    return {"requests": amounts, "limits": dict(amounts)}
+
+
+def _apply_sizing(engine, statefulset, sizing):
+    container = statefulset["spec"]["template"]["spec"]["containers"][0]
+    container["resources"] = _resources(sizing["cpu"], sizing["memory"])
+    tuning = ENGINES[engine].get("tuning")
+    if tuning is None:
+        return
+    memory_mib = int(parse_quantity(sizing["memory"]) // (1024 * 1024))
+    settings = tuning(memory_mib, float(parse_quantity(sizing["cpu"])))
+    container["env"].extend({"name": name, "value": value} for name, value in settings.get("env", {}).items())
+    if settings.get("args"):
+        container["args"] = settings["args"]
+
+
+def _apply_storage(statefulset, storage, primary):
+    claim = statefulset["spec"]["volumeClaimTemplates"][0]["spec"]
+    if primary:
+        claim["resources"]["requests"]["storage"] = storage["size"]
+    if storage.get("class"):
+        claim["storageClassName"] = storage["class"]
+
+
+def _set_env(container, env):
+    # Overrides variables the container already sets and appends the rest.
+    env = {name: str(value) for name, value in env.items()}
+    for variable in container["env"]:
+        if variable["name"] in env:
+            variable["value"] = env.pop(variable["name"])
+    container["env"].extend({"name": name, "value": value} for name, value in env.items())
+
+
+def _apply_service_topology(service, settings):
+    if settings.get("service_ports"):
+        service["spec"]["ports"][0]["name"] = "client"
+        service["spec"]["ports"].extend(settings["service_ports"])
+    if settings.get("headless"):
+        # Per-pod DNS names; peers must resolve each other before they are ready.
+        service["spec"]["clusterIP"] = "None"
+        service["spec"]["publishNotReadyAddresses"] = True
+
+
+def _apply_topology(statefulset, service, settings):
+    spec = statefulset["spec"]
+    container = spec["template"]["spec"]["containers"][0]
+    spec["replicas"] = settings.get("replicas", 1)
+    if spec["replicas"] > 1:
+        # Start every pod at once, so peers that need each other to become
+        # ready (e.g. a KRaft quorum) can form, and spread them over nodes.
+        spec["podManagementPolicy"] = "Parallel"
+        spec["template"]["spec"]["affinity"] = {"podAntiAffinity": {
+            "preferredDuringSchedulingIgnoredDuringExecution": [{
+                "weight": 100,
+                "podAffinityTerm": {"labelSelector": {"matchLabels": {"app": statefulset["metadata"]["name"]}},
+                                    "topologyKey": "kubernetes.io/hostname"},
+            }],
+        }}
+    _apply_service_topology(service, settings)
+    if settings.get("env"):
+        _set_env(container, settings["env"])
+    if settings.get("command"):
+        container["command"] = settings["command"]
+    if settings.get("args"):
+        container["args"] = container.get("args", []) + settings["args"]
+    if settings.get("readiness_probe"):
+        container["readinessProbe"] = dict(settings["readiness_probe"], periodSeconds=5)
+    if settings.get("post_start"):
+        container["lifecycle"] = {"postStart": {"exec": {"command": settings["post_start"]}}}
+
+
+def _apply_pooler(engine, statefulset, service, pooler, context):
+    # Adds the pooler sidecar, points the Service at it and returns the
+    # rendered config Secret, if the pooler needs one.
+    spec = ENGINES[engine]["pooler"]
+    container, secret = pooler_templates(engine)
+    context = dict(context, pool_mode=pooler["mode"], pool_size=pooler["pool_size"],
+                   max_client_connections=pooler["max_client_connections"], **spec["modes"][pooler["mode"]])
+
+    pod_spec = statefulset["spec"]["template"]["spec"]
+    pod_spec["containers"].append(_render(container, context))
+    if spec.get("server_args"):
+        primary = pod_spec["containers"][0]
+        primary["args"] = primary.get("args", []) + spec["server_args"]
+    service["spec"]["ports"][0]["targetPort"] = spec["port"]
+    if secret is None:
+        return None
+
+    pod_spec["volumes"] = [{"name": POOLER_VOLUME, "secret": {"secretName": context["name"] + POOLER_SUFFIX}}]
+    # Config files quote their values, so escape them as string literals.
+    escaped = {key: json.dumps(str(value))[1:-1] for key, value in context.items()}
+    return _render(secret, escaped)
+
+
+def render_manifests(engine, context, sizing=None, storage=None, pooler=None, topology=None):
+    # Returns (statefulset, service, secret) per component; secret may be None.
+    settings = topology_settings(engine, topology)
+    manifests = []
+    for suffix, statefulset, service in manifest_templates(engine):
+        if suffix in settings.get("skip", ()):
+            continue
+        component_context = dict(context, name=f"{context['db_name']}{suffix}")
+        statefulset = _render(statefulset, component_context)
+        service = _render(service, component_context)
+        component_settings = settings.get("companions", {}).get(suffix) if suffix else settings
+        # Companions such as read replicas may be sized like the primary.
+        sized = not suffix or bool(component_settings and component_settings.get("sized"))
+        if sized and sizing:
+            _apply_sizing(engine, statefulset, sizing)
+        if component_settings:
+            _apply_topology(statefulset, service, _render(component_settings, component_context))
+        if storage:
+            _apply_storage(statefulset, storage, primary=sized)
+        secret = None
+        if not suffix and pooler:
+            secret = _apply_pooler(engine, statefulset, service, pooler, component_context)
+        images.pin(statefulset["spec"]["template"]["spec"])
+        manifests.append((statefulset, service, secret))
+    return manifests
+
+
+def alias_service(engine, name, db_name):
+    # A Service called db_name in front of the instance whose resources are
+    # called name, shaped like its primary Service under the default
+    # topology; used for instances claimed from the warm pool.
+    primary = next(service for suffix, _, service in manifest_templates(engine) if not suffix)
+    service = _render(primary, {"name": name})
+    service["metadata"] = {"name": db_name, "labels": {"app": db_name, "engine": engine}}
+    _apply_service_topology(service, topology_settings(engine))
+    return service
+
+
+def component_names(engine, db_name, topology=None):
+    # Every component the engine can have, or only those an instance with
+    # the given topology was created with.
+    skip = topology_settings(engine, topology).get("skip", ()) if topology is not None else ()
+    return [f"{db_name}{component.get('suffix', '')}" for component in ENGINES[engine]["components"]
+            if component.get("suffix", "") not in skip]
+
+
+def deploy(engine, db_name, email, username=None, sizing=None, storage=None, pooler=None,
+           idempotency_key=None, ttl_seconds=None, topology=None):
+    namespace = os.getenv('K8S_NAMESPACE', 'default')
+    spec = ENGINES[engine]
+    username = username or spec.get("default_username")
+    password = generate_password() if spec.get("password", True) else None
+
+    sizing = sizing or resolve_sizing()
+    storage = storage or resolve_storage(sizing["tier"])
+    topology = topology or default_topology(engine)
+    context = {"db_name": db_name, "username": username or "", "password": password or "",
+               "namespace": namespace, "cluster_id": _cluster_id()}
+    with stage(engine, "render"):
+        manifests = render_manifests(engine, context, sizing, storage, pooler, topology)
+    with stage(engine, "kube_config"):
+        calls = _object_calls(get_apps_v1_api(), get_core_v1_api())
+    key = idempotency_key or uuid.uuid4().hex
+    run = uuid.uuid4().hex
+    applied = []
+    # Whatever fails once anything was applied, API error or not, rolls
+    # the create back.
+    try:
+        # Secrets first so pods never wait on a missing mount; the rest are
+        # independent, e.g. Kafka's two StatefulSets and two Services.
+        _concurrently([partial(_apply, engine, namespace, calls, secret, key, run, applied, db_name)
+                       for _, _, secret in manifests if secret])
+        _concurrently([partial(_apply, engine, namespace, calls, body, key, run, applied, db_name)
+                       for statefulset, service, _ in manifests for body in (statefulset, service)])
+        record = {
+            "db_name": db_name,
+            "type": engine,
+            "email": email,
+            "status": initial_status(),
+            "sizing": sizing,
+            "storage": storage,
+            "images": sorted({container["image"] for statefulset, _, _ in manifests
+                              for container in statefulset["spec"]["template"]["spec"]["containers"]}),
+            "timestamp": datetime.now(),
+            "deleted": False
+        }
+        if ttl_seconds:
+            record["expires_at"] = record["timestamp"] + timedelta(seconds=ttl_seconds)
+        if topology:
+            statefulset, service, _ = next(manifest for manifest in manifests
+                                           if manifest[0]["metadata"]["name"] == db_name)
+            record["topology"] = dict(topology, hosts=_hosts(namespace, statefulset, service),
+                                      **_render(topology_settings(engine, topology).get("record", {}), context))
+        if pooler:
+            # The Service keeps the engine's port but now lands on the pooler.
+            port = next(component["port"] for component in spec["components"] if not component.get("suffix"))
+            record["pooler"] = dict(pooler, endpoint=f"{db_name}.{namespace}.svc:{port}")
+        secrets = {}
+        if username:
+            record["username"] = secrets["username"] = username
+        if password:
+            secrets["password"] = password
+            if spec.get("store_password"):
+                record["password"] = password
+    except Exception:
+        _rollback(engine, namespace, calls, applied, key)
+        raise
+    return record, secrets
+
+
+def _cluster_id():
+    # Kafka's cluster id format: a UUID as 22 characters of url-safe base64.
+    return base64.urlsafe_b64encode(uuid.uuid4().bytes).decode().rstrip("=")
+
+
+def _hosts(namespace, statefulset, service):
+    # Per-pod addresses behind a headless Service, else just the Service.
+    name, port = service["metadata"]["name"], service["spec"]["ports"][0]["port"]
+    if service["spec"].get("clusterIP") != "None":
+        return [f"{name}.{namespace}.svc:{port}"]
+    return [f"{name}-{index}.{name}.{namespace}.svc:{port}" for index in range(statefulset["spec"]["replicas"])]
+
+
+def create_instance(engine, db_name, email, username=None, **options):
+    try:
+        record, secrets = deploy(engine, db_name, email, username, **options)
+        with stage(engine, "mongo_write"):
+            # Replaces the tombstone of an earlier instance of the same name
+            # whole, so none of its fields (expires_at, resource_name, ...) carry over.
+            collection.replace_one(deployment_key(record), record, upsert=True)
+        logger.info(f"{ENGINES[engine]['display_name']} '{db_name}' created by {email}")
+        return True, dict(secrets, db_name=db_name)
+    except ApiException as e:
+        logger.error(f"Failed to create {ENGINES[engine]['display_name']} '{db_name}': {e}")
+        return False, {"db_name": db_name, "error": e.reason or str(e)}
+    except Exception as e:
+        logger.exception(f"Failed to create {ENGINES[engine]['display_name']} '{db_name}'")
+        return False, {"db_name": db_name, "error": str(e) or type(e).__name__}
+
+
+def _timed(engine, stage_name, func, **kwargs):
+    with stage(engine, stage_name):
+        return call_with_retries(func, **kwargs)
+
+
+def _concurrently(calls):
+    # Runs zero-argument calls on the Kubernetes I/O pool. The first failure
+    # is raised only once every call has finished, so nothing is left in
+    # flight behind the caller.
+    if len(calls) == 1:
+        return [calls[0]()]
+    futures = [_kube_executor.submit(call) for call in calls]
+    wait(futures)
+    return [future.result() for future in futures]
+
+
+def _object_calls(apps_v1_api, core_v1_api):
+    # kind -> (create, read, patch, delete)
+    return {
+        "StatefulSet": (apps_v1_api.create_namespaced_stateful_set, apps_v1_api.read_namespaced_stateful_set,
+                        apps_v1_api.patch_namespaced_stateful_set, apps_v1_api.delete_namespaced_stateful_set),
+        "Service": (core_v1_api.create_namespaced_service, core_v1_api.read_namespaced_service,
+                    core_v1_api.patch_namespaced_service, core_v1_api.delete_namespaced_service),
+        "Secret": (core_v1_api.create_namespaced_secret, core_v1_api.read_namespaced_secret,
+                   core_v1_api.patch_namespaced_secret, core_v1_api.delete_namespaced_secret),
+    }
+
+
+def _apply(engine, namespace, calls, body, key, run, applied, db_name):
+    # Create-or-patch. A 409 on an object this run already applied (a create
+    # whose response was lost) patches it; one left by an earlier run under
+    # the same key, which never reached a client, is replaced, keeping its
+    # volumes; anything else is a real name clash and fails the create. So
+    # does an earlier run that did reach a client: a replay whose job was
+    # dropped or wrongly failed must not replace a live instance.
+    kind, name = body["kind"], body["metadata"]["name"]
+    create, read, patch, _ = calls[kind]
+    body["metadata"].setdefault("annotations", {}).update({IDEMPOTENCY_ANNOTATION: key, RUN_ANNOTATION: run})
+    for claim in body.get("spec", {}).get("volumeClaimTemplates", []):
+        claim["metadata"].setdefault("labels", {})[IDEMPOTENCY_LABEL] = key
+    applied.append((kind, name))
+    operation = kind.lower()
+    try:
+        _timed(engine, f"create_{operation}", create, namespace=namespace, body=body)
+        return
+    except ApiException as e:
+        if e.status != 409:
+            raise
+    annotations = call_with_retries(read, name=name, namespace=namespace).metadata.annotations or {}
+    if annotations.get(IDEMPOTENCY_ANNOTATION) != key:
+        applied.remove((kind, name))
+        raise ApiException(status=409, reason=f"{kind} '{name}' already exists")
+    if annotations.get(RUN_ANNOTATION) == run:
+        _timed(engine, f"patch_{operation}", patch, name=name, namespace=namespace, body=body)
+        return
+    if collection.find_one({"db_name": db_name, "type": {"$in": [engine, None]}, "deleted": False}, {"_id": 1}):
+        applied.remove((kind, name))
+        raise ApiException(status=409, reason=f"{ENGINES[engine]['display_name']} '{db_name}' already exists")
+    logger.info(f"Replacing {kind} '{name}' left behind by an earlier attempt")
+    with stage(engine, f"replace_{operation}"):
+        _delete_object(namespace, calls, kind, name, key, volumes=False)
+        deadline = time.monotonic() + REPLACE_TIMEOUT
+        while _exists(read, name, namespace):
+            if time.monotonic() > deadline:
+                raise ApiException(status=409, reason=f"{kind} '{name}' is still being deleted")
+            time.sleep(0.5)
+        call_with_retries(create, namespace=namespace, body=body)
+
+
+def _exists(read, name, namespace):
+    try:
+        call_with_retries(read, name=name, namespace=namespace)
+        return True
+    except ApiException as e:
+        if e.status != 404:
+            raise
+        return False
+
+
+def _delete_object(namespace, calls, kind, name, key, volumes=True):
+    delete = calls[kind][3]
+    call_with_retries(_ignore_missing, delete, name=name, namespace=namespace,
+                      body={"propagationPolicy": "Foreground"})
+    if kind == "StatefulSet" and volumes:
+        call_with_retries(get_core_v1_api().delete_collection_namespaced_persistent_volume_claim,
+                          namespace=namespace, label_selector=f"app={name},{IDEMPOTENCY_LABEL}={key}")
+
+
+def _rollback(engine, namespace, calls, applied, key):
+    # Best effort: anything left behind is replaced by a retry under the same
+    # idempotency key.
+    if not applied:
+        return
+    with stage(engine, "rollback"):
+        futures = [_kube_executor.submit(_delete_object, namespace, calls, kind, name, key) for kind, name in applied]
+        wait(futures)
+    for (kind, name), future in zip(applied, futures):
+        if future.exception() is not None:
+            logger.error(f"Failed to roll back {kind} '{name}': {future.exception()}")
+    logger.warning(f"Rolled back {len(applied)} objects of a failed {engine} create")
+
+
+def _ignore_missing(call, **kwargs):
+    try:
+        call(**kwargs)
+        return True
+    except ApiException as e:
+        if e.status != 404:
+            raise
+        return False
+
+
+def _delete_workload(apps_v1_api, name, namespace):
+    removed = _ignore_missing(apps_v1_api.delete_namespaced_stateful_set, name=name, namespace=namespace,
+                              body={"propagationPolicy": "Foreground"})
+    if not removed:
+        # Instances provisioned before StatefulSets were Deployments. Either
+        # may already be gone, e.g. when retrying a delete that failed halfway.
+        _ignore_missing(apps_v1_api.delete_namespaced_deployment, name=name, namespace=namespace,
+                        body={"propagationPolicy": "Foreground"})
+
+
+def remove(engine, db_name, retain_data=None, resources=None, topology=None):
+    # resources is the name the instance's objects were created under when it
+    # differs from db_name (warm pool instances); topology, when known, spares
+    # calls for companions the instance never had.
+    namespace = os.getenv('K8S_NAMESPACE', 'default')
+    retain_data = RETAIN_DATA_DEFAULT if retain_data is None else retain_data
+    resources = resources or db_name
+    apps_v1_api = get_apps_v1_api()
+    core_v1_api = get_core_v1_api()
+    calls = []
+    for name in component_names(engine, resources, topology):
+        calls.append(partial(_timed, engine, "delete_statefulset", _delete_workload,
+                             apps_v1_api=apps_v1_api, name=name, namespace=namespace))
+        calls.append(partial(_timed, engine, "delete_service", _ignore_missing,
+                             call=core_v1_api.delete_namespaced_service, name=name, namespace=namespace))
+        if not retain_data:
+            # StatefulSets never delete their claims; do it explicitly.
+            calls.append(partial(_timed, engine, "delete_volumes",
+                                 core_v1_api.delete_collection_namespaced_persistent_volume_claim,
+                                 namespace=namespace, label_selector=f"app={name}"))
+    if resources != db_name:
+        calls.append(partial(_timed, engine, "delete_service", _ignore_missing,
+                             call=core_v1_api.delete_namespaced_service, name=db_name, namespace=namespace))
+    if ENGINES[engine].get("pooler", {}).get("files"):
+        calls.append(partial(_timed, engine, "delete_secret", _ignore_missing,
+                             call=core_v1_api.delete_namespaced_secret, name=resources + POOLER_SUFFIX,
+                             namespace=namespace))
+    _concurrently(calls)
+
+
+def delete_instance(engine, db_name, retain_data=None):
+    retain_data = RETAIN_DATA_DEFAULT if retain_data is None else retain_data
+    # Older records were written without a type, so match those too.
+    record = collection.find_one({"db_name": db_name, "type": {"$in": [engine, None]}, "deleted": False},
+                                 {"resource_name": 1, "topology": 1}) or {}
+    try:
+        remove(engine, db_name, retain_data, record.get("resource_name"), record.get("topology"))
+        collection.update_many(
+            {"db_name": db_name, "type": {"$in": [engine, None]}},
+            {"$set": {
+                "status": "deleted",
+                "deleted_at": datetime.now(),
+                "deleted": True,
+                "data_retained": retain_data
+            }}
+        )
+        logger.info(f"{ENGINES[engine]['display_name']} '{db_name}' deleted"
+                    + (" (volumes retained)" if retain_data else ""))
+        return True
+    except ApiException as e:
+        logger.error(f"Failed to delete {ENGINES[engine]['display_name']} '{db_name}': {e}")
+        return False
+    except Exception:
+        logger.exception(f"Failed to delete {ENGINES[engine]['display_name']} '{db_name}'")
+        return False
@@ -0,0 +1,133 @@
+from collections import defaultdict
+from decimal import Decimal
+
+import logging
+import os
+import threading
+import time
+
+from kubernetes.utils import parse_quantity
+
+from db_deployments.engines import ENGINES
+from db_deployments.provisioner import resolve_sizing, topology_settings
+from utils.database import collection, jobs_collection
+
+logger = logging.getLogger(__name__)
+
+# Per-owner limits checked before a create is queued: active instances per
+# engine ("elasticsearch=2,kafka=2" overrides the default) and the total CPU
+# and memory requested across engines. Empty or 0 disables a limit.
+MAX_INSTANCES = int(os.getenv('QUOTA_MAX_INSTANCES', '10'))
+MAX_CPU = os.getenv('QUOTA_MAX_CPU', '16')
+MAX_MEMORY = os.getenv('QUOTA_MAX_MEMORY', '64Gi')
+# Usage is read from Mongo at most this often per owner; creates admitted in
+# between are added to the cached figures straight away.
+CACHE_SECONDS = float(os.getenv('QUOTA_CACHE_SECONDS', '10'))
+MAX_CACHED_OWNERS = 10000
+
+
+def _parse_limits(value):
+    limits = {}
+    for entry in value.split(','):
+        engine, _, limit = entry.strip().partition('=')
+        if engine in ENGINES and limit.isdigit():
+            limits[engine] = int(limit)
+        elif entry.strip():
+            logger.warning(f"Ignoring invalid QUOTA_MAX_INSTANCES_PER_ENGINE entry '{entry.strip()}'")
+    return limits
+
+
+ENGINE_MAX_INSTANCES = _parse_limits(os.getenv('QUOTA_MAX_INSTANCES_PER_ENGINE', ''))
+
+_lock = threading.Lock()
+_owner_locks = defaultdict(threading.Lock)
+# email -> (loaded_at, {"instances": {engine: count}, "cpu": Decimal, "memory": Decimal})
+_usage = {}
+
+
+def footprint(engine, sizing, topology=None, pooler=None):
+    # CPU and memory requested by every pod of the instance: the primary and
+    # sized companions (brokers, read replicas) at its sizing, others such as
+    # Sentinels, dedicated masters or ZooKeeper at their own resources, plus
+    # the pooler sidecar.
+    if engine not in ENGINES:
+        return parse_quantity(sizing["cpu"]), parse_quantity(sizing["memory"])
+    settings = topology_settings(engine, topology)
+    amounts = []
+    for component in ENGINES[engine]["components"]:
+        suffix = component.get("suffix", "")
+        if suffix in settings.get("skip", ()):
+            continue
+        component_settings = settings.get("companions", {}).get(suffix, {}) if suffix else settings
+        sized = not suffix or component_settings.get("sized") or not component.get("resources")
+        amounts.append((sizing if sized else component["resources"], component_settings.get("replicas", 1)))
+    if pooler and ENGINES[engine].get("pooler"):
+        # A sidecar in every primary pod.
+        amounts.append((ENGINES[engine]["pooler"]["resources"], settings.get("replicas", 1)))
+    return (sum(parse_quantity(resources["cpu"]) * count for resources, count in amounts),
+            sum(parse_quantity(resources["memory"]) * count for resources, count in amounts))
+
+
+def _add(usage, engine, cpu, memory):
+    usage["instances"][engine] = usage["instances"].get(engine, 0) + 1
+    usage["cpu"] += cpu
+    usage["memory"] += memory
+
+
+def _load(email):
+    # Live instances plus creates still queued or running, which have no
+    # record yet. Instances from before sizing count as the default tier.
+    usage = {"instances": {}, "cpu": Decimal(0), "memory": Decimal(0)}
+    for doc in collection.find({"email": email, "deleted": False},
+                               {"type": 1, "sizing": 1, "topology": 1, "pooler": 1}):
+        _add(usage, doc.get("type"), *footprint(doc.get("type"), doc.get("sizing") or resolve_sizing(),
+                                                doc.get("topology"), doc.get("pooler")))
+    for job in jobs_collection.find({"params.email": email, "status": {"$in": ["queued", "running"]}},
+                                    {"type": 1, "params.sizing": 1, "params.topology": 1, "params.pooler": 1}):
+        engine = job["type"].partition("create_")[2]
+        _add(usage, engine, *footprint(engine, job["params"].get("sizing") or resolve_sizing(),
+                                       job["params"].get("topology"), job["params"].get("pooler")))
+    return usage
+
+
+def _exceeded(usage, engine, cpu, memory):
+    limit = ENGINE_MAX_INSTANCES.get(engine, MAX_INSTANCES)
+    if limit and usage["instances"].get(engine, 0) >= limit:
+        return f"Quota of {limit} {engine} instances reached"
+    if MAX_CPU and usage["cpu"] + cpu > parse_quantity(MAX_CPU):
+        return f"CPU quota of {MAX_CPU} cores exceeded"
+    if MAX_MEMORY and usage["memory"] + memory > parse_quantity(MAX_MEMORY):
+        return f"Memory quota of {MAX_MEMORY} exceeded"
+    return None
+
+
+def _prune():
+    cutoff = time.monotonic() - CACHE_SECONDS
+    for email, owner_lock in list(_owner_locks.items()):
+        if not owner_lock.locked() and _usage.get(email, (0.0, None))[0] < cutoff:
+            _owner_locks.pop(email, None)
+            _usage.pop(email, None)
+
+
+def admit(email, engine, sizing, topology=None, pooler=None):
+    # Returns None and counts the create against the owner's quota, or the
+    # reason it does not fit.
+    cpu, memory = footprint(engine, sizing, topology, pooler)
+    with _lock:
+        if len(_owner_locks) > MAX_CACHED_OWNERS:
+            _prune()
+        owner_lock = _owner_locks[email]
+    with owner_lock:
+        loaded_at, usage = _usage.get(email, (0.0, None))
+        if usage is None or time.monotonic() - loaded_at > CACHE_SECONDS:
+            loaded_at, usage = time.monotonic(), _load(email)
+        error = _exceeded(usage, engine, cpu, memory)
+        if error is None:
+            _add(usage, engine, cpu, memory)
+        _usage[email] = (loaded_at, usage)
+        return error
+
+
+def forget(email):
+    # Drops cached usage, e.g. after an admitted create was not queued.
+    _usage.pop(email, None)
@@ -0,0 +1,152 @@
+from datetime import datetime, timedelta, timezone
+
+import logging
+import os
+import threading
+
+from kubernetes.client import ApiException
+
+from db_deployments.engines import ENGINES
+from db_deployments.provisioner import POOLER_SUFFIX, component_names, delete_instance
+from utils.database import collection, warm_pool_collection
+from utils.kube import call_with_retries, get_apps_v1_api, get_core_v1_api
+
+logger = logging.getLogger(__name__)
+
+# Periodically diffs the objects this service created (labelled app and
+# engine) against the instance records, in one listing per kind and one
+# Mongo read, then deletes orphaned objects, marks records whose workload is
+# gone as missing and deletes instances past their expires_at.
+INTERVAL_SECONDS = int(os.getenv('GC_INTERVAL', '300'))
+# Objects and records younger than this are left alone: a create writes its
+# record only after its objects exist.
+GRACE_PERIOD = timedelta(seconds=int(os.getenv('GC_GRACE_SECONDS', '900')))
+DRY_RUN = os.getenv('GC_DRY_RUN', 'false').lower() == 'true'
+LABEL_SELECTOR = "app,engine"
+RECORD_PROJECTION = {"db_name": 1, "type": 1, "resource_name": 1, "timestamp": 1, "status": 1, "expires_at": 1}
+
+
+def _list_objects(namespace):
+    # Returns (kind, name, engine, created) for every managed object. Any
+    # failed listing aborts the pass: acting on a partial view would delete
+    # live instances.
+    apps_v1_api = get_apps_v1_api()
+    core_v1_api = get_core_v1_api()
+    listings = {
+        "StatefulSet": apps_v1_api.list_namespaced_stateful_set,
+        "Deployment": apps_v1_api.list_namespaced_deployment,
+        "Service": core_v1_api.list_namespaced_service,
+        "Secret": core_v1_api.list_namespaced_secret,
+    }
+    objects = []
+    for kind, list_func in listings.items():
+        for obj in call_with_retries(list_func, namespace, label_selector=LABEL_SELECTOR).items:
+            objects.append((kind, obj.metadata.name, obj.metadata.labels["engine"], obj.metadata.creation_timestamp))
+    return objects
+
+
+def _expected_names(engine, resources, db_name):
+    if engine not in ENGINES:
+        return {db_name}
+    return set(component_names(engine, resources)) | {db_name, resources + POOLER_SUFFIX}
+
+
+def plan(namespace=None):
+    namespace = namespace or os.getenv('K8S_NAMESPACE', 'default')
+    objects = _list_objects(namespace)
+    # Read after listing, so anything created meanwhile is at worst an
+    # orphan candidate, which the grace period protects.
+    records = list(collection.find({"deleted": False}, RECORD_PROJECTION))
+    expected = set()
+    for record in records:
+        expected |= _expected_names(record.get("type"), record.get("resource_name") or record["db_name"],
+                                    record["db_name"])
+    for warm in warm_pool_collection.find({}, {"name": 1, "engine": 1}):
+        expected |= _expected_names(warm["engine"], warm["name"], warm["name"])
+
+    now = datetime.now()
+    cutoff = datetime.now(timezone.utc) - GRACE_PERIOD
+    workloads = {name for kind, name, _, _ in objects if kind in ("StatefulSet", "Deployment")}
+    return {
+        "orphans": [{"kind": kind, "name": name, "engine": engine}
+                    for kind, name, engine, created in objects
+                    if name not in expected and created is not None and created < cutoff],
+        "missing": [{"db_name": record["db_name"], "type": record.get("type")}
+                    for record in records
+                    if (record.get("resource_name") or record["db_name"]) not in workloads
+                    and record.get("status") != "missing"
+                    and record.get("timestamp") and record["timestamp"] < now - GRACE_PERIOD],
+        "expired": [{"db_name": record["db_name"], "type": record.get("type")}
+                    for record in records
+                    if record.get("expires_at") and record["expires_at"] <= now and record.get("type") in ENGINES],
+    }
+
+
+def _delete_orphan(namespace, orphan):
+    apps_v1_api = get_apps_v1_api()
+    core_v1_api = get_core_v1_api()
+    delete = {
+        "StatefulSet": apps_v1_api.delete_namespaced_stateful_set,
+        "Deployment": apps_v1_api.delete_namespaced_deployment,
+        "Service": core_v1_api.delete_namespaced_service,
+        "Secret": core_v1_api.delete_namespaced_secret,
+    }[orphan["kind"]]
+    try:
+        # Volumes are left alone: they may hold data retained on delete.
+        call_with_retries(delete, name=orphan["name"], namespace=namespace, body={"propagationPolicy": "Foreground"})
+    except ApiException as e:
+        if e.status != 404:
+            raise
+
+
+def reconcile(dry_run=DRY_RUN, namespace=None):
+    namespace = namespace or os.getenv('K8S_NAMESPACE', 'default')
+    report = plan(namespace)
+    report["dry_run"] = dry_run
+    if dry_run:
+        logger.info(f"Reconcile dry run: {len(report['orphans'])} orphaned objects, "
+                    f"{len(report['missing'])} missing instances, {len(report['expired'])} expired instances")
+        return report
+
+    for orphan in report["orphans"]:
+        try:
+            _delete_orphan(namespace, orphan)
+            logger.info(f"Deleted orphaned {orphan['kind']} '{orphan['name']}'")
+        except ApiException as e:
+            logger.error(f"Failed to delete orphaned {orphan['kind']} '{orphan['name']}': {e}")
+    for record in report["missing"]:
+        collection.update_many(
+            {"db_name": record["db_name"], "type": record["type"], "deleted": False},
+            {"$set": {"status": "missing", "missing_since": datetime.now()}}
+        )
+        logger.warning(f"Instance '{record['db_name']}' has no workload; marked missing")
+    for record in report["expired"]:
+        if delete_instance(record["type"], record["db_name"]):
+            logger.info(f"Deleted expired instance '{record['db_name']}'")
+    return report
+
+
+_stopped = threading.Event()
+_thread = None
+
+
+def _run():
+    while not _stopped.is_set():
+        try:
+            reconcile()
+        except Exception:
+            logger.exception("Reconcile pass failed")
+        _stopped.wait(INTERVAL_SECONDS)
+
+
+def start_reconciler():
+    global _thread
+    _stopped.clear()
+    if INTERVAL_SECONDS <= 0 or (_thread is not None and _thread.is_alive()):
+        return
+    _thread = threading.Thread(target=_run, name="reconciler", daemon=True)
+    _thread.start()
+
+
+def stop_reconciler():
+    _stopped.set()
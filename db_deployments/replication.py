@@ -0,0 +1,131 @@
+from datetime import datetime
+
+import logging
+import os
+import threading
+
+from kubernetes.client import ApiException
+
+from db_deployments.engines import ENGINES
+from utils.database import collection
+from utils.kube import exec_in_pod
+
+logger = logging.getLogger(__name__)
+
+# Periodically runs each engine's "replica_lag" command in every read replica
+# of a live instance and stores the result on the instance record as
+# replica_lag_seconds (per replica pod, None when it could not be read),
+# replica_lag_max_seconds and, per replica that could not be read, the
+# reason in replica_lag_errors.
+INTERVAL_SECONDS = int(os.getenv('REPLICA_LAG_INTERVAL', '60'))
+REPLICA_SUFFIX = "-replica"
+EXEC_TIMEOUT = 10
+# A replica that keeps failing is retried every 2, 4, ... up to this many
+# intervals, and a failure is logged only when its reason changes.
+MAX_BACKOFF_INTERVALS = 16
+
+# pod name -> [consecutive failures, intervals left to skip, last reason]
+_failures = {}
+
+
+def _failure_reason(error):
+    if isinstance(error, ApiException):
+        # The exec websocket reports the HTTP status in its handshake reason.
+        text = f"{error.status} {error.reason}"
+        if error.status == 403 or "403" in text:
+            return "exec forbidden"
+        if error.status == 404 or "404" in text:
+            return "replica pod not found"
+    return f"exec failed: {error}"
+
+
+def _lag(namespace, engine, pod_name, container):
+    # Returns (lag seconds, None) or (None, why it could not be read).
+    try:
+        returncode, output = exec_in_pod(namespace, pod_name, container, ENGINES[engine]["replica_lag"],
+                                         timeout=EXEC_TIMEOUT)
+    except Exception as e:
+        return None, _failure_reason(e)
+    output = output.strip()
+    if returncode != 0:
+        return None, f"lag query exited with {returncode}: {output[-200:]}"
+    try:
+        return round(float(output), 3), None
+    except ValueError:
+        # MySQL reports NULL, and Postgres nothing, while not replicating.
+        if output in ("", "NULL"):
+            return None, "replication is not running"
+        return None, f"unexpected lag query output: {output[:200]}"
+
+
+def _check(namespace, engine, pod_name, container):
+    failure = _failures.get(pod_name)
+    if failure is not None and failure[1] > 0:
+        failure[1] -= 1
+        return None, failure[2]
+    lag, reason = _lag(namespace, engine, pod_name, container)
+    if reason is None:
+        if failure is not None:
+            logger.info(f"Replication lag of '{pod_name}' is readable again")
+            del _failures[pod_name]
+        return lag, None
+    if failure is None or failure[2] != reason:
+        logger.warning(f"Failed to read replication lag of '{pod_name}': {reason}")
+    failures = failure[0] + 1 if failure is not None else 1
+    _failures[pod_name] = [failures, min(2 ** (failures - 1), MAX_BACKOFF_INTERVALS) - 1, reason]
+    return None, reason
+
+
+def measure(namespace=None):
+    namespace = namespace or os.getenv('K8S_NAMESPACE', 'default')
+    engines = [engine for engine, spec in ENGINES.items() if spec.get("replica_lag")]
+    records = collection.find(
+        {"deleted": False, "type": {"$in": engines}, "topology.replicas": {"$gt": 0}},
+        {"db_name": 1, "type": 1, "resource_name": 1, "topology.replicas": 1}
+    )
+    seen = set()
+    for record in records:
+        name = (record.get("resource_name") or record["db_name"]) + REPLICA_SUFFIX
+        lags, errors = {}, {}
+        for index in range(record["topology"]["replicas"]):
+            pod_name = f"{name}-{index}"
+            seen.add(pod_name)
+            lags[pod_name], reason = _check(namespace, record["type"], pod_name, name)
+            if reason is not None:
+                errors[pod_name] = reason
+        known = [lag for lag in lags.values() if lag is not None]
+        collection.update_one({"_id": record["_id"]}, {"$set": {
+            "replica_lag_seconds": lags,
+            "replica_lag_max_seconds": max(known) if known else None,
+            "replica_lag_errors": errors,
+            "replica_lag_checked_at": datetime.now(),
+        }})
+    # Forget replicas of instances deleted or scaled down since.
+    for pod_name in set(_failures) - seen:
+        del _failures[pod_name]
+
+
+_stopped = threading.Event()
+_thread = None
+
+
+def _run():
+    while not _stopped.is_set():
+        try:
+            measure()
+        except Exception:
+            logger.exception("Replication lag check failed")
+        _stopped.wait(INTERVAL_SECONDS)
+
+
+def start_lag_monitor():
+    global _thread
+    _stopped.clear()
+    if INTERVAL_SECONDS <= 0 or (_thread is not None and _thread.is_alive()):
+        return
+    _thread = threading.Thread(target=_run, name="replica-lag", daemon=True)
+    _thread.start()
+
+
+def stop_lag_monitor():
+    _stopped.set()
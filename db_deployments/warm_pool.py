@@ -0,0 +1,251 @@
+from datetime import datetime, timedelta
+
+import logging
+import os
+import secrets
+import threading
+import time
+
+from kubernetes.client import ApiException
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from db_deployments import provisioner
+from db_deployments.engines import ENGINES
+from db_deployments.provisioner import (
+    DEFAULT_TIER, alias_service, component_names, default_topology, deploy, remove, resolve_sizing, resolve_storage
+)
+from utils.database import collection, deployment_key, warm_pool_collection
+from utils.helpers import generate_password
+from utils.kube import exec_in_pod, get_apps_v1_api, get_core_v1_api
+from utils.metrics import observe_ready, stage
+from utils.readiness import workload_pods, workload_state
+
+logger = logging.getLogger(__name__)
+
+# Idle, already-ready instances kept per engine, e.g. "postgres=2,elasticsearch=1".
+# A create with default options claims one instead of starting from scratch.
+INTERVAL_SECONDS = int(os.getenv('WARM_POOL_INTERVAL', '30'))
+PROVISION_TIMEOUT = timedelta(seconds=int(os.getenv('WARM_POOL_PROVISION_TIMEOUT', '900')))
+# Claims not turned into an instance record by then are treated as abandoned.
+CLAIM_TIMEOUT = timedelta(minutes=10)
+OWNER = "warm-pool"
+
+
+def _parse_sizes(value):
+    sizes = {}
+    for entry in value.split(','):
+        engine, _, size = entry.strip().partition('=')
+        if engine in ENGINES and size.isdigit():
+            sizes[engine] = int(size)
+        elif entry.strip():
+            logger.warning(f"Ignoring invalid WARM_POOL_SIZES entry '{entry.strip()}'")
+    return sizes
+
+
+POOL_SIZES = _parse_sizes(os.getenv('WARM_POOL_SIZES', ''))
+
+
+def _eligible(engine, username, options):
+    # Pool instances are built with default options, so only those requests match.
+    spec = ENGINES[engine]
+    if not POOL_SIZES.get(engine):
+        return False
+    if spec.get("password", True) and "claim" not in spec:
+        return False
+    if username not in (None, spec.get("default_username")):
+        return False
+    return (options.get("sizing") in (None, resolve_sizing())
+            and options.get("storage") in (None, resolve_storage(DEFAULT_TIER))
+            and not options.get("pooler")
+            and options.get("topology") in (None, default_topology(engine)))
+
+
+def _hand_over(engine, warm, db_name, email, ttl_seconds=None):
+    namespace = os.getenv('K8S_NAMESPACE', 'default')
+    spec = ENGINES[engine]
+    name = warm["name"]
+    started = time.monotonic()
+
+    password = generate_password() if spec.get("password", True) else None
+    if password:
+        context = {"name": name, "db_name": db_name, "username": warm.get("username") or "",
+                   "old_password": warm["password"], "password": password}
+        with stage(engine, "rotate_credentials"):
+            returncode, output = exec_in_pod(namespace, f"{name}-0", name, spec["claim"](context))
+        if returncode != 0:
+            raise RuntimeError(f"credential rotation exited with {returncode}: {output.strip()[:200]}")
+
+    with stage(engine, "patch_statefulset"):
+        get_apps_v1_api().patch_namespaced_stateful_set(
+            name=name, namespace=namespace, body={"metadata": {"labels": {"instance": db_name}}})
+    service = alias_service(engine, name, db_name)
+    with stage(engine, "create_service"):
+        get_core_v1_api().create_namespaced_service(namespace=namespace, body=service)
+
+    now = datetime.now()
+    record = dict(warm["record"], db_name=db_name, email=email, resource_name=name, status="ready",
+                  timestamp=now, ready_at=now, time_to_ready_seconds=round(time.monotonic() - started, 3),
+                  warm_pool=True)
+    if record.get("topology"):
+        # Pool pods have no per-pod names under the claimed name, so clients
+        # bootstrap through the alias Service instead.
+        record["topology"] = dict(record["topology"],
+                                  hosts=[f"{db_name}.{namespace}.svc:{service['spec']['ports'][0]['port']}"])
+    if ttl_seconds:
+        record["expires_at"] = now + timedelta(seconds=ttl_seconds)
+    instance_secrets = {}
+    if warm.get("username"):
+        instance_secrets["username"] = warm["username"]
+    if password:
+        instance_secrets["password"] = password
+        if spec.get("store_password"):
+            record["password"] = password
+    return record, instance_secrets
+
+
+def _discard(engine, warm):
+    try:
+        remove(engine, warm["name"])
+    except ApiException as e:
+        if e.status != 404:
+            logger.error(f"Failed to remove warm {engine} instance '{warm['name']}': {e}")
+            return
+    warm_pool_collection.delete_one({"_id": warm["_id"]})
+
+
+def claim(engine, db_name, email, username=None, **options):
+    # Returns (record, secrets) like provisioner.deploy, or None to build cold.
+    if not _eligible(engine, username, options):
+        return None
+    warm = warm_pool_collection.find_one_and_update(
+        {"engine": engine, "status": "ready"},
+        {"$set": {"status": "claimed", "claimed_at": datetime.now(), "db_name": db_name}, "$unset": {"slot": ""}},
+        sort=[("ready_at", ASCENDING)],
+        return_document=ReturnDocument.AFTER
+    )
+    if warm is None:
+        return None
+    try:
+        return _hand_over(engine, warm, db_name, email, options.get("ttl_seconds"))
+    except Exception as e:
+        # Any failure falls back to a cold create; the broken instance is dropped.
+        logger.error(f"Failed to claim warm {engine} instance '{warm['name']}' for '{db_name}': {e}")
+        _discard(engine, warm)
+        return None
+
+
+def create_instance(engine, db_name, email, username=None, **options):
+    claimed = claim(engine, db_name, email, username, **options)
+    if claimed is None:
+        return provisioner.create_instance(engine, db_name, email, username, **options)
+
+    record, instance_secrets = claimed
+    with stage(engine, "mongo_write"):
+        collection.replace_one(deployment_key(record), record, upsert=True)
+    observe_ready(engine, record["time_to_ready_seconds"], source="warm_pool")
+    warm_pool_collection.delete_one({"name": record["resource_name"]})
+    logger.info(f"{ENGINES[engine]['display_name']} '{db_name}' claimed from the warm pool "
+                f"({record['resource_name']}) by {email} in {record['time_to_ready_seconds']}s")
+    return True, dict(instance_secrets, db_name=db_name)
+
+
+def _provision(engine, slot):
+    # Each pool position is a unique (engine, slot) pair, so replenishers in
+    # several processes never overshoot the target size.
+    name = f"warm-{engine}-{secrets.token_hex(4)}"
+    warm = {"name": name, "engine": engine, "slot": slot, "status": "provisioning", "created_at": datetime.now()}
+    try:
+        warm_pool_collection.insert_one(warm)
+    except DuplicateKeyError:
+        return
+    try:
+        record, instance_secrets = deploy(engine, name, OWNER)
+    except ApiException as e:
+        logger.error(f"Failed to provision warm {engine} instance '{name}': {e}")
+        _discard(engine, warm)
+        return
+    warm_pool_collection.update_one({"_id": warm["_id"]}, {"$set": {
+        "record": record,
+        "username": instance_secrets.get("username"),
+        "password": instance_secrets.get("password"),
+    }})
+    logger.info(f"Provisioning warm {engine} instance '{name}'")
+
+
+def _promote(engine):
+    namespace = os.getenv('K8S_NAMESPACE', 'default')
+    apps_v1_api = get_apps_v1_api()
+    for warm in warm_pool_collection.find({"engine": engine, "status": "provisioning"}):
+        try:
+            workloads = [apps_v1_api.read_namespaced_stateful_set(name=name, namespace=namespace)
+                         for name in component_names(engine, warm["name"], default_topology(engine))]
+            states = [workload_state(workload, workload_pods(workload))[0] for workload in workloads]
+        except ApiException as e:
+            if e.status != 404:
+                raise
+            states = ["failed"]
+        if "failed" in states or warm["created_at"] < datetime.now() - PROVISION_TIMEOUT:
+            logger.warning(f"Dropping warm {engine} instance '{warm['name']}' that did not become ready")
+            _discard(engine, warm)
+        elif all(state == "ready" for state in states):
+            warm_pool_collection.update_one({"_id": warm["_id"], "status": "provisioning"},
+                                            {"$set": {"status": "ready", "ready_at": datetime.now()}})
+
+
+def _reap_claims(engine):
+    cutoff = datetime.now() - CLAIM_TIMEOUT
+    for warm in warm_pool_collection.find({"engine": engine, "status": "claimed", "claimed_at": {"$lt": cutoff}}):
+        if collection.find_one({"resource_name": warm["name"]}, {"_id": 1}):
+            warm_pool_collection.delete_one({"_id": warm["_id"]})
+        else:
+            _discard(engine, warm)
+
+
+def replenish():
+    for engine, size in POOL_SIZES.items():
+        _reap_claims(engine)
+        _promote(engine)
+        taken = {warm["slot"] for warm in warm_pool_collection.find(
+            {"engine": engine, "slot": {"$exists": True}}, {"slot": 1})}
+        for slot in range(size):
+            if slot not in taken:
+                _provision(engine, slot)
+
+
+def pool_status():
+    status = {engine: {"target": size, "provisioning": 0, "ready": 0, "claimed": 0}
+              for engine, size in POOL_SIZES.items()}
+    for group in warm_pool_collection.aggregate([
+        {"$group": {"_id": {"engine": "$engine", "status": "$status"}, "count": {"$sum": 1}}}
+    ]):
+        engine = group["_id"]["engine"]
+        if engine in status:
+            status[engine][group["_id"]["status"]] = group["count"]
+    return status
+
+
+_stopped = threading.Event()
+_thread = None
+
+
+def _run():
+    while not _stopped.is_set():
+        try:
+            replenish()
+        except Exception:
+            logger.exception("Warm pool replenish failed")
+        _stopped.wait(INTERVAL_SECONDS)
+
+
+def start_replenisher():
+    global _thread
+    _stopped.clear()
+    if not POOL_SIZES or (_thread is not None and _thread.is_alive()):
+        return
+    _thread = threading.Thread(target=_run, name="warm-pool", daemon=True)
+    _thread.start()
+
+
+def stop_replenisher():
+    _stopped.set()
@@ -0,0 +1,80 @@
+# Production entry point: gunicorn -c gunicorn.conf.py
+import os
+import signal
+
+# Routes mostly wait on Kubernetes and Mongo, so threads carry the
+# concurrency. GUNICORN_WORKER_CLASS=gevent turns every request, job,
+# watch and log stream into a greenlet instead, for hundreds of concurrent
+# waits per process.
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+if worker_class == "gevent":
+    # Patch before the app is preloaded so its locks, pools and sockets
+    # are cooperative from the start.
+    from gevent import monkey
+
+    monkey.patch_all()
+
+wsgi_app = "app:app"
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('GUNICORN_WORKERS', '2'))
+threads = int(os.getenv('GUNICORN_THREADS', '16'))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '1000'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+# Must exceed SHUTDOWN_TIMEOUT so draining jobs are not killed mid-way.
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '120'))
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '0'))
+max_requests_jitter = max_requests // 10
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+
+# Import the app once in the master: the kubeconfig is parsed and Mongo
+# indexes are ensured before forking, and workers share the loaded code.
+preload_app = True
+
+
+def when_ready(server):
+    import app
+    from utils.database import mongo_client
+
+    app.prepare()
+    # Workers reconnect on first use instead of inheriting the master's sockets.
+    mongo_client.close()
+
+
+def post_fork(server, worker):
+    import app
+
+    app.start_background()
+
+
+def post_worker_init(worker):
+    # SIGTERM starts the graceful timeout, which has no hook of its own;
+    # stop claiming jobs then instead of only once the worker exits.
+    import app
+
+    handle_exit = worker.handle_exit
+
+    def handle_term(sig, frame):
+        app.begin_shutdown()
+        handle_exit(sig, frame)
+
+    signal.signal(signal.SIGTERM, handle_term)
+
+
+def worker_int(worker):
+    import app
+
+    app.begin_shutdown()
+
+
+def worker_exit(server, worker):
+    import app
+
+    app.shutdown(timeout=max(min(app.SHUTDOWN_TIMEOUT, server.cfg.graceful_timeout - 10), 0))
+
+
+def child_exit(server, worker):
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,44 @@
+import os
+
+import mongomock
+import pymongo
+import pytest
+
+from benchmarks.fake_kube import FakeKube
+from benchmarks.run import _write_kubeconfig
+
+# Like the benchmarks, tests run the real Kubernetes client against the
+# in-process fake API, with Mongo replaced by mongomock. Both must be in
+# place before any application module is imported.
+_fake_kube = FakeKube()
+os.environ.update({
+    "K8S_CONFIG_MODE": "kubeconfig",
+    "KUBECONFIG": _write_kubeconfig(_fake_kube.start()),
+    "K8S_NAMESPACE": "default",
+    "K8S_MAX_RETRIES": "0",
+    "INFORMER_ENABLED": "false",
+    "LEADER_ELECTION": "false",
+    "WARM_POOL_SIZES": "",
+    "RATE_LIMIT_PER_MINUTE": "0",
+})
+pymongo.MongoClient = mongomock.MongoClient
+
+
+def pytest_unconfigure(config):
+    _fake_kube.stop()
+    os.unlink(os.environ["KUBECONFIG"])
+
+
+@pytest.fixture
+def kube():
+    with _fake_kube.lock:
+        _fake_kube.objects.clear()
+    return _fake_kube
+
+
+@pytest.fixture
+def mongo():
+    from utils.database import db
+    for name in db.list_collection_names():
+        db.drop_collection(name)
+    return db
@@ -0,0 +1,106 @@
+import base64
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from kubernetes.client import CoreV1Api
+
+import app as application
+from db_deployments.provisioner import create_instance
+from utils.database import collection, jobs_collection
+
+
+@pytest.fixture
+def client(mongo):
+    return application.app.test_client()
+
+
+def _insert(count, email="owner@example.com"):
+    started = datetime(2024, 1, 1)
+    collection.insert_many([{"db_name": f"db-{index}", "type": "postgres", "email": email, "deleted": False,
+                             "timestamp": started + timedelta(seconds=index // 2)} for index in range(count)])
+
+
+def test_list_pages_through_every_instance_once(client):
+    _insert(7)
+    names, cursor = [], None
+    while True:
+        response = client.get("/list_databases", query_string=dict(
+            {"email": "owner@example.com", "limit": 3}, **({"after": cursor} if cursor else {})))
+        assert response.status_code == 200
+        names.extend(doc["db_name"] for doc in json.loads(response.data))
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+
+    assert names == [f"db-{index}" for index in range(7)]
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    base64.urlsafe_b64encode(b"no separator").decode(),
+    base64.urlsafe_b64encode(b"2024-01-01T00:00:00|not-an-object-id").decode(),
+])
+def test_list_rejects_invalid_cursors(client, cursor):
+    response = client.get("/list_databases", query_string={"email": "owner@example.com", "after": cursor})
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Invalid pagination cursor"}
+
+
+@pytest.mark.parametrize("timeout", ["abc", "nan", "inf", "-1", "0"])
+def test_wait_rejects_invalid_timeouts(client, timeout):
+    response = client.get("/instances/db-0/wait", query_string={"timeout": timeout})
+    assert response.status_code == 400
+    assert "timeout" in response.get_json()["error"]
+
+
+def test_create_rejects_an_invalid_timeout_before_queueing(client):
+    response = client.post("/create/postgres?wait=true&timeout=abc",
+                           json={"database_name": "orders", "email": "owner@example.com"})
+    assert response.status_code == 400
+    assert jobs_collection.count_documents({}) == 0
+
+
+def test_wait_clamps_the_timeout(client, monkeypatch):
+    waits = []
+    monkeypatch.setattr(application, "wait_until_settled", lambda db_name, db_type, timeout: waits.append(timeout))
+    client.get("/instances/db-0/wait", query_string={"timeout": application.MAX_WAIT_SECONDS * 10})
+    assert waits == [application.MAX_WAIT_SECONDS]
+
+
+def test_create_rejects_a_heap_above_the_memory_of_its_tier(client):
+    response = client.post("/create/elasticsearch",
+                           json={"database_name": "search", "email": "owner@example.com", "heap_mb": 30000})
+    assert response.status_code == 400
+    assert "heap_mb" in response.get_json()["error"]
+    assert jobs_collection.count_documents({}) == 0
+
+
+@pytest.mark.parametrize("retain_data, deleted_volumes", [("false", True), (False, True), ("true", False),
+                                                          (True, False)])
+def test_delete_parses_retain_data(client, kube, monkeypatch, retain_data, deleted_volumes):
+    volume_deletes = []
+    monkeypatch.setattr(CoreV1Api, "delete_collection_namespaced_persistent_volume_claim",
+                        lambda self, namespace, **kwargs: volume_deletes.append(kwargs["label_selector"]))
+    create_instance("postgres", "orders", "owner@example.com")
+
+    response = client.post("/delete/postgres", json={"database_name": "orders", "retain_data": retain_data})
+    assert response.status_code == 200
+    assert bool(volume_deletes) == deleted_volumes
+    assert collection.find_one({"db_name": "orders"})["data_retained"] is not deleted_volumes
+
+
+def test_delete_reads_retain_data_from_the_query_string(client, kube):
+    create_instance("postgres", "orders", "owner@example.com")
+    response = client.post("/delete/postgres?retain_data=TRUE", json={"database_name": "orders"})
+    assert response.status_code == 200
+    assert collection.find_one({"db_name": "orders"})["data_retained"] is True
+
+
+@pytest.mark.parametrize("retain_data", ["no", 0, 1, "", [True]])
+def test_delete_rejects_retain_data_that_is_not_a_boolean(client, kube, retain_data):
+    create_instance("postgres", "orders", "owner@example.com")
+    response = client.post("/delete/postgres", json={"database_name": "orders", "retain_data": retain_data})
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "retain_data must be true or false"}
+    assert collection.find_one({"db_name": "orders"})["deleted"] is False
@@ -0,0 +1,81 @@
+from kubernetes.client import ApiException
+from urllib3.exceptions import ReadTimeoutError
+
+from db_deployments import bulk, quotas
+from utils import rate_limit
+
+
+def _items(for_create, *names):
+    items = [{"type": "postgres", "database_name": name, "email": "owner@example.com"} for name in names]
+    parsed, error = bulk.parse_items(items, for_create)
+    assert error is None
+    return parsed
+
+
+def _failing(call, failures):
+    def wrapper(engine, db_name, *args, **kwargs):
+        if db_name in failures:
+            raise failures[db_name]
+        return call(engine, db_name, *args, **kwargs)
+    return wrapper
+
+
+def test_parse_items_rejects_invalid_items():
+    assert bulk.parse_items([], True)[1] == "A non-empty list of items is required"
+    assert "unsupported type" in bulk.parse_items([{"type": "nope", "database_name": "a"}], True)[1]
+    assert "requires database_name and email" in bulk.parse_items([{"type": "postgres", "database_name": "a"}],
+                                                                   True)[1]
+    assert "Unknown sizing tier" in bulk.parse_items([{"type": "postgres", "database_name": "a",
+                                                       "email": "owner@example.com", "tier": "huge"}], True)[1]
+
+
+def test_bulk_create_keeps_the_items_that_succeeded(kube, mongo, monkeypatch):
+    monkeypatch.setattr(bulk, "deploy", _failing(bulk.deploy, {
+        "rejected": ApiException(status=422, reason="Invalid"),
+        "broken": KeyError("username"),
+    }))
+    results = bulk.bulk_create(_items(True, "first", "rejected", "broken", "last"))
+
+    assert [(r["db_name"], r["success"]) for r in results] == [
+        ("first", True), ("rejected", False), ("broken", False), ("last", True)]
+    assert results[1]["error"] == "Invalid"
+    assert "username" in results[2]["error"]
+    assert results[0]["password"] and results[3]["password"]
+    assert sorted(doc["db_name"] for doc in bulk.collection.find()) == ["first", "last"]
+    assert ("default", "statefulsets", "last") in kube.objects
+
+
+def test_bulk_delete_keeps_the_items_that_succeeded(kube, mongo, monkeypatch):
+    bulk.bulk_create(_items(True, "first", "broken"))
+    monkeypatch.setattr(bulk, "remove", _failing(bulk.remove, {"broken": ReadTimeoutError(None, None, "timed out")}))
+    results = bulk.bulk_delete(_items(False, "first", "broken"))
+
+    assert [(r["db_name"], r["success"]) for r in results] == [("first", True), ("broken", False)]
+    assert "timed out" in results[1]["error"]
+    assert bulk.collection.find_one({"db_name": "first"})["deleted"] is True
+    assert bulk.collection.find_one({"db_name": "broken"})["deleted"] is False
+
+
+def test_bulk_create_charges_the_rate_limit_once_per_owner(kube, mongo, monkeypatch):
+    monkeypatch.setattr(rate_limit, "RATE_PER_MINUTE", 6.0)
+    monkeypatch.setattr(rate_limit, "BURST", 3.0)
+    quotas.forget("owner@example.com")
+    names = [f"ci-{index}" for index in range(8)]
+    assert all(result["success"] for result in bulk.bulk_create(_items(True, *names)))
+
+    for _ in range(2):
+        rate_limit.acquire("owner@example.com")
+    results = bulk.bulk_create(_items(True, "late"))
+    assert results[0]["error"] == "Too many create requests, retry later"
+    assert bulk.collection.count_documents({}) == 8
+    quotas.forget("owner@example.com")
+
+
+def test_parse_items_reads_retain_data_as_a_boolean():
+    items = [{"type": "postgres", "database_name": name, "retain_data": value}
+             for name, value in (("a", "false"), ("b", True), ("c", None))]
+    parsed, error = bulk.parse_items(items, False)
+    assert error is None and [item["retain_data"] for item in parsed] == [False, True, None]
+
+    parsed, error = bulk.parse_items([{"type": "postgres", "database_name": "a", "retain_data": "no"}], False)
+    assert parsed is None and error == "Item 0: retain_data must be true or false"
@@ -0,0 +1,49 @@
+import os
+import runpy
+import signal
+import threading
+
+import pytest
+
+import app as application
+from utils import jobs
+
+CONFIG = runpy.run_path(os.path.join(os.path.dirname(os.path.dirname(__file__)), "gunicorn.conf.py"))
+
+
+@pytest.fixture
+def shutdowns(monkeypatch):
+    calls = []
+    monkeypatch.setattr(application, "begin_shutdown", lambda: calls.append("begin_shutdown"))
+    previous = signal.getsignal(signal.SIGTERM)
+    yield calls
+    signal.signal(signal.SIGTERM, previous)
+
+
+class _Worker:
+    def __init__(self, calls):
+        self.calls = calls
+
+    def handle_exit(self, sig, frame):
+        # gunicorn's own: stop accepting and finish requests within the graceful timeout.
+        self.calls.append("handle_exit")
+
+
+def test_sigterm_stops_claiming_jobs_before_the_graceful_shutdown(shutdowns):
+    CONFIG["post_worker_init"](_Worker(shutdowns))
+    os.kill(os.getpid(), signal.SIGTERM)
+    assert shutdowns == ["begin_shutdown", "handle_exit"]
+
+
+def test_sigint_and_sigquit_stop_claiming_jobs(shutdowns):
+    CONFIG["worker_int"](_Worker(shutdowns))
+    assert shutdowns == ["begin_shutdown"]
+
+
+def test_begin_shutdown_fails_readiness_and_refuses_new_jobs(mongo, monkeypatch):
+    monkeypatch.setattr(jobs, "_draining", threading.Event())
+    application.begin_shutdown()
+
+    response = application.app.test_client().get("/readyz")
+    assert response.status_code == 503 and response.get_json() == {"status": "draining"}
+    assert jobs.submit_job("create_postgres", {"db_name": "orders"}) is None
@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from kubernetes.client import V1Container, V1ContainerStatus, V1ObjectMeta, V1Pod, V1PodSpec, V1PodStatus
+
+from db_deployments import images
+
+
+def _pod(pulled):
+    # pulled: image -> digest, reported in reverse container order.
+    containers = [V1Container(name=f"pull-{index}", image=image) for index, image in enumerate(pulled)]
+    statuses = [V1ContainerStatus(name=container.name, image=container.image, ready=False, restart_count=0,
+                                  image_id=f"docker.io/{container.image}@{pulled[container.image]}")
+                for container in reversed(containers)]
+    return V1Pod(metadata=V1ObjectMeta(name="prepuller"), spec=V1PodSpec(init_containers=containers, containers=[]),
+                 status=V1PodStatus(init_container_statuses=statuses))
+
+
+@pytest.fixture
+def nodes(mongo, monkeypatch):
+    pods = []
+    monkeypatch.setattr(images, "call_with_retries", lambda func, *args, **kwargs: SimpleNamespace(items=pods))
+    monkeypatch.setattr(images, "_learnt", {})
+    monkeypatch.setattr(images, "_learnt_at", 0.0)
+    return pods
+
+
+def _digests():
+    return {doc["ref"]: doc["digest"] for doc in images.image_digests_collection.find()}
+
+
+def test_learn_matches_statuses_to_images_by_container_name(nodes):
+    nodes.append(_pod({"postgres:16.4": "sha256:aaa", "mysql:8.4.2": "sha256:bbb"}))
+    images._learn("default")
+    assert _digests() == {"postgres:16.4": "sha256:aaa", "mysql:8.4.2": "sha256:bbb"}
+
+
+def test_learn_skips_tags_the_nodes_disagree_on(nodes):
+    nodes.extend([_pod({"postgres:16.4": "sha256:aaa"}), _pod({"postgres:16.4": "sha256:ccc"})])
+    images._learn("default")
+    assert _digests() == {}
+
+
+def test_learn_picks_up_a_re_pushed_tag(nodes):
+    nodes.append(_pod({"postgres:16.4": "sha256:aaa"}))
+    images._learn("default")
+    nodes[:] = [_pod({"postgres:16.4": "sha256:ddd"})]
+    images._learn("default")
+    assert _digests() == {"postgres:16.4": "sha256:ddd"}
+    assert images.resolve("postgres:16.4") == "postgres:16.4@sha256:ddd"
+
+
+def test_expired_digests_are_pulled_again_by_tag(nodes):
+    images.image_digests_collection.insert_one({
+        "ref": "postgres:16.4", "digest": "sha256:aaa",
+        "learnt_at": datetime.now() - timedelta(seconds=images.DIGEST_MAX_AGE_SECONDS + 1)})
+    assert images.resolve("postgres:16.4") == "postgres:16.4"
+
+    prepuller = images._prepuller(["postgres:16.4", "mysql:8.4.2@sha256:bbb"])
+    init_containers = prepuller["spec"]["template"]["spec"]["initContainers"]
+    assert [container["imagePullPolicy"] for container in init_containers] == ["Always", "IfNotPresent"]
@@ -0,0 +1,157 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from kubernetes.client import ApiException
+
+from utils import informer as informers
+
+
+def _obj(name, version, engine="postgres"):
+    return SimpleNamespace(metadata=SimpleNamespace(name=name, labels={"app": name, "engine": engine},
+                                                    resource_version=version))
+
+
+class _Cluster:
+    # Serves the informer's list calls and scripted watch sessions: each
+    # session is a list of (type, obj) events, which ends like a watch
+    # timeout, or an exception to raise. Once they run out, watches block
+    # until stopped.
+    def __init__(self, *listings):
+        # One (objects, resource version) per list call; the last repeats.
+        self.listings = listings
+        self.lists = 0
+        self.sessions = []
+        self.watched_from = []
+
+    def list(self, namespace, label_selector):
+        objects, version = self.listings[min(self.lists, len(self.listings) - 1)]
+        self.lists += 1
+        return SimpleNamespace(items=list(objects), metadata=SimpleNamespace(resource_version=version))
+
+    def watch(self):
+        cluster = self
+
+        class Watch:
+            def __init__(self):
+                self.stopped = threading.Event()
+
+            def stream(self, func, namespace, label_selector, resource_version, timeout_seconds):
+                cluster.watched_from.append(resource_version)
+                if not cluster.sessions:
+                    self.stopped.wait(5)
+                    return
+                session = cluster.sessions.pop(0)
+                if isinstance(session, Exception):
+                    raise session
+                for event_type, obj in session:
+                    yield {"type": event_type, "object": obj}
+
+            def stop(self):
+                self.stopped.set()
+
+        return Watch()
+
+
+@pytest.fixture
+def cluster(monkeypatch):
+    cluster = _Cluster(([_obj("orders", "5")], "5"))
+    monkeypatch.setattr(informers.watch, "Watch", cluster.watch)
+    return cluster
+
+
+@pytest.fixture
+def run(cluster):
+    started = []
+
+    def run(*handlers):
+        informer = informers.Informer("statefulsets", lambda: cluster.list, "default")
+        events, resyncs = [], []
+        for handler in handlers:
+            informer.add_handler(handler)
+        informer.add_handler(lambda event_type, obj: events.append((event_type, obj.metadata.name)))
+        informer.add_resync_handler(lambda items: resyncs.append(sorted(obj.metadata.name for obj in items)))
+        informer.start()
+        started.append(informer)
+        return informer, events, resyncs
+
+    yield run
+    for informer in started:
+        informer.stop()
+        informer.join(5)
+
+
+def _until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def _names(informer):
+    return sorted(obj.metadata.name for obj in informer.items())
+
+
+def test_lists_then_applies_watch_events_and_resumes_where_it_stopped(cluster, run):
+    cluster.sessions.append([("MODIFIED", _obj("orders", "6")), ("ADDED", _obj("events", "7", "kafka")),
+                             ("DELETED", _obj("orders", "8"))])
+    informer, events, resyncs = run()
+    _until(lambda: len(cluster.watched_from) == 2)
+
+    assert informer.synced.is_set() and resyncs == [["orders"]]
+    assert events == [("MODIFIED", "orders"), ("ADDED", "events"), ("DELETED", "orders")]
+    assert _names(informer) == ["events"]
+    assert informer.by_engine("kafka") == [informer.get("events")] and informer.by_engine("postgres") == []
+    # A watch that times out restarts from the last event, without listing again.
+    assert cluster.watched_from == ["5", "8"] and cluster.lists == 1
+
+
+def test_relists_when_the_resource_version_is_gone(cluster, run):
+    cluster.listings += (([_obj("users", "40")], "40"),)
+    cluster.sessions.append(ApiException(status=410, reason="Gone"))
+    informer, events, resyncs = run()
+    _until(lambda: len(cluster.watched_from) == 2)
+
+    assert cluster.lists == 2 and cluster.watched_from == ["5", "40"]
+    assert resyncs == [["orders"], ["users"]]
+    assert _names(informer) == ["users"] and events == []
+
+
+def test_relists_every_resync_interval(cluster, run, monkeypatch):
+    monkeypatch.setattr(informers, "RESYNC_SECONDS", 0)
+    cluster.sessions.append([("ADDED", _obj("events", "6", "kafka"))])
+    informer, events, resyncs = run()
+    _until(lambda: len(cluster.watched_from) == 2)
+
+    # Whatever was missed between watches is replaced by the fresh listing.
+    assert cluster.lists == 2 and resyncs == [["orders"], ["orders"]]
+    assert events == [("ADDED", "events")]
+    assert _names(informer) == ["orders"] and informer.by_engine("kafka") == []
+
+
+def test_a_failing_handler_does_not_stop_the_informer(cluster, run):
+    cluster.sessions.append([("ADDED", _obj("events", "6", "kafka")), ("ADDED", _obj("users", "7"))])
+    informer, _, _ = run(lambda event_type, obj: 1 / 0)
+    _until(lambda: len(cluster.watched_from) == 2)
+    assert _names(informer) == ["events", "orders", "users"]
+
+
+def test_live_status_reads_the_caches(monkeypatch):
+    monkeypatch.setattr(informers, "_informers", {})
+    assert informers.live_status("orders") is None
+
+    workload = SimpleNamespace(kind="StatefulSet", metadata=SimpleNamespace(name="orders", labels={}),
+                               spec=SimpleNamespace(replicas=2),
+                               status=SimpleNamespace(ready_replicas=1, available_replicas=1))
+    service = SimpleNamespace(metadata=SimpleNamespace(name="orders", labels={}),
+                              spec=SimpleNamespace(cluster_ip="10.0.0.1", ports=[SimpleNamespace(port=5432)]))
+    for kind, items in (("statefulsets", [workload]), ("deployments", []), ("services", [service])):
+        informer = informers.get_informer(kind)
+        informer._relist(lambda namespace, label_selector, items=items: SimpleNamespace(
+            items=items, metadata=SimpleNamespace(resource_version="1")))
+
+    assert informers.live_status("orders") == {
+        "found": True, "kind": "StatefulSet", "replicas": 2, "ready_replicas": 1, "available_replicas": 1,
+        "ready": False, "service": {"cluster_ip": "10.0.0.1", "ports": [5432]}}
+    assert informers.live_status("users") == {"found": False}
@@ -0,0 +1,135 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytest
+
+from utils import jobs
+
+
+@pytest.fixture
+def worker(mongo, monkeypatch):
+    # Claims and runs jobs by hand, as the dispatcher of one process would.
+    monkeypatch.setattr(jobs, "_owner", "test-worker")
+    monkeypatch.setitem(jobs._handlers, "create_test", lambda **params: (True, dict(params, password="secret")))
+    monkeypatch.setitem(jobs._handlers, "broken_test", lambda **params: 1 / 0)
+    return jobs
+
+
+def _run(worker, job):
+    worker._capacity.acquire()
+    worker._run_job(job)
+
+
+def test_submit_reuses_the_job_of_an_idempotency_key(worker):
+    job_id = worker.submit_job("create_test", {"db_name": "orders"}, "key")
+    assert worker.submit_job("create_test", {"db_name": "orders"}, "key") == job_id
+    assert worker.get_job(job_id)["status"] == "queued"
+
+
+def test_claim_takes_the_oldest_queued_job_and_requeue_releases_it(worker):
+    first = worker.submit_job("create_test", {"db_name": "first"})
+    worker.submit_job("create_test", {"db_name": "second"})
+
+    job = worker._claim()
+    assert job["job_id"] == first
+    assert job["status"] == "running" and job["owner"] == "test-worker"
+
+    worker._requeue(job)
+    requeued = worker.jobs_collection.find_one({"job_id": first})
+    assert requeued["status"] == "queued" and "owner" not in requeued
+    assert worker._claim()["job_id"] == first
+
+
+def test_jobs_whose_lease_expired_fail_and_release_their_key(worker):
+    job_id = worker.submit_job("create_test", {"db_name": "orders"}, "key")
+    worker._claim()
+    worker.jobs_collection.update_one({"job_id": job_id}, {"$set": {
+        "heartbeat_at": datetime.now() - timedelta(seconds=worker.LEASE_SECONDS + 1)}})
+
+    worker.fail_interrupted_jobs()
+    job = worker.get_job(job_id)
+    assert job["status"] == "failed" and "Interrupted" in job["error"]
+    assert worker.submit_job("create_test", {"db_name": "orders"}, "key") != job_id
+
+
+def test_heartbeat_keeps_the_lease_of_running_jobs(worker):
+    job_id = worker.submit_job("create_test", {"db_name": "orders"})
+    worker._claim()
+    worker.jobs_collection.update_one({"job_id": job_id}, {"$set": {
+        "heartbeat_at": datetime.now() - timedelta(seconds=worker.LEASE_SECONDS + 1)}})
+
+    worker._heartbeat()
+    worker.fail_interrupted_jobs()
+    assert worker.get_job(job_id)["status"] == "running"
+
+
+def test_secrets_of_a_succeeded_job_are_returned_once(worker):
+    job_id = worker.submit_job("create_test", {"db_name": "orders"}, "key")
+    _run(worker, worker._claim())
+
+    job = worker.get_job(job_id)
+    assert job["status"] == "succeeded"
+    assert job["result"] == {"db_name": "orders", "password": "secret"}
+    assert worker.get_job(job_id)["result"] == {"db_name": "orders"}
+    assert worker.jobs_collection.find_one({"job_id": job_id})["idempotency_key"] == "key"
+
+
+def test_a_raising_handler_fails_its_job(worker):
+    job_id = worker.submit_job("broken_test", {}, "key")
+    _run(worker, worker._claim())
+
+    job = worker.get_job(job_id)
+    assert job["status"] == "failed" and "division by zero" in job["error"]
+    assert "idempotency_key" not in worker.jobs_collection.find_one({"job_id": job_id})
+
+
+def test_only_waiters_keep_completion_events(worker):
+    job_id = worker.submit_job("create_test", {"db_name": "orders"})
+    assert worker._finished == {}
+
+    job = worker._claim()
+    runner = threading.Timer(0.1, _run, (worker, job))
+    runner.start()
+    started = time.monotonic()
+    assert worker.wait_for_job(job_id, 5)["status"] == "succeeded"
+    runner.join()
+    assert time.monotonic() - started < worker.POLL_SECONDS + 1
+    assert worker._finished == {}
+
+
+def test_jobs_finishing_without_waiters_leave_nothing_behind(worker):
+    worker.submit_job("create_test", {"db_name": "orders"})
+    _run(worker, worker._claim())
+    assert worker._finished == {}
+    assert worker.wait_for_job("unknown", 0) is None
+    assert worker._finished == {}
+
+
+@pytest.fixture
+def dispatcher(worker, monkeypatch):
+    # A dispatcher of its own, so draining it leaves the module usable.
+    monkeypatch.setattr(jobs, "POLL_SECONDS", 0.05)
+    for name in ("_wake", "_draining", "_stopped"):
+        monkeypatch.setattr(jobs, name, threading.Event())
+    monkeypatch.setattr(jobs, "_capacity", threading.Semaphore(jobs.MAX_WORKERS))
+    monkeypatch.setattr(jobs, "_executor", ThreadPoolExecutor(max_workers=2))
+    thread = threading.Thread(target=jobs._dispatch, daemon=True)
+    thread.start()
+    yield jobs
+    jobs.drain(5)
+    thread.join(5)
+
+
+def test_stopping_claims_leaves_queued_jobs_for_other_processes(dispatcher):
+    first = dispatcher.submit_job("create_test", {"db_name": "first"})
+    assert dispatcher.wait_for_job(first, 5)["status"] == "succeeded"
+
+    dispatcher.stop_claiming()
+    assert dispatcher.submit_job("create_test", {"db_name": "second"}) is None
+    dispatcher.jobs_collection.insert_one({"job_id": "queued", "type": "create_test", "params": {},
+                                           "status": "queued", "created_at": datetime.now()})
+    time.sleep(dispatcher.POLL_SECONDS * 5)
+    assert dispatcher.get_job("queued")["status"] == "queued"
+    assert dispatcher.drain(5)
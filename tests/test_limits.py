@@ -0,0 +1,68 @@
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import pytest
+from kubernetes.utils import parse_quantity
+
+from db_deployments import quotas
+from db_deployments.provisioner import parse_options
+from utils import rate_limit
+
+
+@pytest.fixture
+def limited(mongo, monkeypatch):
+    monkeypatch.setattr(rate_limit, "RATE_PER_MINUTE", 6.0)
+    monkeypatch.setattr(rate_limit, "BURST", 3.0)
+    return rate_limit
+
+
+def test_rate_limit_allows_a_burst_then_asks_to_retry(limited):
+    assert [limited.acquire("owner@example.com") for _ in range(3)] == [0, 0, 0]
+    assert 9 < limited.acquire("owner@example.com") <= 10
+    assert limited.acquire("other@example.com") == 0
+
+
+def test_rate_limit_refills_over_time(limited, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit.time, "time", lambda: now[0])
+    for _ in range(3):
+        limited.acquire("owner@example.com")
+    assert limited.acquire("owner@example.com")
+    now[0] += 10
+    assert limited.acquire("owner@example.com") == 0
+    assert limited.acquire("owner@example.com")
+
+
+def test_rate_limit_is_shared_by_concurrent_callers(limited):
+    # Every caller reads and updates the same bucket document, as the
+    # workers of different replicas do.
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda _: limited.acquire("owner@example.com"), range(20)))
+    assert results.count(0) == 3
+
+
+def _footprint(engine, data):
+    options = parse_options(engine, data)
+    return quotas.footprint(engine, options["sizing"], options.get("topology"), options.get("pooler"))
+
+
+def test_footprint_counts_every_pod_of_an_instance():
+    assert _footprint("postgres", {}) == (Decimal("0.5"), parse_quantity("1Gi"))
+    assert _footprint("postgres", {"replicas": 2}) == (Decimal("1.5"), parse_quantity("3Gi"))
+    assert _footprint("postgres", {"pooler": True}) == (Decimal("0.6"), parse_quantity("1088Mi"))
+    # Three Sentinels at their own resources next to the sized primary and replica.
+    assert _footprint("redis", {"replicas": 1}) == (Decimal("1.3"), parse_quantity("2240Mi"))
+    assert _footprint("kafka", {"brokers": 3}) == (Decimal("1.75"), parse_quantity("3584Mi"))
+    assert _footprint("kafka", {"brokers": 3, "kraft": True}) == (Decimal("1.5"), parse_quantity("3Gi"))
+    assert _footprint("elasticsearch", {"nodes": 3, "masters": 3}) == (Decimal("3"), parse_quantity("6Gi"))
+
+
+def test_admit_refuses_creates_whose_companions_exceed_the_quota(mongo, monkeypatch):
+    monkeypatch.setattr(quotas, "MAX_CPU", "2")
+    quotas.forget("owner@example.com")
+    options = parse_options("elasticsearch", {"nodes": 1, "masters": 3})
+
+    assert quotas.admit("owner@example.com", "elasticsearch", options["sizing"], options["topology"]) is None
+    assert quotas.admit("owner@example.com", "elasticsearch", options["sizing"], options["topology"]) == \
+        "CPU quota of 2 cores exceeded"
+    quotas.forget("owner@example.com")
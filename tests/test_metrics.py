@@ -0,0 +1,75 @@
+import os
+import subprocess
+import sys
+
+import pytest
+from kubernetes.client import ApiException
+from prometheus_client import REGISTRY
+
+import app as application
+from db_deployments.provisioner import deploy
+from utils import metrics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_stages_are_timed_and_their_api_failures_counted():
+    before = _sample("clickclouddb_provision_stage_duration_seconds_count", engine="redis", stage="create_test")
+    errors = _sample("clickclouddb_kubernetes_api_errors_total", operation="create_test", status="409")
+
+    with metrics.stage("redis", "create_test"):
+        pass
+    with pytest.raises(ApiException):
+        with metrics.stage("redis", "create_test"):
+            raise ApiException(status=409)
+
+    assert _sample("clickclouddb_provision_stage_duration_seconds_count",
+                   engine="redis", stage="create_test") == before + 2
+    assert _sample("clickclouddb_kubernetes_api_errors_total", operation="create_test", status="409") == errors + 1
+
+
+def test_time_to_ready_is_recorded_by_source():
+    cold = _sample("clickclouddb_instance_time_to_ready_seconds_count", engine="mysql", source="cold")
+    warm = _sample("clickclouddb_instance_time_to_ready_seconds_count", engine="mysql", source="warm_pool")
+
+    metrics.observe_ready("mysql", 42)
+    metrics.observe_ready("mysql", 0.5, source="warm_pool")
+
+    assert _sample("clickclouddb_instance_time_to_ready_seconds_count", engine="mysql", source="cold") == cold + 1
+    assert _sample("clickclouddb_instance_time_to_ready_seconds_count",
+                   engine="mysql", source="warm_pool") == warm + 1
+    assert _sample("clickclouddb_instance_time_to_ready_seconds_bucket",
+                   engine="mysql", source="warm_pool", le="1.0") == warm + 1
+
+
+def test_metrics_endpoint_reports_the_stages_of_a_create(kube, mongo):
+    deploy("postgres", "orders", "owner@example.com")
+    body = application.app.test_client().get("/metrics").get_data(as_text=True)
+    assert 'clickclouddb_provision_stage_duration_seconds_count{engine="postgres",stage="create_statefulset"}' in body
+    assert 'clickclouddb_provision_stage_duration_seconds_count{engine="postgres",stage="render"}' in body
+
+
+def _worker(directory, script):
+    # Metrics modes are fixed at import, so each worker is a fresh process.
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(directory))
+    return subprocess.run([sys.executable, "-c", script], cwd=ROOT, env=env, check=True,
+                          capture_output=True, text=True).stdout
+
+
+def test_multiprocess_metrics_add_up_across_workers_and_outlive_them(tmp_path):
+    record = ("from utils.metrics import observe_ready, stage\n"
+              "with stage('kafka', 'render'):\n    pass\n"
+              "observe_ready('kafka', 3, source='warm_pool')\n")
+    _worker(tmp_path, record)
+    _worker(tmp_path, record)
+    # What gunicorn's child_exit hook does once a worker has gone.
+    _worker(tmp_path, "import os, runpy\n"
+                      "runpy.run_path('gunicorn.conf.py')['child_exit'](None, type('W', (), {'pid': os.getpid()}))\n")
+
+    body = _worker(tmp_path, "from utils.metrics import render\nprint(render()[0].decode())")
+    assert 'clickclouddb_provision_stage_duration_seconds_count{engine="kafka",stage="render"} 2.0' in body
+    assert 'clickclouddb_instance_time_to_ready_seconds_count{engine="kafka",source="warm_pool"} 2.0' in body
@@ -0,0 +1,129 @@
+import json
+import logging
+import threading
+
+import pytest
+from kubernetes.client import ApiException
+
+import app as application
+from db_deployments.provisioner import deploy
+from utils import pod_logs
+
+
+class _Response:
+    # What read_namespaced_pod_log returns with _preload_content=False.
+    def __init__(self, chunks, follow=False):
+        self.chunks = chunks
+        self.follow = follow
+        self.closed = threading.Event()
+        self.released = False
+
+    def stream(self, amount, decode_content):
+        yield from self.chunks
+        if self.follow:
+            # A followed log ends only when the connection is closed.
+            self.closed.wait(5)
+
+    def release_conn(self):
+        self.released = True
+
+    def close(self):
+        self.closed.set()
+
+
+@pytest.fixture
+def pods(monkeypatch):
+    # pod name -> _Response, ApiException or log text; calls records the arguments of every read.
+    logs, calls = {}, []
+
+    class CoreV1Api:
+        def read_namespaced_pod_log(self, name, namespace, **kwargs):
+            calls.append(dict(kwargs, name=name))
+            if isinstance(logs[name], Exception):
+                raise logs[name]
+            return logs[name]
+
+    monkeypatch.setattr(pod_logs, "get_core_v1_api", CoreV1Api)
+    return logs, calls
+
+
+def _events(stream):
+    return [event for event in stream.events() if event is not None]
+
+
+def test_streams_every_line_of_every_pod(pods):
+    logs, calls = pods
+    logs["orders-0"] = _Response([b"first\nsec", b"ond\nno newline"])
+    logs["orders-1"] = _Response([b"replica\n"])
+    stream = pod_logs.LogStream("default", ["orders-0", "orders-1"], {"container": "orders", "tail_lines": 10,
+                                                                      "since_seconds": None}, follow=False)
+    events = _events(stream)
+
+    assert [event for event in events if event[0] == "orders-0"] == [
+        ("orders-0", "first", None), ("orders-0", "second", None), ("orders-0", "no newline", None)]
+    assert [event for event in events if event[0] == "orders-1"] == [("orders-1", "replica", None)]
+    assert all(call["container"] == "orders" and call["tail_lines"] == 10 and "since_seconds" not in call
+               and call["follow"] is False for call in calls)
+    assert logs["orders-0"].released and logs["orders-1"].released
+
+
+def test_lines_without_an_end_are_split_instead_of_buffered(pods, monkeypatch):
+    logs, _ = pods
+    monkeypatch.setattr(pod_logs, "MAX_LINE_BYTES", 4)
+    logs["orders-0"] = _Response([b"abcdef", b"ghij"])
+    events = _events(pod_logs.LogStream("default", ["orders-0"], {}, follow=False))
+    assert [line for _, line, _ in events] == ["abcd", "efgh", "ij"]
+
+
+def test_a_missing_pod_is_reported_next_to_the_others(pods):
+    logs, _ = pods
+    logs["orders-0"] = _Response([b"up\n"])
+    logs["orders-1"] = ApiException(status=404, reason="Not Found")
+    lines = list(pod_logs.format_ndjson(
+        pod_logs.LogStream("default", ["orders-0", "orders-1"], {}, follow=False).events()))
+
+    assert sorted(lines) == [json.dumps({"pod": "orders-0", "line": "up"}) + "\n",
+                             json.dumps({"pod": "orders-1", "error": "Not Found"}) + "\n"]
+
+
+def test_a_followed_stream_sends_keepalives_and_closes_with_the_client(pods, monkeypatch):
+    logs, calls = pods
+    monkeypatch.setattr(pod_logs, "HEARTBEAT_SECONDS", 0.05)
+    logs["orders-0"] = _Response([b"started\n"], follow=True)
+    events = pod_logs.format_sse(pod_logs.LogStream("default", ["orders-0"], {}, follow=True).events())
+
+    assert next(events) == f"data: {json.dumps({'pod': 'orders-0', 'line': 'started'})}\n\n"
+    assert next(events) == ": keepalive\n\n"
+    events.close()
+    assert logs["orders-0"].closed.is_set()
+    assert calls[0]["follow"] is True
+
+
+def test_fetch_logs_reads_every_pod(pods):
+    logs, calls = pods
+    logs.update({"orders-0": "primary\n", "orders-1": "replica\n"})
+    assert pod_logs.fetch_logs("default", ["orders-0", "orders-1"], {"tail_lines": 5, "limit_bytes": None}) == {
+        "orders-0": "primary\n", "orders-1": "replica\n"}
+    assert sorted(call["name"] for call in calls) == ["orders-0", "orders-1"]
+    assert all(call == {"name": call["name"], "tail_lines": 5} for call in calls)
+    assert pod_logs.fetch_logs("default", [], {}) == {}
+
+
+def test_the_logs_route_reads_the_instance_container(kube, mongo):
+    deploy("postgres", "orders", "owner@example.com")
+    response = application.app.test_client().get("/get_deployment_logs", query_string={
+        "deployment_name": "orders", "tail_lines": 2})
+    assert response.status_code == 200
+    assert response.get_json() == {"logs": {"orders-0": "orders-0 line 0\norders-0 line 1\n"}}
+
+
+def test_the_logs_route_logs_api_failures(mongo, monkeypatch, caplog):
+    def forbidden(namespace, deployment_name):
+        raise ApiException(status=403, reason="Forbidden")
+
+    monkeypatch.setattr(application, "list_pod_names", forbidden)
+    with caplog.at_level(logging.ERROR, logger=application.__name__):
+        response = application.app.test_client().get("/get_deployment_logs", query_string={
+            "deployment_name": "orders"})
+    assert response.status_code == 500
+    assert "Failed to fetch logs of 'orders'" in caplog.text
@@ -0,0 +1,235 @@
+import pytest
+from kubernetes.client import ApiException, AppsV1Api, CoreV1Api
+
+from db_deployments import provisioner
+from db_deployments.provisioner import IDEMPOTENCY_ANNOTATION, deploy, parse_options, remove, render_manifests
+
+
+def _context(db_name):
+    return {"db_name": db_name, "username": "postgres", "password": "secret", "namespace": "default",
+            "cluster_id": "cluster"}
+
+
+def _objects(kube, kind):
+    return sorted(name for (_, stored_kind, name) in kube.objects if stored_kind == kind)
+
+
+def test_render_applies_sizing_storage_and_topology():
+    options = parse_options("postgres", {"tier": "medium", "replicas": 2})
+    manifests = render_manifests("postgres", _context("orders"), options["sizing"], options["storage"],
+                                 topology=options["topology"])
+
+    assert [statefulset["metadata"]["name"] for statefulset, _, _ in manifests] == ["orders", "orders-replica"]
+    primary, service, secret = manifests[0]
+    container = primary["spec"]["template"]["spec"]["containers"][0]
+    assert container["resources"]["limits"] == {"cpu": "1", "memory": "4Gi"}
+    assert primary["spec"]["volumeClaimTemplates"][0]["spec"]["resources"]["requests"]["storage"] == "50Gi"
+    assert service["spec"]["selector"] == {"app": "orders"}
+    assert secret is None
+    replica = manifests[1][0]
+    assert replica["spec"]["replicas"] == 2
+    assert replica["spec"]["template"]["spec"]["containers"][0]["resources"]["limits"]["memory"] == "4Gi"
+
+
+def test_render_skips_companions_of_the_default_topology():
+    manifests = render_manifests("postgres", _context("orders"))
+    assert [statefulset["metadata"]["name"] for statefulset, _, _ in manifests] == ["orders"]
+
+
+def test_deploy_applies_every_object_and_returns_the_record(kube):
+    record, secrets = deploy("postgres", "orders", "owner@example.com", idempotency_key="key")
+
+    assert _objects(kube, "statefulsets") == ["orders"]
+    assert _objects(kube, "services") == ["orders"]
+    annotations = kube.objects[("default", "statefulsets", "orders")]["metadata"]["annotations"]
+    assert annotations[IDEMPOTENCY_ANNOTATION] == "key"
+    assert record["type"] == "postgres" and record["email"] == "owner@example.com"
+    assert secrets["username"] == "postgres" and secrets["password"]
+
+    remove("postgres", "orders")
+    assert _objects(kube, "statefulsets") == [] and _objects(kube, "services") == []
+
+
+@pytest.fixture
+def volume_deletes(monkeypatch):
+    deletes = []
+    monkeypatch.setattr(CoreV1Api, "delete_collection_namespaced_persistent_volume_claim",
+                        lambda self, namespace, **kwargs: deletes.append(kwargs["label_selector"]))
+    return deletes
+
+
+def test_deploy_replaces_objects_left_by_an_earlier_attempt(kube, mongo, volume_deletes):
+    deploy("postgres", "orders", "owner@example.com", idempotency_key="key")
+    deploy("postgres", "orders", "owner@example.com", idempotency_key="key")
+    assert _objects(kube, "statefulsets") == ["orders"]
+    # The new StatefulSet takes over the earlier attempt's volumes.
+    assert volume_deletes == []
+
+
+def test_a_replayed_create_never_replaces_a_live_instance(kube, mongo, volume_deletes):
+    provisioner.create_instance("postgres", "orders", "owner@example.com", idempotency_key="key")
+    statefulset = kube.objects[("default", "statefulsets", "orders")]
+
+    success, result = provisioner.create_instance("postgres", "orders", "owner@example.com", idempotency_key="key")
+    assert not success and result["error"] == "Postgres database 'orders' already exists"
+    assert kube.objects[("default", "statefulsets", "orders")] is statefulset
+    assert _objects(kube, "services") == ["orders"]
+    assert volume_deletes == []
+
+
+def test_deploy_does_not_touch_another_instance_of_the_same_name(kube):
+    deploy("postgres", "orders", "owner@example.com", idempotency_key="first")
+    with pytest.raises(ApiException) as error:
+        deploy("postgres", "orders", "other@example.com", idempotency_key="second")
+
+    assert error.value.status == 409
+    annotations = kube.objects[("default", "statefulsets", "orders")]["metadata"]["annotations"]
+    assert annotations[IDEMPOTENCY_ANNOTATION] == "first"
+    assert _objects(kube, "services") == ["orders"]
+
+
+def test_deploy_rolls_back_when_a_create_is_rejected(kube, monkeypatch):
+    def reject(self, namespace, body, **kwargs):
+        raise ApiException(status=422, reason="Invalid")
+
+    monkeypatch.setattr(CoreV1Api, "create_namespaced_service", reject)
+    with pytest.raises(ApiException):
+        deploy("postgres", "orders", "owner@example.com")
+
+    assert _objects(kube, "statefulsets") == []
+
+
+def test_deploy_rolls_back_what_it_applied_when_a_later_create_raises(kube, monkeypatch):
+    # The pooler's config Secret is applied before the StatefulSet.
+    def broken(self, namespace, body, **kwargs):
+        raise RuntimeError("connection reset")
+
+    monkeypatch.setattr(AppsV1Api, "create_namespaced_stateful_set", broken)
+    with pytest.raises(RuntimeError):
+        deploy("mysql", "orders", "owner@example.com", pooler=parse_options("mysql", {"pooler": True})["pooler"])
+
+    assert _objects(kube, "secrets") == []
+    assert _objects(kube, "services") == []
+
+
+def test_deploy_rolls_back_when_building_the_record_fails(kube, monkeypatch):
+    def broken(namespace, statefulset, service):
+        raise KeyError("ports")
+
+    monkeypatch.setattr(provisioner, "_hosts", broken)
+    with pytest.raises(KeyError):
+        deploy("postgres", "orders", "owner@example.com")
+
+    assert _objects(kube, "statefulsets") == [] and _objects(kube, "services") == []
+
+
+def test_create_instance_reports_non_api_failures(kube, mongo, monkeypatch):
+    monkeypatch.setattr(provisioner, "_hosts", lambda namespace, statefulset, service: {}["ports"])
+    success, result = provisioner.create_instance("postgres", "orders", "owner@example.com")
+
+    assert not success and result == {"db_name": "orders", "error": "'ports'"}
+    assert provisioner.collection.find_one({"db_name": "orders"}) is None
+
+
+def test_heap_must_fit_in_half_the_instance_memory():
+    with pytest.raises(ValueError, match="heap_mb must be at most 512 with 1Gi of memory"):
+        parse_options("elasticsearch", {"heap_mb": 30000})
+    with pytest.raises(ValueError, match="heap_mb must be at most 512"):
+        parse_options("elasticsearch", {"heap_mb": 513})
+
+    assert parse_options("elasticsearch", {"heap_mb": 512})["topology"]["heap_mb"] == 512
+    assert parse_options("elasticsearch", {"heap_mb": 8192, "tier": "large"})["topology"]["heap_mb"] == 8192
+    assert parse_options("elasticsearch", {"heap_mb": 2048, "cpu": "2", "memory": "4Gi"})["topology"]["heap_mb"] == 2048
+
+
+def test_re_created_instances_keep_nothing_of_their_predecessor(kube, mongo):
+    provisioner.create_instance("postgres", "orders", "owner@example.com", ttl_seconds=60)
+    assert provisioner.delete_instance("postgres", "orders")
+    provisioner.create_instance("postgres", "orders", "other@example.com")
+
+    record = provisioner.collection.find_one({"db_name": "orders"})
+    assert record["email"] == "other@example.com" and record["deleted"] is False
+    for field in ("expires_at", "deleted_at", "data_retained"):
+        assert field not in record
+    assert provisioner.collection.count_documents({}) == 1
+
+
+def _env(statefulset):
+    return {variable["name"]: variable["value"]
+            for variable in statefulset["spec"]["template"]["spec"]["containers"][0]["env"]}
+
+
+def test_render_kafka_as_a_kraft_controller_quorum():
+    options = parse_options("kafka", {"brokers": 3, "kraft": True})
+    manifests = render_manifests("kafka", _context("events"), options["sizing"], topology=options["topology"])
+
+    assert [statefulset["metadata"]["name"] for statefulset, _, _ in manifests] == ["events"]
+    statefulset, service, _ = manifests[0]
+    assert statefulset["spec"]["replicas"] == 3 and statefulset["spec"]["podManagementPolicy"] == "Parallel"
+    assert service["metadata"]["name"] == "events" and service["spec"]["clusterIP"] == "None"
+    env = _env(statefulset)
+    assert env["KAFKA_CFG_CONTROLLER_QUORUM_VOTERS"] == (
+        "0@events-0.events:9093,1@events-1.events:9093,2@events-2.events:9093")
+    assert env["KAFKA_KRAFT_CLUSTER_ID"] == "cluster"
+    assert env["KAFKA_CFG_DEFAULT_REPLICATION_FACTOR"] == "3" and env["KAFKA_CFG_MIN_INSYNC_REPLICAS"] == "2"
+    assert "KAFKA_CFG_ZOOKEEPER_CONNECT" not in env
+
+
+def test_render_kafka_with_zookeeper():
+    options = parse_options("kafka", {"brokers": 2})
+    manifests = render_manifests("kafka", _context("events"), options["sizing"], topology=options["topology"])
+
+    assert [statefulset["metadata"]["name"] for statefulset, _, _ in manifests] == ["events-zookeeper", "events"]
+    zookeeper, zookeeper_service, _ = manifests[0]
+    assert zookeeper["spec"]["replicas"] == 1 and "clusterIP" not in zookeeper_service["spec"]
+    assert _env(manifests[1][0])["KAFKA_CFG_ZOOKEEPER_CONNECT"] == "events-zookeeper:2181"
+
+
+def test_kafka_records_list_every_broker(kube, mongo):
+    options = parse_options("kafka", {"brokers": 3, "kraft": True})
+    record, _ = deploy("kafka", "events", "owner@example.com", **options)
+    assert record["topology"]["hosts"] == [f"events-{index}.events.default.svc:9092" for index in range(3)]
+
+
+def _redis(data):
+    options = parse_options("redis", data)
+    return render_manifests("redis", _context("cache"), options["sizing"], topology=options.get("topology"))
+
+
+def test_render_redis_alone_by_default():
+    manifests = _redis({})
+    assert [statefulset["metadata"]["name"] for statefulset, _, _ in manifests] == ["cache"]
+    statefulset, service, _ = manifests[0]
+    assert statefulset["spec"]["replicas"] == 1 and "clusterIP" not in service["spec"]
+    assert statefulset["spec"]["template"]["spec"]["containers"][0]["args"][-4:] == ["--save", "", "--appendonly", "no"]
+
+
+def test_render_redis_replicas_watched_by_sentinels():
+    manifests = _redis({"replicas": 2, "profile": "durable"})
+    assert [statefulset["metadata"]["name"] for statefulset, _, _ in manifests] == ["cache", "cache-sentinel"]
+
+    (primary, primary_service, _), (sentinel, sentinel_service, _) = manifests
+    assert primary["spec"]["replicas"] == 3 and primary_service["spec"]["clusterIP"] == "None"
+    container = primary["spec"]["template"]["spec"]["containers"][0]
+    assert "--appendonly" in container["args"] and "cache-sentinel" in container["command"][2]
+    assert sentinel["spec"]["replicas"] == 3 and sentinel_service["spec"]["clusterIP"] == "None"
+    sentinel_container = sentinel["spec"]["template"]["spec"]["containers"][0]
+    assert "sentinel monitor primary cache-0.cache 6379 2" in sentinel_container["command"][2]
+    assert sentinel_container["resources"]["limits"] == {"cpu": "100m", "memory": "64Mi"}
+
+
+def test_redis_records_list_every_pod_and_the_sentinels(kube, mongo):
+    options = parse_options("redis", {"replicas": 2})
+    record, _ = deploy("redis", "cache", "owner@example.com", **options)
+
+    assert record["topology"]["hosts"] == [f"cache-{index}.cache.default.svc:6379" for index in range(3)]
+    assert record["topology"]["sentinel"] == "cache-sentinel.default.svc:26379"
+    assert record["topology"]["sentinel_primary"] == "primary"
+
+
+def test_render_redis_cluster_without_sentinels():
+    manifests = _redis({"cluster": True, "shards": 3, "replicas": 1})
+    assert [statefulset["metadata"]["name"] for statefulset, _, _ in manifests] == ["cache"]
+    statefulset, service, _ = manifests[0]
+    assert statefulset["spec"]["replicas"] == 6 and service["spec"]["clusterIP"] == "None"
+    assert "--cluster-replicas 1" in statefulset["spec"]["template"]["spec"]["containers"][0]["command"][2]
@@ -0,0 +1,96 @@
+from datetime import datetime, timezone
+
+import pytest
+from kubernetes.client import (
+    V1ContainerState, V1ContainerStateWaiting, V1ContainerStatus, V1Deployment, V1DeploymentCondition,
+    V1DeploymentSpec, V1DeploymentStatus, V1LabelSelector, V1ObjectMeta, V1Pod, V1PodStatus, V1PodTemplateSpec,
+    V1StatefulSet, V1StatefulSetSpec, V1StatefulSetStatus
+)
+
+from utils import readiness
+from utils.database import collection
+from utils.informer import get_informer, stop_informers
+
+
+@pytest.fixture
+def tracking(mongo, monkeypatch):
+    # Leader of a process whose informers are fed by hand.
+    monkeypatch.setattr(readiness, "is_leader", lambda: True)
+    monkeypatch.setattr(readiness, "_record_image_pull", lambda workload, time_to_ready: None)
+    readiness._states.clear()
+    yield
+    stop_informers()
+    readiness._states.clear()
+
+
+def _statefulset(name, ready=0, replicas=1):
+    return V1StatefulSet(
+        metadata=V1ObjectMeta(name=name, namespace="default", generation=1,
+                              labels={"app": name, "engine": "postgres"},
+                              creation_timestamp=datetime.now(timezone.utc)),
+        spec=V1StatefulSetSpec(replicas=replicas, selector=V1LabelSelector(match_labels={"app": name}),
+                               service_name=name, template=V1PodTemplateSpec()),
+        status=V1StatefulSetStatus(replicas=replicas, ready_replicas=ready, available_replicas=ready,
+                                   observed_generation=1))
+
+
+def _pod(name, reason=None, restarts=0, message=None):
+    state = V1ContainerState(waiting=V1ContainerStateWaiting(reason=reason, message=message)) if reason else None
+    return V1Pod(
+        metadata=V1ObjectMeta(name=f"{name}-0", namespace="default", labels={"app": name, "engine": "postgres"}),
+        status=V1PodStatus(container_statuses=[V1ContainerStatus(
+            name=name, image="postgres", image_id="", ready=False, restart_count=restarts, state=state)]))
+
+
+def _insert(name):
+    collection.insert_one({"db_name": name, "type": "postgres", "status": "pending", "deleted": False})
+
+
+@pytest.mark.parametrize("pod, state", [
+    (_pod("orders"), "pending"),
+    (_pod("orders", "ContainerCreating"), "pending"),
+    (_pod("orders", "CrashLoopBackOff", restarts=1), "pending"),
+    (_pod("orders", "CrashLoopBackOff", restarts=readiness.FAILURE_RESTARTS), "failed"),
+    (_pod("orders", "ImagePullBackOff"), "failed"),
+    (_pod("orders", "ErrImagePull"), "failed"),
+])
+def test_statefulset_state_follows_its_pods(pod, state):
+    assert readiness.workload_state(_statefulset("orders"), [pod])[0] == state
+
+
+def test_ready_statefulset_is_ready_whatever_its_pods_went_through():
+    pod = _pod("orders", "CrashLoopBackOff", restarts=10)
+    assert readiness.workload_state(_statefulset("orders", ready=1), [pod]) == ("ready", None)
+
+
+def test_deployment_conditions_still_fail_legacy_instances():
+    deployment = V1Deployment(
+        metadata=V1ObjectMeta(name="legacy", generation=1),
+        spec=V1DeploymentSpec(replicas=1, selector=V1LabelSelector(match_labels={"app": "legacy"}),
+                              template=V1PodTemplateSpec()),
+        status=V1DeploymentStatus(observed_generation=1, conditions=[V1DeploymentCondition(
+            type="Progressing", status="False", reason="ProgressDeadlineExceeded")]))
+    assert readiness.workload_state(deployment) == ("failed", "ProgressDeadlineExceeded")
+
+
+def test_failing_pod_event_fails_the_pending_instance(tracking):
+    _insert("orders")
+    get_informer("statefulsets")._dispatch("ADDED", _statefulset("orders"))
+    pod = _pod("orders", "ImagePullBackOff", message='Back-off pulling image "postgres:nope"')
+    get_informer("pods")._dispatch("ADDED", pod)
+
+    readiness._on_pod_event("MODIFIED", pod)
+    record = collection.find_one({"db_name": "orders"})
+    assert record["status"] == "failed"
+    assert record["failure_reason"] == 'orders-0/orders: ImagePullBackOff: Back-off pulling image "postgres:nope"'
+
+
+def test_pending_instance_becomes_ready_with_its_statefulset(tracking):
+    _insert("orders")
+    readiness._on_workload_event("ADDED", _statefulset("orders"))
+    assert collection.find_one({"db_name": "orders"})["status"] == "pending"
+
+    readiness._on_workload_event("MODIFIED", _statefulset("orders", ready=1))
+    record = collection.find_one({"db_name": "orders"})
+    assert record["status"] == "ready" and record["time_to_ready_seconds"] >= 0
+    assert readiness.wait_until_settled("orders", "postgres", 1)["status"] == "ready"
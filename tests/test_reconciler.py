@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from db_deployments import reconciler
+from db_deployments.provisioner import create_instance, deploy, parse_options
+from utils.database import collection, warm_pool_collection
+
+
+@pytest.fixture
+def cluster(kube, mongo):
+    return kube
+
+
+def _age(kube, *names):
+    # Backdates objects, or all of them, past the grace period.
+    created = (datetime.now(timezone.utc) - reconciler.GRACE_PERIOD - timedelta(minutes=1)).strftime(
+        "%Y-%m-%dT%H:%M:%SZ")
+    with kube.lock:
+        for (_, _, name), obj in kube.objects.items():
+            if not names or name in names:
+                obj["metadata"]["creationTimestamp"] = created
+    collection.update_many({"db_name": {"$in": list(names)}} if names else {}, {"$set": {
+        "timestamp": datetime.now() - reconciler.GRACE_PERIOD - timedelta(minutes=1)}})
+
+
+def _objects(kube):
+    return sorted((kind, name) for (_, kind, name) in kube.objects)
+
+
+def _names(entries):
+    return sorted(entry.get("name") or entry["db_name"] for entry in entries)
+
+
+def test_old_objects_without_a_record_are_orphans(cluster):
+    deploy("postgres", "abandoned", "owner@example.com")
+    deploy("postgres", "creating", "owner@example.com")
+    _age(cluster, "abandoned")
+
+    report = reconciler.plan()
+    assert sorted((orphan["kind"], orphan["name"]) for orphan in report["orphans"]) == [
+        ("Service", "abandoned"), ("StatefulSet", "abandoned")]
+    assert report["missing"] == [] and report["expired"] == []
+
+
+def test_objects_of_instances_and_the_warm_pool_are_not_orphans(cluster):
+    create_instance("kafka", "events", "owner@example.com", **parse_options("kafka", {"brokers": 3}))
+    deploy("postgres", "warm-postgres-1", "warm-pool")
+    warm_pool_collection.insert_one({"name": "warm-postgres-1", "engine": "postgres", "status": "ready"})
+    _age(cluster)
+
+    assert reconciler.plan() == {"orphans": [], "missing": [], "expired": []}
+
+
+def test_old_records_without_a_workload_are_missing(cluster):
+    old = datetime.now() - reconciler.GRACE_PERIOD - timedelta(minutes=1)
+    collection.insert_many([
+        {"db_name": "gone", "type": "postgres", "deleted": False, "status": "ready", "timestamp": old},
+        {"db_name": "reported", "type": "postgres", "deleted": False, "status": "missing", "timestamp": old},
+        {"db_name": "creating", "type": "postgres", "deleted": False, "status": "pending",
+         "timestamp": datetime.now()},
+        {"db_name": "deleted", "type": "postgres", "deleted": True, "status": "deleted", "timestamp": old},
+    ])
+    assert reconciler.plan()["missing"] == [{"db_name": "gone", "type": "postgres"}]
+
+
+def test_instances_past_their_ttl_are_expired(cluster):
+    create_instance("postgres", "ephemeral", "owner@example.com", ttl_seconds=60)
+    create_instance("postgres", "kept", "owner@example.com", ttl_seconds=3600)
+    collection.update_one({"db_name": "ephemeral"}, {"$set": {"expires_at": datetime.now() - timedelta(seconds=1)}})
+
+    assert reconciler.plan()["expired"] == [{"db_name": "ephemeral", "type": "postgres"}]
+
+
+def test_a_name_re_created_after_its_ttl_delete_is_not_expired(cluster):
+    create_instance("postgres", "ci", "owner@example.com", ttl_seconds=60)
+    collection.update_one({"db_name": "ci"}, {"$set": {"expires_at": datetime.now() - timedelta(seconds=1)}})
+    assert _names(reconciler.reconcile(dry_run=False)["expired"]) == ["ci"]
+    assert _objects(cluster) == []
+
+    create_instance("postgres", "ci", "owner@example.com")
+    _age(cluster)
+    assert reconciler.plan() == {"orphans": [], "missing": [], "expired": []}
+    assert _objects(cluster) == [("services", "ci"), ("statefulsets", "ci")]
+
+
+def test_reconcile_deletes_only_what_the_plan_reports(cluster):
+    create_instance("postgres", "live", "owner@example.com")
+    create_instance("postgres", "ephemeral", "owner@example.com", ttl_seconds=60)
+    deploy("postgres", "abandoned", "owner@example.com")
+    deploy("postgres", "creating", "owner@example.com")
+    _age(cluster, "live", "ephemeral", "abandoned")
+    collection.update_one({"db_name": "ephemeral"}, {"$set": {"expires_at": datetime.now() - timedelta(seconds=1)}})
+    collection.insert_one({"db_name": "gone", "type": "postgres", "deleted": False, "status": "ready",
+                           "timestamp": datetime.now() - reconciler.GRACE_PERIOD - timedelta(minutes=1)})
+    before = _objects(cluster)
+
+    report = reconciler.reconcile(dry_run=True)
+    assert _objects(cluster) == before
+    assert collection.find_one({"db_name": "gone"})["status"] == "ready"
+
+    assert reconciler.reconcile(dry_run=False) == dict(report, dry_run=False)
+    assert _objects(cluster) == [("services", "creating"), ("services", "live"),
+                                 ("statefulsets", "creating"), ("statefulsets", "live")]
+    assert collection.find_one({"db_name": "gone"})["status"] == "missing"
+    assert collection.find_one({"db_name": "ephemeral"})["deleted"] is True
+    assert collection.find_one({"db_name": "live"})["deleted"] is False
@@ -0,0 +1,81 @@
+import logging
+
+import pytest
+from kubernetes.client import ApiException
+
+from db_deployments import replication
+from utils.database import collection
+
+
+@pytest.fixture
+def replicas(mongo, monkeypatch):
+    # pod name -> what exec_in_pod returns or raises for it
+    outcomes = {}
+    calls = []
+
+    def exec_in_pod(namespace, pod_name, container, command, timeout):
+        calls.append(pod_name)
+        if isinstance(outcomes[pod_name], Exception):
+            raise outcomes[pod_name]
+        return outcomes[pod_name]
+
+    monkeypatch.setattr(replication, "exec_in_pod", exec_in_pod)
+    monkeypatch.setattr(replication, "_failures", {})
+    collection.insert_one({"db_name": "orders", "type": "postgres", "deleted": False, "topology": {"replicas": 3}})
+    return outcomes, calls
+
+
+def _record():
+    return collection.find_one({"db_name": "orders"})
+
+
+def test_lag_and_failure_reasons_are_stored_per_replica(replicas):
+    outcomes, _ = replicas
+    outcomes.update({
+        "orders-replica-0": (0, "1.5\n"),
+        "orders-replica-1": ApiException(status=0, reason="Handshake status 403 Forbidden"),
+        "orders-replica-2": (0, ""),
+    })
+    replication.measure()
+
+    record = _record()
+    assert record["replica_lag_seconds"] == {"orders-replica-0": 1.5, "orders-replica-1": None,
+                                             "orders-replica-2": None}
+    assert record["replica_lag_max_seconds"] == 1.5
+    assert record["replica_lag_errors"] == {"orders-replica-1": "exec forbidden",
+                                            "orders-replica-2": "replication is not running"}
+
+
+def test_failing_replicas_are_retried_with_backoff_and_logged_once(replicas, caplog):
+    outcomes, calls = replicas
+    outcomes.update({"orders-replica-0": (0, "0"), "orders-replica-1": ApiException(status=404, reason="Not Found"),
+                     "orders-replica-2": (1, "psql: error: connection refused")})
+    with caplog.at_level(logging.WARNING, logger=replication.__name__):
+        for _ in range(8):
+            replication.measure()
+
+    # Checked on passes 1, 2, 4 and 8; skipped 1 and then 3 passes in between.
+    assert calls.count("orders-replica-0") == 8
+    assert calls.count("orders-replica-1") == calls.count("orders-replica-2") == 4
+    assert len(caplog.records) == 2
+    assert _record()["replica_lag_errors"] == {
+        "orders-replica-1": "replica pod not found",
+        "orders-replica-2": "lag query exited with 1: psql: error: connection refused"}
+
+    outcomes["orders-replica-1"] = (0, "0.25")
+    for _ in range(8):
+        replication.measure()
+    assert _record()["replica_lag_seconds"]["orders-replica-1"] == 0.25
+    assert "orders-replica-1" not in _record()["replica_lag_errors"]
+
+
+def test_failures_of_removed_replicas_are_forgotten(replicas):
+    outcomes, _ = replicas
+    outcomes.update({name: ApiException(status=404) for name in ("orders-replica-0", "orders-replica-1",
+                                                                  "orders-replica-2")})
+    replication.measure()
+    assert len(replication._failures) == 3
+
+    collection.update_one({"db_name": "orders"}, {"$set": {"deleted": True}})
+    replication.measure()
+    assert replication._failures == {}
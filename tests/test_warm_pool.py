@@ -0,0 +1,46 @@
+from datetime import datetime
+
+from db_deployments import warm_pool
+from db_deployments.provisioner import delete_instance, deploy
+from utils.database import collection, resource_name
+
+
+def test_warm_instances_are_promoted_once_their_components_are_ready(kube, mongo):
+    # Warm instances have the default topology, so no read replicas.
+    deploy("postgres", "warm-postgres-1", "pool@example.com")
+    warm_pool.warm_pool_collection.insert_one({"engine": "postgres", "name": "warm-postgres-1",
+                                               "status": "provisioning", "created_at": datetime.now()})
+    warm_pool._promote("postgres")
+    assert warm_pool.warm_pool_collection.find_one({"name": "warm-postgres-1"})["status"] == "ready"
+
+
+def test_a_cold_re_create_of_a_claimed_name_uses_its_own_resources(kube, mongo, monkeypatch):
+    monkeypatch.setattr(warm_pool, "POOL_SIZES", {"postgres": 1})
+    monkeypatch.setattr(warm_pool, "exec_in_pod", lambda namespace, pod, container, command: (0, ""))
+    warm_pool._provision("postgres", 0)
+    warm_pool._promote("postgres")
+    warm_pool.create_instance("postgres", "orders", "owner@example.com")
+    assert resource_name("orders", "postgres").startswith("warm-postgres-")
+
+    assert delete_instance("postgres", "orders")
+    warm_pool.create_instance("postgres", "orders", "owner@example.com")
+
+    record = collection.find_one({"db_name": "orders"})
+    assert "resource_name" not in record and "warm_pool" not in record
+    assert resource_name("orders", "postgres") == "orders"
+    assert ("default", "statefulsets", "orders") in kube.objects
+    assert delete_instance("postgres", "orders")
+    assert ("default", "statefulsets", "orders") not in kube.objects
+
+
+def test_claimed_kafka_advertises_its_claimed_name(kube, mongo, monkeypatch):
+    monkeypatch.setattr(warm_pool, "POOL_SIZES", {"kafka": 1})
+    warm_pool._provision("kafka", 0)
+    warm_pool._promote("kafka")
+    warm_pool.create_instance("kafka", "events", "owner@example.com")
+
+    record = collection.find_one({"db_name": "events"})
+    assert record["resource_name"].startswith("warm-kafka-")
+    assert record["topology"]["hosts"] == ["events.default.svc:9092"]
+    alias = kube.objects[("default", "services", "events")]
+    assert alias["spec"]["clusterIP"] == "None" and alias["spec"]["selector"] == {"app": record["resource_name"]}
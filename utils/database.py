@@ -1,6 +1,121 @@
 # utils/database.py or db/database.py
-from pymongo import MongoClient
+import base64
+import logging
+import os
+from datetime import datetime
+from urllib.parse import quote_plus
 
-mongo_client = MongoClient("mongodb://localhost:27017/")
-db = mongo_client["deployment_logs"]
+import pymongo
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, MongoClient
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+
+def mongo_url():
+    # From the mongo-config ConfigMap and mongo-secret Secret; every replica
+    # must share one database for jobs, leases and rate limits.
+    host = os.getenv('MONGO_HOST', 'localhost')
+    port = os.getenv('MONGO_PORT', '27017')
+    user = os.getenv('MONGO_USER')
+    credentials = f"{quote_plus(user)}:{quote_plus(os.getenv('MONGO_PASSWORD', ''))}@" if user else ""
+    return f"mongodb://{credentials}{host}:{port}/"
+
+
+# connect=False defers connecting until first use, so the client can be
+# created before gunicorn forks its workers.
+mongo_client = MongoClient(mongo_url(), connect=False)
+db = mongo_client[os.getenv('MONGO_DB_NAME', 'deployment_logs')]
 collection = db["postgres_deployments"]
+jobs_collection = db["provisioning_jobs"]
+warm_pool_collection = db["warm_pool"]
+image_digests_collection = db["image_digests"]
+rate_limits_collection = db["rate_limits"]
+
+JOB_RETENTION_SECONDS = int(os.getenv('JOB_RETENTION_SECONDS', str(7 * 24 * 3600)))
+
+LISTING_PROJECTION = {"db_name": 1, "type": 1, "timestamp": 1, "resource_name": 1}
+
+
+def deployment_key(record):
+    return {"db_name": record["db_name"], "type": record["type"]}
+
+
+def ensure_indexes():
+    indexes = [
+        # Listings filter on equality fields and sort on timestamp,_id; one
+        # index per filter shape, so neither sorts in memory.
+        (collection, [("email", ASCENDING), ("deleted", ASCENDING), ("type", ASCENDING),
+                      ("timestamp", ASCENDING), ("_id", ASCENDING)],
+         {"name": "email_deleted_type_timestamp"}),
+        (collection, [("email", ASCENDING), ("deleted", ASCENDING), ("timestamp", ASCENDING), ("_id", ASCENDING)],
+         {"name": "email_deleted_timestamp"}),
+        (collection, [("db_name", ASCENDING), ("type", ASCENDING)],
+         {"name": "db_name_type_unique", "unique": True}),
+        (jobs_collection, [("job_id", ASCENDING)], {"name": "job_id_unique", "unique": True}),
+        (jobs_collection, [("status", ASCENDING), ("created_at", ASCENDING)], {"name": "status_created_at"}),
+        (jobs_collection, [("idempotency_key", ASCENDING)],
+         {"name": "idempotency_key_unique", "unique": True, "sparse": True}),
+        (jobs_collection, [("params.email", ASCENDING), ("status", ASCENDING)], {"name": "email_status"}),
+        # Only finished jobs have finished_at, so queued and running ones stay.
+        (jobs_collection, [("finished_at", ASCENDING)],
+         {"name": "finished_at_ttl", "expireAfterSeconds": JOB_RETENTION_SECONDS}),
+        (warm_pool_collection, [("name", ASCENDING)], {"name": "name_unique", "unique": True}),
+        (image_digests_collection, [("ref", ASCENDING)], {"name": "ref_unique", "unique": True}),
+        # Set to when a bucket will be full again, which is the same as absent.
+        (rate_limits_collection, [("expires_at", ASCENDING)], {"name": "expires_at_ttl", "expireAfterSeconds": 0}),
+        (warm_pool_collection, [("engine", ASCENDING), ("slot", ASCENDING)],
+         {"name": "engine_slot_unique", "unique": True, "partialFilterExpression": {"slot": {"$exists": True}}}),
+        (warm_pool_collection, [("engine", ASCENDING), ("status", ASCENDING), ("ready_at", ASCENDING)],
+         {"name": "engine_status_ready_at"}),
+    ]
+    for target, keys, options in indexes:
+        try:
+            target.create_index(keys, **options)
+        except OperationFailure as e:
+            # Usually duplicate legacy records blocking a unique index; keep serving.
+            logger.error(f"Failed to create index '{options['name']}' on {target.name}: {e}")
+
+
+def ping(timeout=2):
+    with pymongo.timeout(timeout):
+        mongo_client.admin.command("ping")
+
+
+def encode_cursor(doc):
+    raw = f"{doc['timestamp'].isoformat()}|{doc['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(token):
+    try:
+        timestamp, object_id = base64.urlsafe_b64decode(token.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), ObjectId(object_id)
+    except (ValueError, TypeError, InvalidId):
+        return None
+
+
+def find_active_deployments(email, db_type=None, after=None, limit=0):
+    query = {"email": email, "deleted": False}
+    if db_type:
+        query["type"] = db_type
+    if after:
+        timestamp, object_id = after
+        query["$or"] = [
+            {"timestamp": {"$gt": timestamp}},
+            {"timestamp": timestamp, "_id": {"$gt": object_id}},
+        ]
+    return collection.find(query, LISTING_PROJECTION, limit=limit, batch_size=500).sort(
+        [("timestamp", ASCENDING), ("_id", ASCENDING)]
+    )
+
+
+def resource_name(db_name, db_type=None):
+    # Instances claimed from the warm pool keep their pool resource names.
+    query = {"db_name": db_name, "deleted": False, "resource_name": {"$exists": True}}
+    if db_type:
+        query["type"] = {"$in": [db_type, None]}
+    record = collection.find_one(query, {"resource_name": 1})
+    return record["resource_name"] if record else db_name
@@ -0,0 +1,223 @@
+import logging
+import os
+import threading
+import time
+
+from kubernetes import watch
+from kubernetes.client.rest import ApiException
+
+from utils.kube import get_apps_v1_api, get_core_v1_api
+from utils.metrics import count_api_error
+
+logger = logging.getLogger(__name__)
+
+INFORMER_ENABLED = os.getenv('INFORMER_ENABLED', 'true').lower() == 'true'
+RESYNC_SECONDS = int(os.getenv('INFORMER_RESYNC_SECONDS', '600'))
+WATCH_TIMEOUT_SECONDS = 300
+LABEL_SELECTOR = "app"
+# Instances are StatefulSets; Deployments are kept for ones created before that.
+WORKLOAD_KINDS = ("statefulsets", "deployments")
+
+
+class Informer(threading.Thread):
+    """List-watches one kind of labelled object and keeps an indexed cache of it."""
+
+    def __init__(self, kind, get_list_func, namespace):
+        super().__init__(name=f"informer-{kind}-{namespace}", daemon=True)
+        self.kind = kind
+        # Resolved lazily: the watch needs the bound API method (it reads the
+        # return type from its docstring) and the client is built on first use.
+        self.get_list_func = get_list_func
+        self.namespace = namespace
+        self.synced = threading.Event()
+        self.stopped = threading.Event()
+        self.watch = None
+        self._lock = threading.Lock()
+        self._items = {}
+        self._by_engine = {}
+        self._handlers = []
+        self._resync_handlers = []
+
+    def add_handler(self, handler):
+        # Called with (event_type, obj) for every ADDED/MODIFIED/DELETED event.
+        self._handlers.append(handler)
+
+    def add_resync_handler(self, handler):
+        # Called with the full object list after every relist.
+        self._resync_handlers.append(handler)
+
+    def get(self, name):
+        with self._lock:
+            return self._items.get(name)
+
+    def items(self):
+        with self._lock:
+            return list(self._items.values())
+
+    def by_engine(self, engine):
+        with self._lock:
+            return [self._items[name] for name in self._by_engine.get(engine, ())]
+
+    def _store(self, obj):
+        name = obj.metadata.name
+        previous = self._items.get(name)
+        if previous is not None:
+            self._by_engine.get(_engine(previous), set()).discard(name)
+        self._items[name] = obj
+        self._by_engine.setdefault(_engine(obj), set()).add(name)
+
+    def _remove(self, obj):
+        name = obj.metadata.name
+        previous = self._items.pop(name, None)
+        if previous is not None:
+            self._by_engine.get(_engine(previous), set()).discard(name)
+
+    def _relist(self, list_func):
+        result = list_func(self.namespace, label_selector=LABEL_SELECTOR)
+        with self._lock:
+            self._items = {}
+            self._by_engine = {}
+            for obj in result.items:
+                self._store(obj)
+        self.synced.set()
+        for handler in self._resync_handlers:
+            try:
+                handler(result.items)
+            except Exception:
+                logger.exception(f"{self.kind} informer resync handler failed")
+        return result.metadata.resource_version
+
+    def _dispatch(self, event_type, obj):
+        with self._lock:
+            if event_type == "DELETED":
+                self._remove(obj)
+            else:
+                self._store(obj)
+        for handler in self._handlers:
+            try:
+                handler(event_type, obj)
+            except Exception:
+                logger.exception(f"{self.kind} informer handler failed")
+
+    def run(self):
+        resource_version = None
+        listed_at = 0.0
+        while not self.stopped.is_set():
+            try:
+                list_func = self.get_list_func()
+                if resource_version is None or time.monotonic() - listed_at > RESYNC_SECONDS:
+                    resource_version = self._relist(list_func)
+                    listed_at = time.monotonic()
+
+                self.watch = watch.Watch()
+                for event in self.watch.stream(list_func, self.namespace, label_selector=LABEL_SELECTOR,
+                                               resource_version=resource_version,
+                                               timeout_seconds=WATCH_TIMEOUT_SECONDS):
+                    obj = event["object"]
+                    resource_version = obj.metadata.resource_version
+                    self._dispatch(event["type"], obj)
+                    if self.stopped.is_set():
+                        break
+            except ApiException as e:
+                if e.status == 410:
+                    # Resource version expired; relist and start over.
+                    resource_version = None
+                    continue
+                count_api_error(f"watch_{self.kind}", e)
+                logger.error(f"{self.kind} informer on namespace '{self.namespace}' failed: {e}")
+                self.stopped.wait(5)
+            except Exception as e:
+                logger.error(f"{self.kind} informer on namespace '{self.namespace}' failed: {e}")
+                resource_version = None
+                self.stopped.wait(5)
+
+    def stop(self):
+        self.stopped.set()
+        if self.watch is not None:
+            self.watch.stop()
+
+
+def _engine(obj):
+    return (obj.metadata.labels or {}).get("engine")
+
+
+_informers = {}
+_informers_lock = threading.Lock()
+
+
+def get_informer(kind, namespace=None):
+    namespace = namespace or os.getenv('K8S_NAMESPACE', 'default')
+    with _informers_lock:
+        key = (kind, namespace)
+        if key not in _informers:
+            list_funcs = {
+                "deployments": lambda: get_apps_v1_api().list_namespaced_deployment,
+                "statefulsets": lambda: get_apps_v1_api().list_namespaced_stateful_set,
+                "services": lambda: get_core_v1_api().list_namespaced_service,
+                "pods": lambda: get_core_v1_api().list_namespaced_pod,
+            }
+            _informers[key] = Informer(kind, list_funcs[kind], namespace)
+        return _informers[key]
+
+
+def start_informers(namespace=None, kinds=WORKLOAD_KINDS + ("services",)):
+    if not INFORMER_ENABLED:
+        return
+    for kind in kinds:
+        informer = get_informer(kind, namespace)
+        if not informer.is_alive() and not informer.stopped.is_set():
+            informer.start()
+
+
+def stop_informers():
+    with _informers_lock:
+        for informer in _informers.values():
+            informer.stop()
+        _informers.clear()
+
+
+def get_workload(db_name, namespace=None):
+    # Returns (synced, workload) from the informer caches.
+    synced = True
+    for kind in WORKLOAD_KINDS:
+        informer = get_informer(kind, namespace)
+        synced = synced and informer.synced.is_set()
+        workload = informer.get(db_name)
+        if workload is not None:
+            return True, workload
+    return synced, None
+
+
+def available_replicas(workload):
+    status = workload.status
+    if status.available_replicas is not None:
+        return status.available_replicas
+    return status.ready_replicas or 0
+
+
+def live_status(db_name, namespace=None):
+    # Cached view of the instance's workload and Service, or None when the
+    # informers have not synced (or are disabled).
+    synced, workload = get_workload(db_name, namespace)
+    if not synced:
+        return None
+    if workload is None:
+        return {"found": False}
+
+    replicas = workload.spec.replicas if workload.spec.replicas is not None else 1
+    live = {
+        "found": True,
+        "kind": workload.kind or type(workload).__name__[2:],
+        "replicas": replicas,
+        "ready_replicas": workload.status.ready_replicas or 0,
+        "available_replicas": available_replicas(workload),
+        "ready": available_replicas(workload) >= replicas,
+    }
+    services = get_informer("services", namespace)
+    service = services.get(db_name) if services.synced.is_set() else None
+    if service is not None:
+        live["service"] = {
+            "cluster_ip": service.spec.cluster_ip,
+            "ports": [port.port for port in service.spec.ports or []],
+        }
+    return live
@@ -0,0 +1,249 @@
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from utils.database import jobs_collection
+
+logger = logging.getLogger(__name__)
+
+# Provisioning jobs are queued in Mongo and claimed by whichever process has
+# a free worker, so create routes answer immediately, throughput grows with
+# the number of replicas, and queued work survives a restart.
+MAX_WORKERS = int(os.getenv('JOB_WORKERS', '8'))
+MAX_PENDING = int(os.getenv('JOB_QUEUE_LIMIT', '256'))
+POLL_SECONDS = float(os.getenv('JOB_POLL_SECONDS', '1'))
+# Running jobs are heartbeated; one whose process stopped doing so for
+# LEASE_SECONDS is failed, since it may have left partial state behind.
+HEARTBEAT_SECONDS = 10
+LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', '60'))
+# Credentials in a succeeded job's result are handed to the first reader
+# and then removed; finished jobs expire after JOB_RETENTION_SECONDS.
+SECRET_FIELDS = ("password",)
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='provision')
+_capacity = threading.Semaphore(MAX_WORKERS)
+_wake = threading.Event()
+_draining = threading.Event()
+_stopped = threading.Event()
+_handlers = {}
+_dispatcher = None
+_owner = None
+# job_id -> [Event set when the job finishes in this process, waiters], kept
+# only while someone in this process waits for the job.
+_finished = {}
+_finished_lock = threading.Lock()
+
+
+def register_handler(job_type, func):
+    # Handlers take the job params as keyword arguments and return
+    # (success, result) where result is a JSON-serialisable dict.
+    _handlers[job_type] = func
+
+
+def submit_job(job_type, params, idempotency_key=None):
+    # A job submitted again under the key of one that is queued, running or
+    # succeeded returns that job's id; failed jobs release their key.
+    if job_type not in _handlers:
+        raise ValueError(f"Unknown job type '{job_type}'")
+    existing = find_job_id(idempotency_key)
+    if existing:
+        return existing
+    if _draining.is_set() or jobs_collection.count_documents({"status": "queued"}, limit=MAX_PENDING) >= MAX_PENDING:
+        return None
+
+    job_id = uuid.uuid4().hex
+    job = {
+        "job_id": job_id,
+        "type": job_type,
+        "params": params,
+        "status": "queued",
+        "created_at": datetime.now()
+    }
+    if idempotency_key:
+        job["idempotency_key"] = idempotency_key
+    try:
+        jobs_collection.insert_one(job)
+    except DuplicateKeyError:
+        # Lost a race with a concurrent submit under the same key.
+        existing = find_job_id(idempotency_key)
+        if existing is None:
+            raise
+        return existing
+    _wake.set()
+    return job_id
+
+
+def find_job_id(idempotency_key):
+    if not idempotency_key:
+        return None
+    job = jobs_collection.find_one({"idempotency_key": idempotency_key}, {"job_id": 1})
+    return job["job_id"] if job else None
+
+
+def wait_for_job(job_id, timeout):
+    # Jobs may run in another process, so Mongo is re-read between waits.
+    with _finished_lock:
+        waiting = _finished.setdefault(job_id, [threading.Event(), 0])
+        waiting[1] += 1
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            job = get_job(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job["status"] in ("succeeded", "failed") or remaining <= 0:
+                return job
+            waiting[0].wait(min(remaining, POLL_SECONDS))
+    finally:
+        with _finished_lock:
+            waiting[1] -= 1
+            if not waiting[1]:
+                _finished.pop(job_id, None)
+
+
+def get_job(job_id):
+    # Atomic, so however many processes poll a job only one sees its secrets.
+    projection = {"_id": 0, "params": 0}
+    job = jobs_collection.find_one_and_update(
+        {"job_id": job_id, "status": "succeeded",
+         "$or": [{f"result.{field}": {"$exists": True}} for field in SECRET_FIELDS]},
+        {"$unset": {f"result.{field}": "" for field in SECRET_FIELDS},
+         "$set": {"secrets_returned_at": datetime.now()}},
+        projection=projection,
+        return_document=ReturnDocument.BEFORE
+    )
+    return job or jobs_collection.find_one({"job_id": job_id}, projection)
+
+
+def fail_interrupted_jobs():
+    # Jobs whose process stopped heartbeating may have left partial state
+    # behind, so they are failed rather than replayed. Safe to run anywhere,
+    # any number of times.
+    cutoff = datetime.now() - timedelta(seconds=LEASE_SECONDS)
+    interrupted = jobs_collection.update_many(
+        {"status": "running", "$or": [{"heartbeat_at": {"$lt": cutoff}}, {"heartbeat_at": {"$exists": False}}]},
+        {"$set": {"status": "failed", "error": "Interrupted: its worker stopped", "finished_at": datetime.now()},
+         "$unset": {"idempotency_key": ""}}
+    )
+    if interrupted.modified_count:
+        logger.warning(f"Marked {interrupted.modified_count} interrupted jobs as failed")
+
+
+def is_draining():
+    return _draining.is_set()
+
+
+def _claim():
+    now = datetime.now()
+    return jobs_collection.find_one_and_update(
+        {"status": "queued", "type": {"$in": list(_handlers)}},
+        {"$set": {"status": "running", "started_at": now, "heartbeat_at": now, "owner": _owner}},
+        sort=[("created_at", ASCENDING)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def _heartbeat():
+    jobs_collection.update_many({"status": "running", "owner": _owner}, {"$set": {"heartbeat_at": datetime.now()}})
+
+
+def _requeue(job):
+    jobs_collection.update_one({"job_id": job["job_id"], "owner": _owner, "status": "running"},
+                               {"$set": {"status": "queued"}, "$unset": {"owner": "", "started_at": "",
+                                                                          "heartbeat_at": ""}})
+
+
+def _dispatch():
+    # Claims queued jobs, oldest first, whenever a local worker is free, and
+    # keeps heartbeating this process's running jobs until drained.
+    heartbeat_at = 0.0
+    while not _stopped.is_set():
+        try:
+            if time.monotonic() - heartbeat_at > HEARTBEAT_SECONDS:
+                _heartbeat()
+                fail_interrupted_jobs()
+                heartbeat_at = time.monotonic()
+        except Exception:
+            logger.exception("Heartbeating provisioning jobs failed")
+        if _draining.is_set() or not _capacity.acquire(timeout=POLL_SECONDS):
+            _stopped.wait(POLL_SECONDS if _draining.is_set() else 0)
+            continue
+        try:
+            job = _claim()
+        except Exception:
+            logger.exception("Claiming provisioning jobs failed")
+            job = None
+        if job is None:
+            _capacity.release()
+            _wake.wait(POLL_SECONDS)
+            _wake.clear()
+            continue
+        try:
+            _executor.submit(_run_job, job)
+        except RuntimeError:
+            # Drain shut the pool down between the claim and here.
+            _capacity.release()
+            _requeue(job)
+
+
+def start_workers():
+    # Per process, after any fork.
+    global _dispatcher, _owner
+    if _dispatcher is not None and _dispatcher.is_alive():
+        return
+    _owner = f"{os.getenv('POD_NAME') or socket.gethostname()}_{os.getpid()}"
+    _dispatcher = threading.Thread(target=_dispatch, name="job-dispatcher", daemon=True)
+    _dispatcher.start()
+
+
+def stop_claiming():
+    # Queued jobs stay in Mongo for another process to pick up; running ones
+    # carry on until drained.
+    _draining.set()
+    _wake.set()
+
+
+def drain(timeout):
+    # Stops claiming jobs and waits up to timeout for running ones.
+    stop_claiming()
+    waiter = threading.Thread(target=_executor.shutdown, kwargs={"wait": True}, daemon=True)
+    waiter.start()
+    waiter.join(timeout)
+    _stopped.set()
+    if waiter.is_alive():
+        logger.warning(f"Provisioning jobs still running after {timeout}s drain")
+        return False
+    logger.info("Provisioning jobs drained")
+    return True
+
+
+def _run_job(job):
+    job_id = job["job_id"]
+    try:
+        try:
+            success, result = _handlers[job["type"]](**job["params"])
+            update = {"status": "succeeded" if success else "failed", "result": result}
+        except Exception as e:
+            logger.exception(f"Job '{job_id}' ({job['type']}) raised")
+            update = {"status": "failed", "error": str(e)}
+
+        update["finished_at"] = datetime.now()
+        # A failed job rolled back what it created, so its key may be reused.
+        release = {"$unset": {"idempotency_key": ""}} if update["status"] == "failed" else {}
+        # Unless it was failed meanwhile as interrupted.
+        jobs_collection.update_one({"job_id": job_id, "owner": _owner, "status": "running"},
+                                   dict({"$set": update}, **release))
+        logger.info(f"Job '{job_id}' ({job['type']}) finished with status {update['status']}")
+    finally:
+        _capacity.release()
+        with _finished_lock:
+            waiting = _finished.get(job_id)
+        if waiting is not None:
+            waiting[0].set()
@@ -0,0 +1,159 @@
+import logging
+import os
+import random
+import socket
+import threading
+import time
+
+from kubernetes import client, config
+from kubernetes.client.rest import ApiException
+from kubernetes.config.config_exception import ConfigException
+from kubernetes.stream import stream
+from urllib3.connection import HTTPConnection
+from urllib3.exceptions import HTTPError
+
+from utils.metrics import count_api_retry
+
+logger = logging.getLogger(__name__)
+
+# Process-wide Kubernetes client shared by every deployer and route, so the
+# kubeconfig is parsed once and TLS connections are reused across requests.
+_lock = threading.Lock()
+_api_client = None
+_loaded_at = 0.0
+
+# Throttling and server errors are retried with full-jitter exponential
+# backoff, or after the Retry-After the API server asked for.
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = int(os.getenv('K8S_MAX_RETRIES', '4'))
+RETRY_BASE_SECONDS = float(os.getenv('K8S_RETRY_BASE_SECONDS', '0.2'))
+RETRY_MAX_SECONDS = float(os.getenv('K8S_RETRY_MAX_SECONDS', '10'))
+
+
+def _load_config(configuration):
+    mode = os.getenv('K8S_CONFIG_MODE', 'auto')
+    if mode in ('auto', 'incluster'):
+        try:
+            config.load_incluster_config(client_configuration=configuration)
+            return 'incluster'
+        except ConfigException:
+            if mode == 'incluster':
+                raise
+    config.load_kube_config(
+        config_file=os.getenv('KUBECONFIG') or None,
+        context=os.getenv('K8S_CONTEXT') or None,
+        client_configuration=configuration
+    )
+    return 'kubeconfig'
+
+
+def _keepalive_socket_options():
+    options = list(HTTPConnection.default_socket_options)
+    options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+    if hasattr(socket, 'TCP_KEEPIDLE'):
+        idle = int(os.getenv('K8S_KEEPALIVE_IDLE', '60'))
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, idle))
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, max(idle // 4, 1)))
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 4))
+    return options
+
+
+def _build_api_client():
+    configuration = client.Configuration()
+    source = _load_config(configuration)
+    configuration.connection_pool_maxsize = int(os.getenv('K8S_POOL_MAXSIZE', '32'))
+    api_client = client.ApiClient(configuration)
+    if os.getenv('K8S_TCP_KEEPALIVE', 'true').lower() == 'true':
+        # New connection pools pick up these options; existing ones keep theirs.
+        api_client.rest_client.pool_manager.connection_pool_kw['socket_options'] = _keepalive_socket_options()
+    logger.info(f"Kubernetes client initialised from {source} config "
+                f"(pool maxsize {configuration.connection_pool_maxsize})")
+    return api_client
+
+
+def get_api_client():
+    global _api_client, _loaded_at
+    refresh_seconds = int(os.getenv('K8S_CONFIG_REFRESH_SECONDS', '300'))
+    with _lock:
+        if _api_client is None:
+            _api_client = _build_api_client()
+            _loaded_at = time.monotonic()
+        elif refresh_seconds and time.monotonic() - _loaded_at > refresh_seconds:
+            # Reload credentials into the live configuration so rotated tokens
+            # are picked up without tearing down the connection pool.
+            try:
+                _load_config(_api_client.configuration)
+            except (ConfigException, OSError) as e:
+                logger.error(f"Failed to refresh Kubernetes credentials: {e}")
+            _loaded_at = time.monotonic()
+        return _api_client
+
+
+def get_apps_v1_api():
+    return client.AppsV1Api(get_api_client())
+
+
+def get_core_v1_api():
+    return client.CoreV1Api(get_api_client())
+
+
+def get_coordination_v1_api():
+    return client.CoordinationV1Api(get_api_client())
+
+
+def reset_api_client():
+    global _api_client
+    with _lock:
+        if _api_client is not None:
+            _api_client.close()
+        _api_client = None
+
+
+def exec_in_pod(namespace, pod_name, container, command, timeout=60):
+    # stream() swaps the request method on the ApiClient it is given, so run
+    # it on a throwaway client that shares the live configuration.
+    api_client = client.ApiClient(get_api_client().configuration)
+    try:
+        response = stream(client.CoreV1Api(api_client).connect_get_namespaced_pod_exec,
+                          pod_name, namespace, container=container, command=command,
+                          stdout=True, stderr=True, stdin=False, tty=False, _preload_content=False)
+        response.run_forever(timeout=timeout)
+        output = response.read_stdout() + response.read_stderr()
+        returncode = response.returncode
+        response.close()
+        return returncode, output
+    finally:
+        api_client.close()
+
+
+def _retry_after(error):
+    value = (error.headers or {}).get('Retry-After')
+    try:
+        return min(max(float(value), 0), RETRY_MAX_SECONDS) if value else None
+    except ValueError:
+        # The HTTP-date form; the API server only sends seconds.
+        return None
+
+
+def call_with_retries(func, *args, **kwargs):
+    # Retries transient failures of one API call. Creates may be replayed
+    # after a lost response, so callers must treat 409 on a retry as theirs.
+    attempt = 0
+    while True:
+        try:
+            return func(*args, **kwargs)
+        except ApiException as e:
+            if e.status not in RETRYABLE_STATUSES or attempt >= MAX_RETRIES:
+                raise
+            reason, delay = e.status, _retry_after(e)
+        except HTTPError as e:
+            if attempt >= MAX_RETRIES:
+                raise
+            reason, delay = type(e).__name__, None
+        if delay is None:
+            delay = random.uniform(0, min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** attempt))
+        attempt += 1
+        count_api_retry(reason)
+        logger.warning(f"Retrying {getattr(func, '__name__', func)} in {delay:.2f}s after {reason} "
+                       f"(attempt {attempt}/{MAX_RETRIES})")
+        time.sleep(delay)
@@ -0,0 +1,175 @@
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timezone
+
+from kubernetes.client.rest import ApiException
+
+from utils.kube import get_coordination_v1_api
+
+logger = logging.getLogger(__name__)
+
+# Singleton background loops (readiness bookkeeping, the warm pool, garbage
+# collection) run only in the process holding this Lease; every replica and
+# gunicorn worker is a candidate. With election off, every process leads.
+ENABLED = os.getenv('LEADER_ELECTION', 'true').lower() == 'true'
+LEASE_NAME = os.getenv('LEADER_LEASE_NAME', 'clickclouddb-controller')
+LEASE_SECONDS = int(os.getenv('LEADER_LEASE_SECONDS', '15'))
+RETRY_SECONDS = max(LEASE_SECONDS / 3, 1)
+# A leader that cannot renew for this long stops its loops before the lease
+# runs out and someone else may take over.
+RENEW_DEADLINE = LEASE_SECONDS * 2 / 3
+
+_callbacks = []
+_leading = threading.Event()
+_elector = None
+
+
+def _timestamp(value=None):
+    # Lease times are MicroTime, which needs exactly six fractional digits.
+    return (value or datetime.now(timezone.utc)).astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+class LeaderElector(threading.Thread):
+    """Acquires and renews a coordination.k8s.io Lease for this process."""
+
+    def __init__(self, namespace):
+        super().__init__(name="leader-elector", daemon=True)
+        self.namespace = namespace
+        self.identity = f"{os.getenv('POD_NAME') or socket.gethostname()}_{os.getpid()}"
+        self.stopped = threading.Event()
+        # Expiry is judged by when this process last saw the record change,
+        # not by the holder's clock.
+        self._observed = None
+        self._observed_at = 0.0
+        self._renewed_at = 0.0
+
+    def _spec(self, acquired, transitions):
+        return {
+            "holderIdentity": self.identity,
+            "leaseDurationSeconds": LEASE_SECONDS,
+            "acquireTime": acquired,
+            "renewTime": _timestamp(),
+            "leaseTransitions": transitions,
+        }
+
+    def _try_acquire(self):
+        api = get_coordination_v1_api()
+        try:
+            lease = api.read_namespaced_lease(LEASE_NAME, self.namespace)
+        except ApiException as e:
+            if e.status != 404:
+                raise
+            api.create_namespaced_lease(self.namespace, {"metadata": {"name": LEASE_NAME},
+                                                         "spec": self._spec(_timestamp(), 0)})
+            return True
+
+        spec = lease.spec
+        record = (spec.holder_identity, spec.renew_time)
+        if record != self._observed:
+            self._observed, self._observed_at = record, time.monotonic()
+        held = spec.holder_identity == self.identity
+        expired = time.monotonic() - self._observed_at > (spec.lease_duration_seconds or LEASE_SECONDS)
+        if spec.holder_identity and not held and not expired:
+            return False
+
+        acquired = _timestamp(spec.acquire_time) if held and spec.acquire_time else _timestamp()
+        transitions = (spec.lease_transitions or 0) + (0 if held else 1)
+        # resourceVersion makes this a compare-and-swap: a concurrent
+        # candidate's write turns ours into a 409.
+        api.replace_namespaced_lease(LEASE_NAME, self.namespace, {
+            "metadata": {"name": LEASE_NAME, "resourceVersion": lease.metadata.resource_version},
+            "spec": self._spec(acquired, transitions),
+        })
+        return True
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                acquired = self._try_acquire()
+            except ApiException as e:
+                if e.status != 409:
+                    logger.error(f"Leader election on lease '{LEASE_NAME}' failed: {e}")
+                acquired = False
+            except Exception as e:
+                logger.error(f"Leader election on lease '{LEASE_NAME}' failed: {e}")
+                acquired = False
+
+            if acquired:
+                self._renewed_at = time.monotonic()
+                if not _leading.is_set():
+                    logger.info(f"{self.identity} acquired lease '{LEASE_NAME}'")
+                    _start_leading()
+            elif _leading.is_set() and time.monotonic() - self._renewed_at > RENEW_DEADLINE:
+                logger.warning(f"{self.identity} lost lease '{LEASE_NAME}'")
+                _stop_leading()
+            self.stopped.wait(RETRY_SECONDS)
+
+    def release(self):
+        # Hands the lease over at once instead of after it expires.
+        api = get_coordination_v1_api()
+        lease = api.read_namespaced_lease(LEASE_NAME, self.namespace)
+        if lease.spec.holder_identity != self.identity:
+            return
+        api.replace_namespaced_lease(LEASE_NAME, self.namespace, {
+            "metadata": {"name": LEASE_NAME, "resourceVersion": lease.metadata.resource_version},
+            "spec": {"leaseDurationSeconds": 1, "leaseTransitions": lease.spec.lease_transitions or 0},
+        })
+
+    def stop(self):
+        self.stopped.set()
+        if _leading.is_set():
+            _stop_leading()
+            try:
+                self.release()
+            except Exception as e:
+                logger.error(f"Failed to release lease '{LEASE_NAME}': {e}")
+
+
+def _start_leading():
+    _leading.set()
+    for on_started, _ in _callbacks:
+        try:
+            on_started()
+        except Exception:
+            logger.exception("Leader start callback failed")
+
+
+def _stop_leading():
+    _leading.clear()
+    for _, on_stopped in _callbacks:
+        try:
+            on_stopped()
+        except Exception:
+            logger.exception("Leader stop callback failed")
+
+
+def on_leading(on_started, on_stopped=None):
+    # Register before start_election; called as this process gains and
+    # loses leadership.
+    _callbacks.append((on_started, on_stopped or (lambda: None)))
+
+
+def is_leader():
+    return _leading.is_set()
+
+
+def start_election(namespace=None):
+    global _elector
+    if not ENABLED:
+        if not _leading.is_set():
+            _start_leading()
+        return
+    if _elector is not None and _elector.is_alive():
+        return
+    _elector = LeaderElector(namespace or os.getenv('K8S_NAMESPACE', 'default'))
+    _elector.start()
+
+
+def stop_election():
+    if _elector is not None:
+        _elector.stop()
+    elif _leading.is_set():
+        _stop_leading()
@@ -0,0 +1,73 @@
+import os
+import time
+from contextlib import contextmanager
+
+from kubernetes.client import ApiException
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+
+# Provisioning stages run from milliseconds (Mongo writes) to minutes (readiness).
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+READY_BUCKETS = (1, 2.5, 5, 10, 20, 30, 45, 60, 90, 120, 180, 300, 600)
+
+REQUESTS = Counter(
+    "clickclouddb_http_requests_total", "HTTP requests handled", ["method", "route", "status"])
+REQUEST_LATENCY = Histogram(
+    "clickclouddb_http_request_duration_seconds", "Time to produce an HTTP response", ["method", "route"])
+STAGE_LATENCY = Histogram(
+    "clickclouddb_provision_stage_duration_seconds", "Time spent in each provisioning stage",
+    ["engine", "stage"], buckets=STAGE_BUCKETS)
+KUBE_API_ERRORS = Counter(
+    "clickclouddb_kubernetes_api_errors_total", "Kubernetes API calls that failed", ["operation", "status"])
+KUBE_API_RETRIES = Counter(
+    "clickclouddb_kubernetes_api_retries_total", "Kubernetes API calls retried after a transient failure",
+    ["status"])
+TIME_TO_READY = Histogram(
+    "clickclouddb_instance_time_to_ready_seconds", "Time from creation until an instance is ready",
+    ["engine", "source"], buckets=READY_BUCKETS)
+IMAGE_PULL = Histogram(
+    "clickclouddb_instance_image_pull_seconds", "Part of an instance's time to ready spent pulling images",
+    ["engine"], buckets=(0,) + READY_BUCKETS)
+
+
+@contextmanager
+def stage(engine, name):
+    # Times one provisioning step; Kubernetes failures are counted by step.
+    started = time.perf_counter()
+    try:
+        yield
+    except ApiException as e:
+        count_api_error(name, e)
+        raise
+    finally:
+        STAGE_LATENCY.labels(engine=engine, stage=name).observe(time.perf_counter() - started)
+
+
+def count_api_error(operation, error):
+    KUBE_API_ERRORS.labels(operation=operation, status=str(error.status)).inc()
+
+
+def count_api_retry(status):
+    KUBE_API_RETRIES.labels(status=str(status)).inc()
+
+
+def observe_request(method, route, status, seconds):
+    REQUESTS.labels(method=method, route=route, status=str(status)).inc()
+    REQUEST_LATENCY.labels(method=method, route=route).observe(seconds)
+
+
+def observe_ready(engine, seconds, source="cold"):
+    TIME_TO_READY.labels(engine=engine or "unknown", source=source).observe(seconds)
+
+
+def observe_image_pull(engine, seconds):
+    IMAGE_PULL.labels(engine=engine or "unknown").observe(seconds)
+
+
+def render():
+    # Under gunicorn, PROMETHEUS_MULTIPROC_DIR makes every worker write its
+    # samples there so any worker can report the whole process group.
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,26 @@
+import re
+
+from utils.kube import call_with_retries, get_core_v1_api
+
+# Kubelet reports pulls as 'Successfully pulled image "x" in 3.2s (3.2s
+# including waiting)'; older kubelets omit the parenthesis and a cached
+# image is 'Container image "x" already present on machine'.
+_PULLED = re.compile(r'Successfully pulled image "[^"]*" in ([0-9hmsuµn.]+)')
+_DURATION = re.compile(r'([0-9.]+)(h|ms|us|µs|ns|m|s)')
+_UNITS = {"h": 3600, "m": 60, "s": 1, "ms": 1e-3, "us": 1e-6, "µs": 1e-6, "ns": 1e-9}
+
+
+def _seconds(duration):
+    # Parses a Go duration such as "1m2.5s".
+    return sum(float(amount) * _UNITS[unit] for amount, unit in _DURATION.findall(duration))
+
+
+def image_pull_seconds(namespace, pod_name):
+    # Total time the kubelet spent pulling the pod's images, 0 when all were
+    # cached, or None when its events have expired.
+    events = call_with_retries(get_core_v1_api().list_namespaced_event, namespace,
+                               field_selector=f"involvedObject.kind=Pod,involvedObject.name={pod_name}").items
+    pulls = [event.message for event in events if event.reason == "Pulled" and event.message]
+    if not pulls:
+        return None
+    return round(sum(_seconds(match.group(1)) for match in map(_PULLED.search, pulls) if match), 3)
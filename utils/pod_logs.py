@@ -0,0 +1,155 @@
+import json
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from kubernetes.client.rest import ApiException
+
+from utils.kube import get_core_v1_api
+
+logger = logging.getLogger(__name__)
+
+MAX_PODS = int(os.getenv('LOG_MAX_PODS', '20'))
+CHUNK_SIZE = 16 * 1024
+MAX_LINE_BYTES = 64 * 1024
+# Lines buffered per connection between the pod readers and the client.
+QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '256'))
+HEARTBEAT_SECONDS = 15
+
+_DONE = object()
+
+
+def list_pod_names(namespace, deployment_name):
+    pods = get_core_v1_api().list_namespaced_pod(namespace, label_selector=f"app={deployment_name}")
+    return [pod.metadata.name for pod in pods.items][:MAX_PODS]
+
+
+def _log_kwargs(options):
+    return {key: value for key, value in options.items() if value is not None}
+
+
+def fetch_logs(namespace, pod_names, options):
+    # Non-streaming mode: fetch every pod concurrently, bounded by the
+    # tail_lines/since_seconds/limit_bytes options.
+    core_v1_api = get_core_v1_api()
+
+    def read(pod_name):
+        return pod_name, core_v1_api.read_namespaced_pod_log(
+            name=pod_name, namespace=namespace, **_log_kwargs(options))
+
+    if not pod_names:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(len(pod_names), MAX_PODS)) as executor:
+        return dict(executor.map(read, pod_names))
+
+
+def _split_lines(response):
+    pending = b""
+    for chunk in response.stream(CHUNK_SIZE, decode_content=True):
+        pending += chunk
+        while True:
+            newline = pending.find(b"\n")
+            if newline == -1:
+                break
+            yield pending[:newline]
+            pending = pending[newline + 1:]
+        while len(pending) > MAX_LINE_BYTES:
+            yield pending[:MAX_LINE_BYTES]
+            pending = pending[MAX_LINE_BYTES:]
+    if pending:
+        yield pending
+
+
+class LogStream:
+    """Fans in pod log streams over a bounded queue, one reader thread per pod."""
+
+    def __init__(self, namespace, pod_names, options, follow):
+        self.namespace = namespace
+        self.pod_names = pod_names
+        self.options = options
+        self.follow = follow
+        self.lines = queue.Queue(maxsize=QUEUE_SIZE)
+        self.stopped = threading.Event()
+        self.responses = []
+        self.responses_lock = threading.Lock()
+
+    def _put(self, item):
+        # Block while the client is slower than the pods, but give up once
+        # the connection has gone away.
+        while not self.stopped.is_set():
+            try:
+                self.lines.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _read_pod(self, pod_name):
+        try:
+            response = get_core_v1_api().read_namespaced_pod_log(
+                name=pod_name, namespace=self.namespace, follow=self.follow,
+                _preload_content=False, **_log_kwargs(self.options))
+            with self.responses_lock:
+                self.responses.append(response)
+            try:
+                for line in _split_lines(response):
+                    if not self._put((pod_name, line.decode("utf-8", errors="replace"), None)):
+                        break
+            finally:
+                response.release_conn()
+        except ApiException as e:
+            self._put((pod_name, None, e.reason or str(e)))
+        except Exception as e:
+            if not self.stopped.is_set():
+                logger.error(f"Log stream for pod '{pod_name}' failed: {e}")
+                self._put((pod_name, None, str(e)))
+        finally:
+            self._put(_DONE)
+
+    def events(self):
+        threads = [threading.Thread(target=self._read_pod, args=(pod_name,), daemon=True)
+                   for pod_name in self.pod_names]
+        for thread in threads:
+            thread.start()
+
+        remaining = len(threads)
+        try:
+            while remaining:
+                try:
+                    item = self.lines.get(timeout=HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield None
+                    continue
+                if item is _DONE:
+                    remaining -= 1
+                    continue
+                yield item
+        finally:
+            self.stopped.set()
+            with self.responses_lock:
+                for response in self.responses:
+                    response.close()
+
+
+def format_ndjson(events):
+    for event in events:
+        if event is None:
+            yield "\n"
+            continue
+        pod_name, line, error = event
+        payload = {"pod": pod_name, "error": error} if error else {"pod": pod_name, "line": line}
+        yield json.dumps(payload) + "\n"
+
+
+def format_sse(events):
+    for event in events:
+        if event is None:
+            yield ": keepalive\n\n"
+            continue
+        pod_name, line, error = event
+        if error:
+            yield f"event: error\ndata: {json.dumps({'pod': pod_name, 'error': error})}\n\n"
+        else:
+            yield f"data: {json.dumps({'pod': pod_name, 'line': line})}\n\n"
@@ -0,0 +1,52 @@
+import logging
+import os
+import time
+from datetime import datetime
+
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from utils.database import rate_limits_collection
+
+logger = logging.getLogger(__name__)
+
+# Token bucket per key (the owner's email on the create routes): BURST
+# requests at once, refilled at RATE_PER_MINUTE. Buckets are Mongo documents
+# updated by compare-and-set, so the limit holds across every worker of
+# every replica; full buckets expire through a TTL index.
+RATE_PER_MINUTE = float(os.getenv('RATE_LIMIT_PER_MINUTE', '10'))
+BURST = float(os.getenv('RATE_LIMIT_BURST', '5'))
+MAX_ATTEMPTS = 5
+
+
+def acquire(key, cost=1):
+    # Returns 0 when the request may proceed, else the seconds until it would.
+    if RATE_PER_MINUTE <= 0:
+        return 0
+    refill = RATE_PER_MINUTE / 60
+    try:
+        for _ in range(MAX_ATTEMPTS):
+            now = time.time()
+            bucket = rate_limits_collection.find_one({"_id": key})
+            tokens = BURST
+            if bucket is not None:
+                tokens = min(BURST, bucket["tokens"] + max(now - bucket["updated"], 0) * refill)
+            if tokens < cost:
+                return (cost - tokens) / refill
+            update = {"tokens": tokens - cost, "updated": now,
+                      "expires_at": datetime.fromtimestamp(now + (BURST - tokens + cost) / refill)}
+            if bucket is None:
+                try:
+                    rate_limits_collection.insert_one(dict(update, _id=key))
+                    return 0
+                except DuplicateKeyError:
+                    continue
+            # Only if no other process took a token since it was read.
+            if rate_limits_collection.update_one({"_id": key, "updated": bucket["updated"]},
+                                                 {"$set": update}).modified_count:
+                return 0
+    except PyMongoError as e:
+        # Fails open: the create itself then meets the same Mongo trouble.
+        logger.error(f"Rate limit check for '{key}' failed: {e}")
+        return 0
+    # Lost every race: this key is being hammered.
+    return cost / refill
@@ -0,0 +1,217 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from utils.database import collection
+from utils.informer import (
+    INFORMER_ENABLED, WORKLOAD_KINDS, available_replicas, get_informer, get_workload, start_informers
+)
+from utils.leader import is_leader
+from utils.metrics import observe_image_pull, observe_ready
+from utils.pod_events import image_pull_seconds
+
+logger = logging.getLogger(__name__)
+
+# Tracking rides on the shared workload informers, so it needs them enabled.
+TRACKING_ENABLED = os.getenv('READINESS_TRACKING', 'true').lower() == 'true' and INFORMER_ENABLED
+MAX_WAIT_SECONDS = int(os.getenv('READINESS_MAX_WAIT', '300'))
+# Waiters re-read Mongo at this interval in case another process settled the record.
+RECHECK_SECONDS = 5
+# StatefulSets report no failure conditions, so an instance fails when one of
+# its pods cannot pull an image, or has crash looped this many times (peers
+# may crash a few times until they can reach each other).
+IMAGE_FAILURES = {"ErrImagePull", "ImagePullBackOff", "InvalidImageName"}
+FAILURE_RESTARTS = int(os.getenv('READINESS_FAILURE_RESTARTS', '3'))
+
+RECORD_PROJECTION = {"_id": 0, "password": 0}
+
+_registered = set()
+_registered_lock = threading.Lock()
+_settled = threading.Condition()
+# db_name -> last settled update seen by this process, used to skip redundant writes.
+_states = {}
+
+
+def initial_status():
+    return "pending" if TRACKING_ENABLED else "created"
+
+
+def pod_failure(pod):
+    # Why the pod will not become ready by itself, or None.
+    status = pod.status
+    if status is None:
+        return None
+    for container in (status.init_container_statuses or []) + (status.container_statuses or []):
+        waiting = container.state.waiting if container.state else None
+        if waiting is None:
+            continue
+        if waiting.reason in IMAGE_FAILURES or (waiting.reason == "CrashLoopBackOff"
+                                                and (container.restart_count or 0) >= FAILURE_RESTARTS):
+            return f"{pod.metadata.name}/{container.name}: {waiting.reason}" + (
+                f": {waiting.message}" if waiting.message else "")
+    return None
+
+
+def workload_state(workload, pods=()):
+    # Works for Deployments and StatefulSets; Deployments report failure in
+    # their Progressing/ReplicaFailure conditions, both through their pods.
+    spec_replicas = workload.spec.replicas if workload.spec.replicas is not None else 1
+    status = workload.status
+    for condition in status.conditions or []:
+        if condition.type == "Progressing" and condition.status == "False":
+            return "failed", condition.message or condition.reason
+        if condition.type == "ReplicaFailure" and condition.status == "True":
+            return "failed", condition.message or condition.reason
+    observed = (status.observed_generation or 0) >= (workload.metadata.generation or 0)
+    if observed and available_replicas(workload) >= spec_replicas:
+        return "ready", None
+    for pod in pods:
+        reason = pod_failure(pod)
+        if reason:
+            return "failed", reason
+    return "pending", None
+
+
+def workload_pods(workload):
+    # The workload's pods from the pod informer's cache.
+    name = workload.metadata.name
+    engine = (workload.metadata.labels or {}).get("engine")
+    return [pod for pod in get_informer("pods", workload.metadata.namespace).by_engine(engine)
+            if (pod.metadata.labels or {}).get("app") == name]
+
+
+def _record_state(workload, force=False):
+    name = workload.metadata.name
+    state, reason = workload_state(workload, workload_pods(workload))
+    if state == "pending" or (_states.get(name, {}).get("status") == state and not force):
+        return
+
+    now = datetime.now()
+    update = {"status": state}
+    if state == "ready":
+        created = workload.metadata.creation_timestamp
+        update["ready_at"] = now
+        if created is not None:
+            update["time_to_ready_seconds"] = round((datetime.now(timezone.utc) - created).total_seconds(), 3)
+    else:
+        update["failed_at"] = now
+        update["failure_reason"] = reason
+
+    # Every process keeps the state for its own waiters; only the leader
+    # writes it back for everyone else.
+    if is_leader() and _apply(name, update):
+        if "time_to_ready_seconds" in update:
+            observe_ready((workload.metadata.labels or {}).get("engine"), update["time_to_ready_seconds"])
+        if state == "ready":
+            _record_image_pull(workload, update.get("time_to_ready_seconds"))
+        logger.info(f"Instance '{name}' is {state}"
+                    + (f" after {update['time_to_ready_seconds']}s" if "time_to_ready_seconds" in update else ""))
+    with _settled:
+        _states[name] = update
+        _settled.notify_all()
+
+
+def _record_image_pull(workload, time_to_ready):
+    # Splits time to ready into pulling images and starting the engine.
+    name = workload.metadata.name
+    try:
+        seconds = image_pull_seconds(workload.metadata.namespace, f"{name}-0")
+    except Exception as e:
+        logger.warning(f"Failed to read image pull time of '{name}': {e}")
+        return
+    if seconds is None:
+        return
+    update = {"image_pull_seconds": seconds}
+    if time_to_ready is not None:
+        update["engine_start_seconds"] = round(max(time_to_ready - seconds, 0), 3)
+    collection.update_many({"db_name": name, "deleted": False}, {"$set": update})
+    observe_image_pull((workload.metadata.labels or {}).get("engine"), seconds)
+
+
+def _apply(name, update):
+    result = collection.update_many({"db_name": name, "deleted": False, "status": "pending"}, {"$set": update})
+    return result.modified_count
+
+
+def _on_workload_event(event_type, workload):
+    if event_type == "DELETED":
+        with _settled:
+            _states.pop(workload.metadata.name, None)
+    else:
+        _record_state(workload)
+
+
+def _on_pod_event(event_type, pod):
+    # Pods failing to start change nothing on their workload, so failures
+    # are picked up from pod events.
+    if event_type == "DELETED" or pod_failure(pod) is None:
+        return
+    _, workload = get_workload((pod.metadata.labels or {}).get("app"), pod.metadata.namespace)
+    if workload is not None:
+        _record_state(workload)
+
+
+def _on_workload_resync(workloads):
+    # A full relist settles records whose workload became ready before the
+    # record was written, which the event stream alone would miss.
+    if not is_leader():
+        return
+    pending = {doc["db_name"] for doc in collection.find({"status": "pending", "deleted": False}, {"db_name": 1})}
+    for workload in workloads:
+        _record_state(workload, force=workload.metadata.name in pending)
+
+
+def settle_pending(namespace=None):
+    # Run on gaining leadership: catches up on instances that settled while
+    # no process was writing. Before the informers sync, their first relist
+    # does this instead.
+    if not TRACKING_ENABLED:
+        return
+    for kind in WORKLOAD_KINDS:
+        informer = get_informer(kind, namespace)
+        if informer.synced.is_set():
+            _on_workload_resync(informer.items())
+
+
+def start_readiness_watch(namespace=None):
+    # One watch per namespace however many instances are being tracked.
+    if not TRACKING_ENABLED:
+        return
+    with _registered_lock:
+        for kind in WORKLOAD_KINDS:
+            informer = get_informer(kind, namespace)
+            if informer not in _registered:
+                informer.add_handler(_on_workload_event)
+                informer.add_resync_handler(_on_workload_resync)
+                _registered.add(informer)
+        pods = get_informer("pods", namespace)
+        if pods not in _registered:
+            pods.add_handler(_on_pod_event)
+            _registered.add(pods)
+    start_informers(namespace)
+    start_informers(namespace, ("pods",))
+
+
+def wait_until_settled(db_name, db_type=None, timeout=MAX_WAIT_SECONDS):
+    query = {"db_name": db_name, "deleted": False}
+    if db_type:
+        query["type"] = db_type
+
+    deadline = time.monotonic() + min(timeout, MAX_WAIT_SECONDS)
+    while True:
+        record = collection.find_one(query, RECORD_PROJECTION)
+        if record is None or record.get("status") != "pending":
+            return record
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return record
+        with _settled:
+            update = _states.get(db_name)
+            if update is None:
+                _settled.wait(timeout=min(remaining, RECHECK_SECONDS))
+                continue
+        # The workload settled before its record was written; apply it now.
+        if not _apply(db_name, update):
+            time.sleep(min(remaining, RECHECK_SECONDS))